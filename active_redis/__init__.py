@@ -1,12 +1,24 @@
 from active_redis.core import (
   ActiveRedis,
   ActiveRedisClient,
+  Batch,
+  Future,
+  Codec,
+  Compressor,
   DataType,
   Observer,
   Observable,
   Script,
+  ScriptManager,
+  WriteBack,
 )
+from active_redis.cache import Cache
+from active_redis.bulk import BulkLoader, bulk_load
+from active_redis.lock import Lock
+from active_redis.instrument import Instrumentation
+from active_redis.asynchronous import AsyncActiveRedis
 import active_redis.observables
+import active_redis.codecs
 
 import sys, pkgutil
 import active_redis.datatypes
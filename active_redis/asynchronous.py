@@ -0,0 +1,192 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from active_redis.core import ActiveRedis, DataType
+from active_redis.exception import ActiveRedisError
+import itertools, threading
+
+try:
+  from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+  ThreadPoolExecutor = None
+
+class AsyncActiveRedis(object):
+  """
+  Asynchronous Active Redis client.
+
+  Data types are constructed just as with ActiveRedis, but their
+  methods are executed on a bounded pool of worker threads sharing
+  a single connection pool, and return concurrent.futures.Future
+  objects. Event loops can await these futures, e.g. with
+  asyncio.wrap_future(), without blocking on Redis round trips.
+
+  Note that batches are bound to the thread in which they are
+  created and therefore do not apply to asynchronous data types.
+  """
+  def __init__(self, *args, **kwargs):
+    """Initializes the client.
+
+    Accepts the same arguments as ActiveRedis, plus an optional
+    'workers' keyword argument limiting the number of worker threads.
+    """
+    if ThreadPoolExecutor is None:
+      raise ActiveRedisError("AsyncActiveRedis requires concurrent.futures (the 'futures' package on Python 2).")
+    workers = kwargs.pop('workers', 10)
+    self.activeredis = ActiveRedis(*args, **kwargs)
+    self.executor = ThreadPoolExecutor(max_workers=workers)
+
+  def _wrap_datatype(self, create_datatype):
+    """Wraps a datatype constructor."""
+    def create_async_datatype(key=None, **options):
+      return AsyncDataType(create_datatype(key, **options), self.executor)
+    return create_async_datatype
+
+  def shutdown(self, wait=True):
+    """Shuts down the worker threads."""
+    self.executor.shutdown(wait=wait)
+
+  def __getattr__(self, name):
+    if DataType.exists(name):
+      return self._wrap_datatype(getattr(self.activeredis, name))
+    else:
+      raise AttributeError("Attribute %s not found." % (name,))
+
+class AsyncDataType(object):
+  """
+  Wraps a data type, executing its methods in a worker thread.
+
+  Every method returns a Future. Since Python operators cannot be
+  made asynchronous, item access is exposed through __getitem__ and
+  the explicit getitem(), setitem(), delitem(), contains() and length()
+  methods.
+
+  Item assignment and deletion with the [] operators cannot return a
+  Future. Their errors are raised by the next method call, or by the
+  Future returned by flush().
+  """
+  def __init__(self, datatype, executor):
+    self.datatype = datatype
+    self.executor = executor
+    self._writes = []
+    self._lock = threading.Lock()
+
+  @property
+  def key(self):
+    return self.datatype.key
+
+  def submit(self, method, *args, **kwargs):
+    """Executes a method in a worker thread.
+
+    Raises the error of any completed item write made with the []
+    operators.
+    """
+    self._check_writes()
+    return self.executor.submit(method, *args, **kwargs)
+
+  def _write(self, future):
+    """Tracks the Future of an item write made with the [] operators."""
+    with self._lock:
+      self._writes.append(future)
+
+  def _check_writes(self):
+    """Raises the first error of the completed item writes."""
+    with self._lock:
+      done = [write for write in self._writes if write.done()]
+      self._writes = [write for write in self._writes if not write.done()]
+    for write in done:
+      if write.exception() is not None:
+        raise write.exception()
+
+  def flush(self):
+    """Returns a Future resolved once pending item writes have completed.
+
+    The Future raises the first error of those writes. Deferred write-back
+    notifications of the data type, if any, are flushed as well.
+    """
+    with self._lock:
+      writes, self._writes = self._writes, []
+    def flush():
+      for write in writes:
+        write.result()
+      if hasattr(self.datatype, 'flush'):
+        self.datatype.flush()
+    return self.executor.submit(flush)
+
+  def __getattr__(self, name):
+    attr = getattr(self.datatype, name)
+    if not callable(attr):
+      return attr
+    def execute_method(*args, **kwargs):
+      return self.submit(attr, *args, **kwargs)
+    return execute_method
+
+  def getitem(self, key):
+    """Gets an item."""
+    return self.submit(self.datatype.__getitem__, key)
+
+  def setitem(self, key, item):
+    """Sets an item."""
+    return self.submit(self.datatype.__setitem__, key, item)
+
+  def delitem(self, key):
+    """Deletes an item."""
+    return self.submit(self.datatype.__delitem__, key)
+
+  def contains(self, item):
+    """Indicates whether the data type contains an item."""
+    return self.submit(self.datatype.__contains__, item)
+
+  def length(self):
+    """Returns the length of the data type."""
+    return self.submit(self.datatype.__len__)
+
+  def iterate(self, size=1000, method='__iter__'):
+    """Returns an AsyncIterator streaming items in chunks of 'size'.
+
+    'method' names the data type's iterator method, e.g. 'iteritems'.
+    """
+    return AsyncIterator(getattr(self.datatype, method), self.executor, size)
+
+  def __getitem__(self, key):
+    return self.getitem(key)
+
+  def __setitem__(self, key, item):
+    self._write(self.setitem(key, item))
+
+  def __delitem__(self, key):
+    self._write(self.delitem(key))
+
+  def __repr__(self):
+    return '<%s %s>' % (self.__class__.__name__, self.datatype.key)
+
+class AsyncIterator(object):
+  """
+  Streams the items of a data type in chunks.
+
+  Each call to fetch() returns a Future for the next list of items,
+  which is empty once the data type has been exhausted. Items are read
+  with the data type's own streaming iterator, so lists and dicts are
+  paged with LRANGE and HSCAN. Overlapping fetches are chained, so
+  they return consecutive chunks in the order they were made.
+  """
+  def __init__(self, method, executor, size=1000):
+    self.executor = executor
+    self.size = size
+    self._method = method
+    self._iterator = None
+    self._last = None
+    self._lock = threading.Lock()
+
+  def _fetch(self, previous):
+    if previous is not None:
+      # Waits for the previous fetch, which was queued and therefore
+      # started before this one, without raising its error.
+      previous.exception()
+    if self._iterator is None:
+      self._iterator = iter(self._method())
+    return list(itertools.islice(self._iterator, self.size))
+
+  def fetch(self):
+    """Returns a Future for the next chunk of items."""
+    with self._lock:
+      self._last = self.executor.submit(self._fetch, self._last)
+      return self._last
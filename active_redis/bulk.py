@@ -0,0 +1,117 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from active_redis.core import ActiveRedisClient
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+import collections, itertools
+
+def _chunks(iterable, size):
+  """Splits an iterable into lists of at most 'size' items."""
+  iterator = iter(iterable)
+  while True:
+    chunk = list(itertools.islice(iterator, size))
+    if not chunk:
+      return
+    yield chunk
+
+def _encode_chunk(datatype, options, chunk):
+  """Encodes a chunk in a worker process."""
+  return datatype._bulk_encode(ActiveRedisClient(None, **options), chunk)
+
+class BulkLoader(object):
+  """
+  Loads large numbers of items into a list, dict or set.
+
+  Input is split into chunks which are encoded by a pool of worker
+  threads, or worker processes to use all cores. Each chunk is then
+  stored in a single pipelined round trip of RPUSH, HMSET or SADD
+  commands holding at most command_size values each. List chunks are
+  pushed in input order. With threads, dict and set chunks are pushed
+  by the worker which encoded them.
+
+  In process mode, items must be picklable and are encoded with the
+  codec and compression options of the data type's client.
+  """
+  chunk_size = 10000
+  command_size = 1000
+
+  def __init__(self, datatype, workers=4, processes=False, chunk_size=None):
+    self.datatype = datatype
+    self.workers = workers
+    self.processes = processes
+    if chunk_size is not None:
+      self.chunk_size = chunk_size
+    self.loaded = 0
+
+  def _options(self):
+    """Returns the encoding options of the data type's client."""
+    client = self.datatype.client
+    return {
+      'codec': client.codec.type,
+      'compression': client.compressor.type if client.compressor is not None else None,
+      'compression_threshold': client.compression_threshold,
+    }
+
+  def _encode(self, chunk):
+    """Encodes a chunk in a worker thread."""
+    return self.datatype._bulk_encode(self.datatype.client, chunk)
+
+  def _push(self, values):
+    """Stores a chunk of encoded values in one round trip."""
+    pipeline = self.datatype.client.redis.pipeline(transaction=False)
+    for i in range(0, len(values), self.command_size):
+      self.datatype._bulk_push(pipeline, values[i:i+self.command_size])
+    pipeline.execute()
+    return len(values)
+
+  def _load(self, chunk):
+    """Encodes and stores a chunk in a worker thread."""
+    return self._push(self._encode(chunk))
+
+  def load(self, iterable):
+    """Loads items from an iterable, returning the number of items loaded.
+
+    Dicts are loaded from a mapping or an iterable of (key, item) pairs.
+    """
+    if hasattr(iterable, 'iteritems'):
+      iterable = iterable.iteritems()
+
+    if self.processes:
+      pool = Pool(self.workers)
+      options = self._options()
+      submit = lambda chunk: pool.apply_async(_encode_chunk, (type(self.datatype), options, chunk))
+      collect = self._push
+    elif self.datatype._bulk_ordered:
+      pool = ThreadPool(self.workers)
+      submit = lambda chunk: pool.apply_async(self._encode, (chunk,))
+      collect = self._push
+    else:
+      pool = ThreadPool(self.workers)
+      submit = lambda chunk: pool.apply_async(self._load, (chunk,))
+      collect = lambda count: count
+
+    # Chunks are submitted as results are collected, so only a few
+    # chunks are held in memory at any time.
+    pending = collections.deque()
+    try:
+      for chunk in _chunks(iterable, self.chunk_size):
+        if len(pending) >= self.workers * 2:
+          self.loaded += collect(pending.popleft().get())
+        pending.append(submit(chunk))
+      while pending:
+        self.loaded += collect(pending.popleft().get())
+      pool.close()
+    except:
+      pool.terminate()
+      raise
+    finally:
+      pool.join()
+      self.datatype.client.invalidate(self.datatype.key)
+    return self.loaded
+
+def bulk_load(datatype, iterable, workers=4, processes=False, chunk_size=None):
+  """Loads items into a list, dict or set using a pool of workers.
+
+  Returns the number of items loaded. See BulkLoader for details.
+  """
+  return BulkLoader(datatype, workers, processes, chunk_size).load(iterable)
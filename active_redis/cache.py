@@ -0,0 +1,141 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from collections import OrderedDict
+import threading, time
+
+class Cache(object):
+  """
+  Bounded LRU/TTL cache of raw Redis values.
+
+  Entries are keyed by (key, field) pairs, where the field is a hash
+  field, list index or encoded set member depending on the data type.
+  A cache instance is shared by all data types created by the same
+  ActiveRedis client, whose writes invalidate the affected entries.
+  Writes from other processes can be observed by listening for
+  keyspace notifications with listen().
+
+  Invalidations bump a version counter for the hash bucket of the key,
+  so that values loaded concurrently with a write to the same key are
+  not stored, while loads of other keys are unaffected.
+  """
+  # The number of version buckets keys are hashed into.
+  buckets = 1024
+
+  def __init__(self, maxsize=10000, ttl=None):
+    """Initializes the cache.
+
+    'maxsize' bounds the number of cached entries and 'ttl' is an
+    optional number of seconds after which an entry is reloaded.
+    """
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self.hits = 0
+    self.misses = 0
+    self._entries = OrderedDict()
+    self._fields = {}
+    self._versions = [0] * self.buckets
+    self._lock = threading.Lock()
+    self._listener = None
+
+  def get(self, key, field, loader):
+    """Returns a cached value, calling 'loader' to load it on a miss."""
+    key = str(key)
+    entry_key = (key, field)
+    with self._lock:
+      try:
+        value, expires = self._entries.pop(entry_key)
+      except KeyError:
+        pass
+      else:
+        if expires is None or expires > time.time():
+          self._entries[entry_key] = (value, expires)
+          self.hits += 1
+          return value
+        self._discard(entry_key)
+      self.misses += 1
+      version = self._versions[self._bucket(key)]
+
+    value = loader()
+    self.set(key, field, value, version)
+    return value
+
+  def _bucket(self, key):
+    return hash(key) % self.buckets
+
+  def version(self, key):
+    """Returns the current version of a key, to be passed to set()."""
+    with self._lock:
+      return self._versions[self._bucket(str(key))]
+
+  def set(self, key, field, value, version=None):
+    """Stores a value in the cache.
+
+    If 'version' is given, the value is only stored if the key has not
+    been invalidated since the version was read, i.e. while the value
+    was being loaded.
+    """
+    key = str(key)
+    with self._lock:
+      if version is None or version == self._versions[self._bucket(key)]:
+        self._store((key, field), value)
+
+  def _store(self, entry_key, value):
+    """Stores an entry, evicting the least recently used entries."""
+    expires = time.time() + self.ttl if self.ttl is not None else None
+    self._entries[entry_key] = (value, expires)
+    self._fields.setdefault(entry_key[0], set()).add(entry_key[1])
+    while len(self._entries) > self.maxsize:
+      self._discard(next(iter(self._entries)))
+
+  def _discard(self, entry_key):
+    """Removes an entry and its key index."""
+    self._entries.pop(entry_key, None)
+    fields = self._fields.get(entry_key[0])
+    if fields is not None:
+      fields.discard(entry_key[1])
+      if not fields:
+        del self._fields[entry_key[0]]
+
+  def invalidate(self, key, *fields):
+    """Invalidates the given fields of a key, or the entire key."""
+    key = str(key)
+    with self._lock:
+      self._versions[self._bucket(key)] += 1
+      if not fields:
+        fields = self._fields.pop(key, ())
+        for field in fields:
+          self._entries.pop((key, field), None)
+      else:
+        for field in fields:
+          self._discard((key, field))
+
+  def clear(self):
+    """Clears all cached entries."""
+    with self._lock:
+      self._versions = [version + 1 for version in self._versions]
+      self._entries.clear()
+      self._fields.clear()
+
+  def stats(self):
+    """Returns cache hit and miss counters."""
+    return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+  def listen(self, redis, db=0):
+    """Invalidates keys on keyspace notifications in a background thread.
+
+    The Redis server must have keyspace notifications enabled, e.g.
+    with 'notify-keyspace-events Kgshl'.
+    """
+    prefix = '__keyspace@%d__:' % (db,)
+    def handle_message(message):
+      self.invalidate(message['channel'][len(prefix):])
+    pubsub = redis.pubsub()
+    pubsub.psubscribe(**{prefix + '*': handle_message})
+    self._listener = pubsub.run_in_thread(sleep_time=0.01)
+    return self._listener
+
+  def stop(self):
+    """Stops listening for keyspace notifications."""
+    if self._listener is not None:
+      self._listener.stop()
+      self._listener = None
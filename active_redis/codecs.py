@@ -0,0 +1,85 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from active_redis.core import Codec, Compressor
+from active_redis.registry import codec, compressor
+from active_redis.exception import EncodingError
+import cPickle, json, zlib
+
+try:
+  import msgpack
+except ImportError:
+  msgpack = None
+
+try:
+  import lz4.frame
+except ImportError:
+  lz4 = None
+
+@codec
+class Pickle(Codec):
+  """Binary pickle codec."""
+  type = 'pickle'
+  tag = '\x01'
+
+  def dumps(self, item):
+    return cPickle.dumps(item, cPickle.HIGHEST_PROTOCOL)
+
+  def loads(self, value):
+    return cPickle.loads(value)
+
+@codec
+class JSON(Codec):
+  """JSON codec."""
+  type = 'json'
+  tag = '\x02'
+
+  def dumps(self, item):
+    return json.dumps(item, separators=(',', ':'))
+
+  def loads(self, value):
+    return json.loads(value)
+
+@codec
+class MessagePack(Codec):
+  """MessagePack codec. Requires the msgpack package."""
+  type = 'msgpack'
+  tag = '\x03'
+
+  def __init__(self):
+    if msgpack is None:
+      raise EncodingError("The msgpack codec requires the msgpack package.")
+
+  def dumps(self, item):
+    return msgpack.packb(item, use_bin_type=True)
+
+  def loads(self, value):
+    return msgpack.unpackb(value, raw=False)
+
+@compressor
+class Zlib(Compressor):
+  """Zlib compressor."""
+  type = 'zlib'
+  tag = 'z'
+  level = 6
+
+  def compress(self, value):
+    return zlib.compress(value, self.level)
+
+  def decompress(self, value):
+    return zlib.decompress(value)
+
+@compressor
+class LZ4(Compressor):
+  """LZ4 frame compressor. Requires the lz4 package."""
+  type = 'lz4'
+  tag = 'l'
+
+  def __init__(self):
+    if lz4 is None:
+      raise EncodingError("The lz4 compressor requires the lz4 package.")
+
+  def compress(self, value):
+    return lz4.frame.compress(value)
+
+  def decompress(self, value):
+    return lz4.frame.decompress(value)
@@ -3,19 +3,46 @@
 from redis import Redis
 from registry import DataType as DataTypeRegistry
 from registry import Observable as ObservableRegistry
+from registry import Codec as CodecRegistry
+from registry import Compressor as CompressorRegistry
 from exception import *
-import uuid, cPickle
+from redis.exceptions import NoScriptError, ResponseError
+from collections import OrderedDict
+import uuid, cPickle, threading, weakref, hashlib, time
 
 class ActiveRedis(object):
   """
   Active Redis client.
   """
+  CLIENT_OPTIONS = ('codec', 'compression', 'compression_threshold', 'cache', 'prefetch_depth', 'instrumentation')
+
   def __init__(self, *args, **kwargs):
     """Initializes the client.
 
     The constructor accepts either a Redis instance or arguments
-    required to construct a Redis instance.
+    required to construct a Redis instance. The optional 'codec',
+    'compression' and 'compression_threshold' keyword arguments set the
+    default encoding options of every data type created by the client.
+    An optional 'cache' may be given to share a read cache between
+    all data types created by the client, and 'prefetch_depth' sets
+    how many levels of referenced data types are loaded into the
+    cache whenever a batch of values is decoded. An 'instrumentation'
+    instance records commands, latencies and encoded sizes; see
+    active_redis.instrument.Instrumentation.
+
+    All data types share the connection pool of the Redis instance.
+    A pool may be shared between clients by passing 'connection_pool',
+    and pooling options such as 'max_connections', 'socket_keepalive'
+    and 'health_check_interval' (redis-py 3.3+) are passed on to the
+    pool. The client may be shared between threads; redis-py replaces
+    pooled connections in forked worker processes.
     """
+    self._context = threading.local()
+    self._identities = weakref.WeakValueDictionary()
+    self._identity_lock = threading.Lock()
+    self._clients = {}
+    self._lock = threading.Lock()
+    self.options = dict((name, kwargs.pop(name)) for name in self.CLIENT_OPTIONS if name in kwargs)
     if len(args) == 0 and len(kwargs) == 0:
       self.client = Redis()
     else:
@@ -26,45 +53,377 @@ class ActiveRedis(object):
           self.client = Redis(*args, **kwargs)
       except IndexError:
         self.client = Redis(*args, **kwargs)
+    self.session = self._create_client(self.options)
+
+  @property
+  def pool(self):
+    """The connection pool shared by all data types."""
+    return self.client.connection_pool
 
   @staticmethod
   def _create_unique_key():
     """Generates a unique Redis key using UUID."""
     return uuid.uuid4()
 
+  def _create_client(self, options):
+    """Creates a data type client bound to this session."""
+    return ActiveRedisClient(self.client, context=self._context, identities=self._identities, identity_lock=self._identity_lock, **options)
+
+  def _get_client(self, options):
+    """Returns the shared client for a set of data type options."""
+    if not options:
+      return self.session
+    options = dict(self.options, **options)
+    identity = tuple(sorted(options.items()))
+    try:
+      return self._clients[identity]
+    except KeyError:
+      with self._lock:
+        client = self._clients.get(identity)
+        if client is None:
+          client = self._clients[identity] = self._create_client(options)
+        return client
+
   def _wrap_datatype(self, datatype):
     """Wraps a datatype constructor."""
-    def create_datatype(key=None):
-      return datatype(key or ActiveRedis._create_unique_key(), ActiveRedisClient(self.client))
+    def create_datatype(key=None, **options):
+      client = self._get_client(options)
+      if key is None:
+        return datatype(ActiveRedis._create_unique_key(), client)
+      else:
+        return client.get_datatype(datatype.type, key)
     return create_datatype
 
+  def batch(self, transaction=False):
+    """Returns a context manager which batches data type commands.
+
+    Commands issued by data types created by this client within the
+    context are queued in a single pipeline which is executed when
+    the context exits. If 'transaction' is true the pipeline is
+    wrapped in MULTI/EXEC.
+    """
+    return Batch(self.client, self._context, transaction)
+
+  def trace(self):
+    """Returns a context manager recording the commands of a block."""
+    return self.session.trace()
+
+  def load_scripts(self):
+    """Loads the scripts of all registered data types in one round trip."""
+    ScriptManager.get(self.client).preload()
+
+  def close(self):
+    """Disconnects all pooled connections."""
+    self.pool.disconnect()
+
   def __getattr__(self, name):
     if DataType.exists(name):
       return self._wrap_datatype(DataType.get(name))
     else:
       raise AttributeError("Attribute %s not found." % (name,))
 
+class Future(object):
+  """
+  The pending result of a command queued in a batch.
+  """
+  def __init__(self):
+    self._done = False
+    self._result = None
+    self._exception = None
+    self._callbacks = []
+
+  def done(self):
+    """Indicates whether the result is available."""
+    return self._done
+
+  def result(self):
+    """Returns the result, raising any error produced by the command."""
+    if not self._done:
+      raise DataTypeError("Result is not available until the batch has been executed.")
+    if self._exception is not None:
+      raise self._exception
+    return self._result
+
+  def set_result(self, result):
+    """Resolves the future with a result."""
+    self._result = result
+    self._resolve()
+
+  def set_exception(self, exception):
+    """Resolves the future with an error."""
+    self._exception = exception
+    self._resolve()
+
+  def _resolve(self):
+    self._done = True
+    callbacks, self._callbacks = self._callbacks, []
+    for callback in callbacks:
+      callback(self)
+
+  def then(self, callback):
+    """Returns a new future for the result of 'callback' applied to this result."""
+    future = Future()
+    def resolve(parent):
+      try:
+        future.set_result(callback(parent.result()))
+      except Exception as e:
+        future.set_exception(e)
+    if self._done:
+      resolve(self)
+    else:
+      self._callbacks.append(resolve)
+    return future
+
+  def __nonzero__(self):
+    return bool(self.result())
+
+  def __repr__(self):
+    if not self._done:
+      return '<Future pending>'
+    elif self._exception is not None:
+      return '<Future error=%r>' % (self._exception,)
+    else:
+      return '<Future result=%r>' % (self._result,)
+
+class Batch(object):
+  """
+  Buffers data type commands in a single pipeline.
+
+  Commands issued within the batch's context return a Future which
+  is resolved once the pipeline has been executed. Operations which
+  require several round trips, such as iteration, are not batched.
+  Neither are len() and the 'in' operator, which must return a result
+  immediately; they do not see commands still queued in the batch.
+  """
+  def __init__(self, redis, context, transaction=False):
+    self.redis = redis
+    self.context = context
+    self.transaction = transaction
+    self.pipeline = None
+    self._parent = None
+    self._futures = {}
+    self._callbacks = []
+
+  def __enter__(self):
+    parent = getattr(self.context, 'batch', None)
+    if parent is not None:
+      # Nested batches are merged into the outermost batch.
+      self._parent = parent
+      return parent
+    self.pipeline = self.redis.pipeline(transaction=self.transaction)
+    self.context.batch = self
+    return self
+
+  def __exit__(self, type, value, traceback):
+    if self._parent is not None:
+      self._parent = None
+      return False
+    self.context.batch = None
+    if type is None:
+      self.execute()
+    else:
+      self.pipeline.reset()
+    return False
+
+  def wrap(self, method):
+    """Wraps a pipeline method to return futures for queued commands."""
+    def queue(*args, **kwargs):
+      return self.queue(method, *args, **kwargs)
+    return queue
+
+  def queue(self, method, *args, **kwargs):
+    """Calls a pipeline method and returns a Future for the queued command."""
+    size = len(self.pipeline.command_stack)
+    retval = method(*args, **kwargs)
+    if len(self.pipeline.command_stack) == size:
+      return retval
+    future = self._futures[len(self.pipeline.command_stack) - 1] = Future()
+    return future
+
+  def queue_all(self, build):
+    """Calls 'build' with the pipeline and returns a Future for each command it queued."""
+    start = len(self.pipeline.command_stack)
+    build(self.pipeline)
+    futures = []
+    for index in range(start, len(self.pipeline.command_stack)):
+      future = self._futures[index] = Future()
+      futures.append(future)
+    return futures
+
+  def after(self, callback):
+    """Registers a callback to be called once the batch is executed."""
+    self._callbacks.append(callback)
+
+  def execute(self):
+    """Executes all queued commands and resolves their futures."""
+    futures, self._futures = self._futures, {}
+    callbacks, self._callbacks = self._callbacks, []
+    try:
+      results = self.pipeline.execute(raise_on_error=False)
+    except Exception as e:
+      for future in futures.values():
+        future.set_exception(e)
+      raise
+    finally:
+      for callback in callbacks:
+        callback()
+
+    error = None
+    for index, future in sorted(futures.items()):
+      result = results[index]
+      if isinstance(result, Exception):
+        future.set_exception(result)
+        error = error or result
+      else:
+        future.set_result(result)
+    if error is not None:
+      raise error
+    return results
+
 class ActiveRedisClient(object):
   """
   Handles encoding and decoding of objects.
+
+  Encoded values are prefixed with a single tag byte. References to
+  Redis data types use REDIS_STRUCTURE_TAG, while Python structures
+  use the tag of the codec that serialized them. Values written with
+  the older textual prefixes can still be decoded.
+
+  If a compressor is configured, structures whose encoded size exceeds
+  the compression threshold are compressed and stored behind
+  COMPRESSION_TAG followed by the tag of the compressor.
   """
+  DEFAULT_CODEC = 'pickle'
+  DEFAULT_COMPRESSION_THRESHOLD = 1024
+  REDIS_STRUCTURE_TAG = '\x00'
+  COMPRESSION_TAG = '\x7f'
+
+  # Server versions by Redis client, used to detect supported commands.
+  _server_versions = weakref.WeakKeyDictionary()
+
+  # Legacy textual prefixes.
   REDIS_STRUCTURE_PREFIX = 'redis:struct'
   ABSOLUTE_VALUE_PREFIX = 'redis:absolute'
 
-  def __init__(self, redis):
+  def __init__(self, redis, codec=DEFAULT_CODEC, compression=None, compression_threshold=DEFAULT_COMPRESSION_THRESHOLD, cache=None, prefetch_depth=0, instrumentation=None, context=None, identities=None, identity_lock=None):
+    self.context = context if context is not None else threading.local()
+    self.identities = identities if identities is not None else weakref.WeakValueDictionary()
+    # The identity map may be shared by several clients, which must
+    # then share the lock guarding it.
+    self.identity_lock = identity_lock if identity_lock is not None else threading.Lock()
     self.redis = redis
+    self.cache = cache
+    self.prefetch_depth = prefetch_depth
+    self.instrumentation = instrumentation
+    if instrumentation is not None and redis is not None:
+      instrumentation.install(redis)
+    self.codec = Codec.get(codec)()
+    self._codecs = {self.codec.tag: self.codec}
+    if compression is not None:
+      self.compressor = Compressor.get(compression)()
+      self._compressors = {self.compressor.tag: self.compressor}
+    else:
+      self.compressor = None
+      self._compressors = {}
+    self.compression_threshold = compression_threshold
 
   def __getattr__(self, name):
-    return getattr(self.redis, name)
+    """Binds a Redis command to the client.
+
+    The bound method is stored on the instance, so later calls skip
+    this lookup. Commands are routed to the pipeline of the batch
+    active in the calling thread, if any.
+    """
+    method = getattr(self.redis, name)
+    if not callable(method):
+      return method
+    def command(*args, **kwargs):
+      batch = self.batch
+      if batch is not None:
+        return batch.queue(getattr(batch.pipeline, name), *args, **kwargs)
+      return method(*args, **kwargs)
+    command.__name__ = name
+    self.__dict__[name] = command
+    return command
+
+  @property
+  def batch(self):
+    """The batch currently active in this thread, if any."""
+    return getattr(self.context, 'batch', None)
+
+  def pipelined(self, build, transaction=False):
+    """Queues commands in the current batch, or sends them in a new pipeline.
+
+    'build' is called with the pipeline on which to queue the commands.
+    Without a batch the pipeline is executed, wrapped in MULTI/EXEC if
+    'transaction' is true, and its results are returned. Within a batch
+    a Future is returned for each queued command.
+    """
+    batch = self.batch
+    if batch is not None:
+      return batch.queue_all(build)
+    pipeline = self.redis.pipeline(transaction=transaction)
+    build(pipeline)
+    return pipeline.execute()
+
+  def result(self, value, callback):
+    """Applies a callback to a command result.
+
+    If the command was queued in a batch the callback is applied
+    once the batch has been executed and a new Future is returned.
+    """
+    if isinstance(value, Future):
+      return value.then(callback)
+    return callback(value)
+
+  def run_script(self, script, keys, args):
+    """Runs a script on the current connection."""
+    manager = ScriptManager.get(self.redis)
+    batch = self.batch
+    if batch is not None:
+      return batch.queue(manager.execute, script, keys, args, batch.pipeline)
+    if self.instrumentation is None:
+      return manager.execute(script, keys, args)
+    start = time.time()
+    try:
+      return manager.execute(script, keys, args)
+    finally:
+      self.instrumentation.record_script(script.__class__.__name__, time.time() - start)
+
+  def trace(self):
+    """Returns a context manager recording the commands of a block.
+
+    The trace lists the commands executed by the current thread.
+    """
+    if self.instrumentation is None:
+      raise ActiveRedisError("Tracing requires an 'instrumentation' option.")
+    return self.instrumentation.trace()
+
+  def cached(self, key, field, loader):
+    """Reads a raw value through the cache if one is configured."""
+    if self.cache is None or self.batch is not None:
+      return loader()
+    return self.cache.get(key, field, loader)
+
+  def invalidate(self, key, *fields):
+    """Invalidates cached fields of a key, or the entire key."""
+    if self.cache is not None:
+      self.cache.invalidate(key, *fields)
+      batch = self.batch
+      if batch is not None:
+        batch.after(lambda: self.cache.invalidate(key, *fields))
 
   def encode(self, item):
     """Encodes a Python object."""
     if isinstance(item, Notifier):
       item = item.observable.subject
     if self._is_redis_item(item):
-      return self._encode_redis_item(item)
+      value = self._encode_redis_item(item)
     else:
-      return self._encode_structure_item(item)
+      value = self._encode_structure_item(item)
+    if self.instrumentation is not None:
+      self.instrumentation.record_encode(len(value))
+    return value
 
   def _is_redis_item(self, item):
     """Indicaites whether the item is a Redis data type."""
@@ -72,37 +431,164 @@ class ActiveRedisClient(object):
 
   def _encode_redis_item(self, item):
     """Encodes a Redis data type."""
-    return "%s:%s:%s" % (self.REDIS_STRUCTURE_PREFIX, item.type, item.key)
+    return "%s%s:%s" % (self.REDIS_STRUCTURE_TAG, item.type, item.key)
 
   def _encode_structure_item(self, item):
     """Encodes a structure."""
-    return "%s:%s" % (self.ABSOLUTE_VALUE_PREFIX, cPickle.dumps(item))
+    value = self.codec.tag + self.codec.dumps(item)
+    if self.compressor is not None and len(value) > self.compression_threshold:
+      return self._compress(value)
+    return value
+
+  def _compress(self, value):
+    """Compresses an encoded value if doing so makes it smaller."""
+    compressed = self.COMPRESSION_TAG + self.compressor.tag + self.compressor.compress(value)
+    if len(compressed) < len(value):
+      return compressed
+    return value
+
+  def _decompress(self, value):
+    """Decompresses a compressed value."""
+    try:
+      compressor = self._compressors[value[:1]]
+    except KeyError:
+      compressor = self._compressors[value[:1]] = Compressor.get_by_tag(value[:1])()
+    return compressor.decompress(value[1:])
 
   def decode(self, value):
     """Decodes a stored value."""
-    if self._is_redis_value(value):
-      return self._decode_redis_value(value)
-    elif self._is_structure_value(value):
-      return self._decode_structure_value(value)
+    if self.instrumentation is not None:
+      self.instrumentation.record_decode(len(value))
+    return self._decode(value)
+
+  def _decode(self, value):
+    tag = value[:1]
+    if tag == self.REDIS_STRUCTURE_TAG:
+      return self._decode_redis_value(value[1:])
+    elif Codec.tag_exists(tag):
+      return self._decode_structure_value(tag, value[1:])
+    elif tag == self.COMPRESSION_TAG:
+      return self._decode(self._decompress(value[1:]))
+    elif self._is_legacy_redis_value(value):
+      return self._decode_redis_value(value[len(self.REDIS_STRUCTURE_PREFIX)+1:])
+    elif self._is_legacy_structure_value(value):
+      return cPickle.loads(value[len(self.ABSOLUTE_VALUE_PREFIX)+1:])
     else:
       raise EncodingError("Failed to decode value. Unknown data type.")
 
-  def _is_redis_value(self, value):
-    """Indicates whether the value is a Redis data type."""
-    return value.startswith(self.REDIS_STRUCTURE_PREFIX)
+  def decode_many(self, values):
+    """Decodes a batch of stored values.
+
+    If a prefetch depth is configured, the contents of referenced data
+    types are loaded into the cache as well.
+    """
+    decode = self.decode
+    items = [decode(value) for value in values]
+    if self.prefetch_depth > 0:
+      self.prefetch(items, self.prefetch_depth)
+    return items
+
+  def prefetch(self, items, depth=1):
+    """Loads the contents of data types referenced by 'items' into the cache.
+
+    Each level of references is loaded in a single pipelined round trip,
+    up to 'depth' levels deep. Prefetching requires a cache.
+    """
+    if self.cache is None or self.batch is not None:
+      return
+    seen = set()
+    while depth > 0:
+      datatypes = []
+      for item in items:
+        if isinstance(item, DataType) and (item.type, str(item.key)) not in seen:
+          seen.add((item.type, str(item.key)))
+          datatypes.append(item)
+      if not datatypes:
+        break
+      pipeline = self.redis.pipeline(transaction=False)
+      datatypes = [datatype for datatype in datatypes if datatype._prefetch(pipeline)]
+      # Versions are read first so values are not cached if the keys
+      # are written while the pipeline is executing.
+      versions = [self.cache.version(datatype.key) for datatype in datatypes]
+      items = []
+      for datatype, version, result in zip(datatypes, versions, pipeline.execute()):
+        items.extend(self.decode(value) for value in datatype._prefetched(self.cache, result, version))
+      depth -= 1
+
+  def server_version(self):
+    """Returns the Redis server version as a tuple of integers."""
+    try:
+      return self._server_versions[self.redis]
+    except KeyError:
+      try:
+        version = tuple(int(part) for part in self.redis.info('server')['redis_version'].split('.'))
+      except (ResponseError, KeyError, ValueError):
+        # Assume an old server if the version cannot be determined.
+        version = (0,)
+      self._server_versions[self.redis] = version
+      return version
+
+  def supports(self, *version):
+    """Indicates whether the server version is at least 'version'."""
+    return self.server_version() >= version
+
+  def unlink(self, *keys):
+    """Deletes keys with UNLINK, falling back to DEL on older servers."""
+    try:
+      return self.execute_command('UNLINK', *keys)
+    except ResponseError as e:
+      if 'unknown command' not in str(e).lower():
+        raise
+      return self.delete(*keys)
+
+  def get_datatype(self, type, key):
+    """Returns the data type wrapper for a key.
+
+    Wrappers are shared through a weak identity map, so a key maps to
+    a single wrapper per client while that wrapper is in use.
+    """
+    identity = self._identity(type, key)
+    datatype = self.identities.get(identity)
+    if datatype is None:
+      with self.identity_lock:
+        datatype = self.identities.get(identity)
+        if datatype is None:
+          datatype = self.identities[identity] = DataType.get(type)(key, self)
+    return datatype
+
+  def _identity(self, type, key):
+    """Returns the identity map key of a wrapper bound to this client.
+
+    Clients with different options share the identity map of their
+    session, so the client is part of the key. Wrappers reference their
+    client, so its id is not reused while the entry exists.
+    """
+    return (id(self), type, str(key))
+
+  def _get_codec(self, tag):
+    """Returns a codec instance for the given tag."""
+    try:
+      return self._codecs[tag]
+    except KeyError:
+      codec = self._codecs[tag] = Codec.get_by_tag(tag)()
+      return codec
 
   def _decode_redis_value(self, value):
     """Decodes a Redis data type value."""
-    type, key = value[len(self.REDIS_STRUCTURE_PREFIX)+1:].split(':', 1)
-    return DataType.get(type)(key, self)
-
-  def _is_structure_value(self, value):
-    """Indicates whether the value is a Python structure."""
-    return value.startswith(self.ABSOLUTE_VALUE_PREFIX)
+    type, key = value.split(':', 1)
+    return self.get_datatype(type, key)
 
-  def _decode_structure_value(self, value):
+  def _decode_structure_value(self, tag, value):
     """Decodes a structure value."""
-    return cPickle.loads(value[len(self.ABSOLUTE_VALUE_PREFIX)+1:])
+    return self._get_codec(tag).loads(value)
+
+  def _is_legacy_redis_value(self, value):
+    """Indicates whether the value is a legacy Redis data type reference."""
+    return value.startswith(self.REDIS_STRUCTURE_PREFIX)
+
+  def _is_legacy_structure_value(self, value):
+    """Indicates whether the value is a legacy pickled Python structure."""
+    return value.startswith(self.ABSOLUTE_VALUE_PREFIX)
 
 class DataType(object):
   """
@@ -114,6 +600,7 @@ class DataType(object):
   def __init__(self, key, client):
     self.key = key
     self.client = client
+    self._script_handlers = {}
 
   @classmethod
   def exists(cls, type):
@@ -129,49 +616,40 @@ class DataType(object):
     """Allows the data type key to be changed."""
     if name == 'key' and hasattr(self, 'key'):
       self.client.rename(self.key, value)
+      self.client.invalidate(self.key)
+      self.client.invalidate(value)
+      identities = self.client.identities
+      identity = self.client._identity(self.type, self.key)
+      with self.client.identity_lock:
+        if identities.get(identity) is self:
+          del identities[identity]
+          identities[self.client._identity(self.type, value)] = self
     object.__setattr__(self, name, value)
 
   def _load_script(self, script):
-    """Loads a script handler."""
+    """Loads a script handler, reusing handlers already created."""
     try:
-      return self._scripts[script](self.client)
+      return self._script_handlers[script]
+    except KeyError:
+      pass
+    try:
+      handler = self._script_handlers[script] = self._scripts[script](self.client)
     except KeyError:
       raise ScriptError("Invalid script %s." % (script,))
+    return handler
 
   def _execute_script(self, script, *args, **kwargs):
     """Executes a script."""
     return self._load_script(script)(*args, **kwargs)
 
-  def lock(self, atime=10, locktime=10):
-    """Aquires a lock on the key."""
-    lockname = "%s:%s" % (self.key, 'lock')
-    end = time.time() + atime
-    while end > time.time():
-      if self.redis.setnx(lockname, str(self)):
-        self.redis.expire(lockname, locktime)
-        return str(self)
-      elif not self.redis.ttl(lockname):
-        self.redis.expire(lockname, locktime)
-      time.sleep(.001)
-    return False
+  def lock(self, timeout=10, blocking=True, blocking_timeout=None, renew=False):
+    """Returns a distributed lock on the data type.
 
-  def release(self):
-    """Releases a lock on the key."""
-    lockname = "%s:%s" % (self.key, 'lock')
-    pipe = self.redis.pipeline(True)
-    while True:
-      try:
-        pipe.watch(lockname)
-        if pipe.get(lockname) == str(self):
-          pipe.multi()
-          pipe.delete(lockname)
-          pipe.execute()
-          return True
-        pipe.unwatch()
-        break
-      except WatchError:
-        pass
-    return False
+    The lock is acquired with acquire() or by using it as a context
+    manager. 'timeout' is the lease in seconds. See Lock for details.
+    """
+    from active_redis.lock import Lock
+    return Lock(self, timeout, blocking, blocking_timeout, renew)
 
   def expire(self, ttl):
     """Sets an expiration on the data type."""
@@ -183,10 +661,70 @@ class DataType(object):
     self.client.pexpireat(self.key, time)
     return time
 
-  def delete(self, references=False):
-    """Deletes the data type."""
+  def delete(self, references=False, progress=None):
+    """Deletes the data type, returning the number of keys deleted.
+
+    If 'references' is true, all data types referenced by the data type,
+    directly or indirectly, are deleted as well. 'progress' is called
+    with the number of keys discovered and deleted as deletion proceeds.
+    Data types which cannot hold references accept both arguments for
+    consistency.
+    """
     raise NotImplementedError("Data types must implement the delete() method.")
 
+  def _prefetch(self, pipeline):
+    """Queues a command loading the data type's contents for prefetching.
+
+    Returns a boolean indicating whether a command was queued.
+    """
+    return False
+
+  def _prefetched(self, cache, result, version):
+    """Caches prefetched contents and returns the raw values loaded.
+
+    Values are stored with the cache version of the key read before
+    they were loaded.
+    """
+    return []
+
+  def _scan_page(self, pipeline, cursor):
+    """Queues a command fetching a page of raw values from 'cursor'.
+
+    The cursor is None for the first page. Returns a boolean indicating
+    whether a command was queued; data types which cannot contain
+    references need not queue anything.
+    """
+    return False
+
+  def _parse_page(self, cursor, result):
+    """Returns the next cursor (or None when done) and the raw values of a page."""
+    return None, []
+
+  # Indicates whether bulk loaded chunks must be pushed in input order.
+  _bulk_ordered = False
+
+  @classmethod
+  def _bulk_encode(cls, client, items):
+    """Encodes a chunk of input items for bulk loading.
+
+    This may run in a worker process, so it must not use the server.
+    """
+    raise DataTypeError("Data type %s does not support bulk loading." % (cls.type,))
+
+  def _bulk_push(self, pipeline, values):
+    """Queues commands storing a chunk of encoded values."""
+    raise DataTypeError("Data type %s does not support bulk loading." % (self.type,))
+
+  def _delete(self, references=False, progress=None):
+    """Deletes the data type, optionally along with referenced data types."""
+    if references is True:
+      from active_redis.graph import GraphDelete
+      count = GraphDelete(self.client, progress).delete(self)
+    else:
+      count = self.client.unlink(self.key)
+    self.client.invalidate(self.key)
+    return count
+
 class Observer(object):
   """
   Abstract base class for notifiable data types.
@@ -198,9 +736,28 @@ class Observer(object):
 
   Observable handlers must be registered in the Active Redis
   registry. See the Observable class for more.
+
+  Data type wrappers are shared between threads, so deferred
+  notifications are kept per thread: a thread's write-back queue only
+  holds the changes made by that thread.
   """
+  def _local(self):
+    """Returns the thread-local state of the observer."""
+    return self.__dict__.setdefault('_observer_local', threading.local())
+
+  @property
+  def _writeback(self):
+    """The write-back queue of the current thread, if any."""
+    return getattr(self._local(), 'writeback', None)
+
+  @_writeback.setter
+  def _writeback(self, writeback):
+    self._local().writeback = writeback
+
   def observe(self, subject, *args, **kwargs):
     """Creates an observer for the given subject."""
+    if self._writeback is not None:
+      subject = self._writeback.get(subject, args, kwargs)
     if Observable.is_observable(subject):
       return Notifier(Observable.get_observable(subject)(subject, *args, **kwargs), self)
     else:
@@ -210,22 +767,164 @@ class Observer(object):
     """Notifies the data type of a change in an observable."""
     raise NotImplementedError("Notifiable data types must implement the notify() method.")
 
+  def _notify(self, subject, *args, **kwargs):
+    """Notifies the data type, or queues the notification if deferred."""
+    if self._writeback is not None:
+      self._writeback.add(subject, args, kwargs)
+    else:
+      self.notify(subject, *args, **kwargs)
+
+  def _discard(self, *args, **kwargs):
+    """Drops the deferred notification of a field being written directly."""
+    if self._writeback is not None:
+      self._writeback.discard(args, kwargs)
+
+  def deferred(self, interval=None):
+    """Defers the current thread's notifications to a coalescing write-back queue.
+
+    The returned WriteBack is flushed when used as a context manager
+    exits, when flush() is called or, if 'interval' is given, every
+    'interval' seconds.
+    """
+    if self._writeback is None:
+      self._writeback = WriteBack(self, interval)
+    return self._writeback
+
+  def flush(self):
+    """Flushes deferred notifications."""
+    if self._writeback is not None:
+      self._writeback.flush()
+
+class WriteBack(object):
+  """
+  Coalesces observer notifications.
+
+  Pending writes are keyed by the observable arguments, e.g. the dict
+  key or list index, so repeated changes to the same field result in
+  a single write when the queue is flushed. While a write is pending,
+  observing the same field returns the pending subject. Observers must
+  discard the pending write of a field they write directly, and those
+  whose fields are positional, such as lists, must flush the queue
+  before shifting them.
+  """
+  def __init__(self, observer, interval=None):
+    self.observer = observer
+    self.interval = interval
+    self._pending = OrderedDict()
+    self._lock = threading.RLock()
+    self._timer = None
+    self._depth = 0
+
+  @staticmethod
+  def _field(args, kwargs):
+    return args, tuple(sorted(kwargs.items()))
+
+  def add(self, subject, args, kwargs):
+    """Queues a notification."""
+    with self._lock:
+      self._pending[self._field(args, kwargs)] = (subject, args, kwargs)
+      if self.interval is not None and self._timer is None:
+        self._timer = threading.Timer(self.interval, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+  def discard(self, args, kwargs):
+    """Drops the pending notification of a field."""
+    with self._lock:
+      self._pending.pop(self._field(args, kwargs), None)
+
+  def clear(self):
+    """Drops all pending notifications."""
+    with self._lock:
+      self._pending.clear()
+
+  def get(self, subject, args, kwargs):
+    """Returns the pending subject for a field, or 'subject' if none."""
+    with self._lock:
+      try:
+        return self._pending[self._field(args, kwargs)][0]
+      except KeyError:
+        return subject
+
+  def flush(self):
+    """Writes all pending notifications.
+
+    Each notification is removed from the queue once it has been
+    written, so notifications are kept if a write fails.
+    """
+    with self._lock:
+      if self._timer is not None:
+        self._timer.cancel()
+        self._timer = None
+      while self._pending:
+        field, entry = next(self._pending.iteritems())
+        subject, args, kwargs = entry
+        self.observer.notify(subject, *args, **kwargs)
+        if self._pending.get(field) is entry:
+          del self._pending[field]
+
+  def close(self):
+    """Flushes pending notifications and stops deferring them."""
+    with self._lock:
+      if self.observer._writeback is self:
+        self.observer._writeback = None
+      self.flush()
+
+  def __enter__(self):
+    with self._lock:
+      self._depth += 1
+    return self
+
+  def __exit__(self, type, value, traceback):
+    with self._lock:
+      self._depth -= 1
+      if self._depth == 0:
+        self.close()
+    return False
+
 class Notifier(object):
   """
   Monitors an observable object and notifies the observer when
   an observable method is called.
+
+  When used as a context manager, notifications are deferred until
+  the context exits and a single write is made for all changes.
   """
   def __init__(self, observable, observer):
     self.observable = observable
     self.observer = observer
+    self._depth = 0
+    self._dirty = False
 
   def _wrap_method(self, name):
     def execute_method(*args, **kwargs):
       retval = getattr(self.observable, name)(*args, **kwargs)
-      self.observer.notify(self.observable.subject, *self.observable.args, **self.observable.kwargs)
+      if self._depth > 0:
+        self._dirty = True
+      else:
+        self._notify()
       return retval
     return execute_method
 
+  def _notify(self):
+    self.observer._notify(self.observable.subject, *self.observable.args, **self.observable.kwargs)
+
+  def flush(self):
+    """Writes deferred changes to the observer."""
+    if self._dirty:
+      self._dirty = False
+      self._notify()
+
+  def __enter__(self):
+    self._depth += 1
+    return self
+
+  def __exit__(self, type, value, traceback):
+    self._depth -= 1
+    if self._depth == 0:
+      self.flush()
+    return False
+
   def __getattr__(self, name):
     """Checks for a method that needs to be wrapped."""
     if name in self.observable.watch_methods and hasattr(self.observable, name) and callable(getattr(self.observable, name)):
@@ -236,7 +935,7 @@ class Notifier(object):
       raise AttributeError("Attribute %s not found." % (name,))
 
   def __repr__(self):
-    return repr(self.subject)
+    return repr(self.observable.subject)
 
 class Observable(object):
   """
@@ -265,11 +964,155 @@ class Observable(object):
     """Returns an observable handler for a data type."""
     return cls._registry.get(type)
 
+class Codec(object):
+  """
+  Base class for value serializers.
+
+  Each codec is registered under a name, which is used to select
+  the codec, and a single byte tag, which is prepended to every
+  value it encodes so that the value can be decoded later.
+  """
+  _registry = CodecRegistry
+
+  type = None
+  tag = None
+
+  @classmethod
+  def exists(cls, type):
+    """Indicates whether a codec exists."""
+    return cls._registry.exists(type)
+
+  @classmethod
+  def get(cls, type):
+    """Returns a codec handler."""
+    return cls._registry.get(type)
+
+  @classmethod
+  def tag_exists(cls, tag):
+    """Indicates whether a codec exists for the given tag."""
+    return cls._registry.tag_exists(tag)
+
+  @classmethod
+  def get_by_tag(cls, tag):
+    """Returns a codec handler by tag."""
+    return cls._registry.get_by_tag(tag)
+
+  def dumps(self, item):
+    """Serializes a Python object."""
+    raise NotImplementedError("Codecs must implement the dumps() method.")
+
+  def loads(self, value):
+    """Unserializes a Python object."""
+    raise NotImplementedError("Codecs must implement the loads() method.")
+
+class Compressor(object):
+  """
+  Base class for value compressors.
+
+  Like codecs, compressors are registered under a name and a single
+  byte tag which identifies the compressor used for a stored value.
+  """
+  _registry = CompressorRegistry
+
+  type = None
+  tag = None
+
+  @classmethod
+  def exists(cls, type):
+    """Indicates whether a compressor exists."""
+    return cls._registry.exists(type)
+
+  @classmethod
+  def get(cls, type):
+    """Returns a compressor handler."""
+    return cls._registry.get(type)
+
+  @classmethod
+  def get_by_tag(cls, tag):
+    """Returns a compressor handler by tag."""
+    return cls._registry.get_by_tag(tag)
+
+  def compress(self, value):
+    """Compresses an encoded value."""
+    raise NotImplementedError("Compressors must implement the compress() method.")
+
+  def decompress(self, value):
+    """Decompresses an encoded value."""
+    raise NotImplementedError("Compressors must implement the decompress() method.")
+
+class ScriptManager(object):
+  """
+  Loads and executes scripts on a single Redis client.
+
+  Scripts are executed with EVALSHA using the SHA1 digest of their
+  source. If the server does not know a script, e.g. after a SCRIPT
+  FLUSH or a failover, the script is loaded and the call retried.
+  Managers are shared by all data types using the same Redis client.
+  """
+  _managers = weakref.WeakKeyDictionary()
+  _lock = threading.Lock()
+
+  def __init__(self, redis):
+    self.redis = redis
+    self._loaded = set()
+    self._pipelines = weakref.WeakKeyDictionary()
+
+  @classmethod
+  def get(cls, redis):
+    """Returns the script manager for a Redis client."""
+    try:
+      return cls._managers[redis]
+    except KeyError:
+      with cls._lock:
+        return cls._managers.setdefault(redis, cls(redis))
+
+  def load(self, *scripts):
+    """Loads any scripts unknown to the manager in a single pipeline."""
+    pending = dict((script.digest(), script.script) for script in scripts if script.digest() not in self._loaded)
+    if pending:
+      pipeline = self.redis.pipeline(transaction=False)
+      for source in pending.values():
+        pipeline.script_load(source)
+      pipeline.execute()
+      self._loaded.update(pending.keys())
+
+  def preload(self):
+    """Loads the scripts of all registered data types."""
+    scripts = set()
+    for datatype in DataTypeRegistry._handlers.values():
+      scripts.update(datatype._scripts.values())
+    self.load(*scripts)
+
+  def execute(self, script, keys, args, pipeline=None):
+    """Executes a script, queueing it on 'pipeline' if given.
+
+    A NOSCRIPT error cannot be retried once a pipeline has executed,
+    so a SCRIPT LOAD is queued ahead of the first EVALSHA of each
+    script in a pipeline, adding its result to the pipeline's results.
+    """
+    arguments = tuple(keys) + tuple(args)
+    if pipeline is not None:
+      queued = self._pipelines.setdefault(pipeline, set())
+      if script.digest() not in queued:
+        queued.add(script.digest())
+        pipeline.script_load(script.script)
+      return pipeline.evalsha(script.digest(), len(keys), *arguments)
+    try:
+      return self.redis.evalsha(script.digest(), len(keys), *arguments)
+    except NoScriptError:
+      self._loaded.discard(script.digest())
+      self.load(script)
+      return self.redis.evalsha(script.digest(), len(keys), *arguments)
+
 class Script(object):
   """
   Base class for Redis server-side lua scripts.
+
+  Script instances are bound to a client and may be reused. When
+  variable_keys or variable_args is set, any remaining positional
+  arguments (or the items of a list or tuple argument) are appended
+  to the script's keys or arguments respectively.
   """
-  is_registered = False
   script = ''
   keys = []
   args = []
@@ -282,13 +1125,22 @@ class Script(object):
     """
     self.client = client
 
+  @classmethod
+  def digest(cls):
+    """
+    Returns the SHA1 digest of the script source.
+    """
+    try:
+      return cls.__dict__['_digest']
+    except KeyError:
+      cls._digest = hashlib.sha1(cls.script).hexdigest()
+      return cls._digest
+
   def register(self):
     """
-    Registers the script with the redis instance.
+    Loads the script on the client's Redis server.
     """
-    if not self.__class__.is_registered:
-      self.__class__.script = self.client.register_script(self.script)
-      self.__class__.is_registered = True
+    ScriptManager.get(self.client.redis).load(self)
 
   def prepare(self, keys, args):
     """
@@ -296,13 +1148,13 @@ class Script(object):
     """
     return keys, args
 
+  def _invalid_arguments(self):
+    return ScriptError('Invalid arguments for script %s.' % (self.__class__.__name__,))
+
   def execute(self, *args, **kwargs):
     """
     Executes the script.
     """
-    if not self.__class__.is_registered:
-      self.register()
-
     current_index = 0
     keys = []
     for key in self.keys:
@@ -313,7 +1165,7 @@ class Script(object):
           keys.append(args[current_index])
           current_index += 1
         except IndexError:
-            raise ScriptError('Invalid arguments for script %s.' % (self.id,))
+          raise self._invalid_arguments()
 
     arguments = []
     for arg in self.args:
@@ -324,10 +1176,24 @@ class Script(object):
           arguments.append(args[current_index])
           current_index += 1
         except IndexError:
-            raise ScriptError('Invalid arguments for script %s.' % (self.id,))
+          raise self._invalid_arguments()
+
+    remaining = []
+    for arg in args[current_index:]:
+      if isinstance(arg, (list, tuple)):
+        remaining.extend(arg)
+      else:
+        remaining.append(arg)
+
+    if self.variable_keys:
+      keys.extend(remaining)
+    elif self.variable_args:
+      arguments.extend(remaining)
+    elif remaining:
+      raise self._invalid_arguments()
 
     keys, arguments = self.prepare(keys, arguments)
-    return self.process(self.script(keys=keys, args=arguments, client=self.client))
+    return self.client.result(self.client.run_script(self, keys, arguments), self.process)
 
   def __call__(self, *args, **kwargs):
     """
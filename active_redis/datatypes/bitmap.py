@@ -0,0 +1,101 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from active_redis.core import DataType
+from active_redis.registry import datatype
+
+@datatype
+class Bitmap(DataType):
+  """
+  A Redis bitmap data type.
+
+  Bits are addressed by offset like the items of a list of booleans,
+  and unset bits read as False. Bulk reads and writes are sent as
+  BITFIELD commands of u1 operations (pipelined GETBIT and SETBIT on
+  servers older than 3.2).
+  """
+  type = 'bitmap'
+
+  # The number of bits read or written per command by the bulk methods.
+  chunk_size = 1000
+
+  def _chunks(self, items):
+    for i in range(0, len(items), self.chunk_size):
+      yield items[i:i+self.chunk_size]
+
+  def get_many(self, offsets):
+    """Returns a list of booleans for the bits at several offsets."""
+    offsets = list(offsets)
+    pipeline = self.client.redis.pipeline(transaction=False)
+    if self.client.supports(3, 2):
+      for chunk in self._chunks(offsets):
+        arguments = []
+        for offset in chunk:
+          arguments.extend(('GET', 'u1', offset))
+        pipeline.execute_command('BITFIELD', self.key, *arguments)
+      return [bool(bit) for result in pipeline.execute() for bit in result]
+    for offset in offsets:
+      pipeline.getbit(self.key, offset)
+    return [bool(bit) for bit in pipeline.execute()]
+
+  def set_many(self, offsets, value=True):
+    """Sets the bits at several offsets to 'value'.
+
+    'offsets' may also be a mapping of offsets to values.
+    """
+    if hasattr(offsets, 'iteritems'):
+      bits = [(offset, 1 if bit else 0) for offset, bit in offsets.iteritems()]
+    else:
+      bits = [(offset, 1 if value else 0) for offset in offsets]
+    bitfield = self.client.supports(3, 2)
+    def build(pipeline):
+      if bitfield:
+        for chunk in self._chunks(bits):
+          arguments = []
+          for offset, bit in chunk:
+            arguments.extend(('SET', 'u1', offset, bit))
+          pipeline.execute_command('BITFIELD', self.key, *arguments)
+      else:
+        for offset, bit in bits:
+          pipeline.setbit(self.key, offset, bit)
+    self.client.pipelined(build)
+
+  def count(self, start=None, end=None):
+    """Returns the number of set bits, optionally between two byte offsets."""
+    return self.client.bitcount(self.key, start, end)
+
+  def first(self, bit=True, start=None, end=None):
+    """Returns the offset of the first bit set to 'bit', or -1."""
+    return self.client.bitpos(self.key, 1 if bit else 0, start, end)
+
+  def bitop(self, operation, *others):
+    """Applies a bitwise AND, OR or XOR of other bitmaps to this bitmap."""
+    self.client.bitop(operation, self.key, self.key, *[other.key for other in others])
+    return self
+
+  def clear(self):
+    """Clears all bits."""
+    self.client.delete(self.key)
+
+  def delete(self, references=False, progress=None):
+    """Deletes the bitmap."""
+    return self._delete(references, progress)
+
+  def __getitem__(self, offset):
+    """Returns the bit at an offset."""
+    return self.client.result(self.client.getbit(self.key, offset), bool)
+
+  def __setitem__(self, offset, value):
+    """Sets the bit at an offset."""
+    self.client.setbit(self.key, offset, 1 if value else 0)
+
+  def __iand__(self, other):
+    return self.bitop('AND', other)
+
+  def __ior__(self, other):
+    return self.bitop('OR', other)
+
+  def __ixor__(self, other):
+    return self.bitop('XOR', other)
+
+  def __repr__(self):
+    return '<Bitmap %s count=%d>' % (self.key, self.count())
@@ -0,0 +1,108 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from active_redis.core import DataType
+from active_redis.registry import datatype
+import collections, heapq
+
+@datatype
+class Counter(DataType):
+  """
+  A Redis counter data type.
+
+  Counts are stored as integers in a hash, so keys behave like those
+  of a dict and missing keys count zero, as with collections.Counter.
+  Every increment is applied atomically on the server.
+  """
+  type = 'counter'
+
+  # The number of increments sent per pipeline by update().
+  chunk_size = 1000
+
+  def increment(self, key, amount=1):
+    """Atomically increments a count, returning the new count."""
+    return self.client.hincrby(self.key, key, amount)
+
+  def decrement(self, key, amount=1):
+    """Atomically decrements a count, returning the new count."""
+    return self.client.hincrby(self.key, key, -amount)
+
+  def update(self, counts):
+    """Adds counts from a mapping or an iterable of keys.
+
+    Counts are aggregated locally and applied with one HINCRBY per
+    distinct key, sent in pipelines of chunk_size commands.
+    """
+    if hasattr(counts, 'iteritems'):
+      counts = counts.iteritems()
+    else:
+      counts = collections.Counter(counts).iteritems()
+    increments = [(key, amount) for key, amount in counts if amount]
+    for i in range(0, len(increments), self.chunk_size):
+      def build(pipeline, chunk=increments[i:i+self.chunk_size]):
+        for key, amount in chunk:
+          pipeline.hincrby(self.key, key, amount)
+      self.client.pipelined(build)
+
+  def subtract(self, counts):
+    """Subtracts counts from a mapping or an iterable of keys."""
+    if hasattr(counts, 'iteritems'):
+      counts = counts.iteritems()
+    else:
+      counts = collections.Counter(counts).iteritems()
+    self.update(dict((key, -amount) for key, amount in counts))
+
+  def get(self, key, default=0):
+    """Returns a count, or 'default' if the key has not been counted."""
+    return self.client.result(self.client.hget(self.key, key), lambda count: int(count) if count is not None else default)
+
+  def items(self):
+    """Returns all (key, count) pairs."""
+    return [(key, int(count)) for key, count in self.client.redis.hgetall(self.key).items()]
+
+  def keys(self):
+    """Returns all counted keys."""
+    return self.client.hkeys(self.key)
+
+  def total(self):
+    """Returns the sum of all counts."""
+    return sum(int(count) for count in self.client.redis.hvals(self.key))
+
+  def most_common(self, n=None):
+    """Returns the 'n' most common (key, count) pairs, or all pairs."""
+    items = self.items()
+    if n is None:
+      return sorted(items, key=lambda item: item[1], reverse=True)
+    return heapq.nlargest(n, items, key=lambda item: item[1])
+
+  def clear(self):
+    """Clears all counts."""
+    self.client.delete(self.key)
+
+  def delete(self, references=False, progress=None):
+    """Deletes the counter."""
+    return self._delete(references, progress)
+
+  def __len__(self):
+    """Returns the number of counted keys."""
+    return self.client.redis.hlen(self.key)
+
+  def __iter__(self):
+    return iter(self.keys())
+
+  def __contains__(self, key):
+    return self.client.redis.hexists(self.key, key)
+
+  def __getitem__(self, key):
+    """Returns a count, which is zero for keys not counted."""
+    return self.get(key)
+
+  def __setitem__(self, key, count):
+    """Sets a count."""
+    self.client.hset(self.key, key, int(count))
+
+  def __delitem__(self, key):
+    """Removes a count."""
+    self.client.hdel(self.key, key)
+
+  def __repr__(self):
+    return 'Counter(%r)' % (dict(self.items()),)
@@ -1,6 +1,6 @@
 # Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
 # See LICENSE for details.
-from active_redis.core import DataType, Observer, Script
+from active_redis.core import DataType, Observer, Script, ScriptManager
 from active_redis.registry import datatype
 
 class SetDefault(Script):
@@ -15,7 +15,7 @@ class SetDefault(Script):
   local field = ARGV[1]
 
   local exists = redis.call('HEXISTS', key, field)
-  if exists then
+  if exists == 1 then
     return redis.call('HGET', key, field)
   else
     local default = ARGV[2]
@@ -24,6 +24,23 @@ class SetDefault(Script):
   end
   """
 
+class Pop(Script):
+  """
+  Pops and returns a dictionary item.
+  """
+  keys = ['key']
+  args = ['field']
+
+  script = """
+  local key = KEYS[1]
+  local field = ARGV[1]
+  local val = redis.call('HGET', key, field)
+  if val then
+    redis.call('HDEL', key, field)
+  end
+  return val
+  """
+
 class PopItem(Script):
   """
   Pops and returns an item from the dictionary.
@@ -33,7 +50,7 @@ class PopItem(Script):
   script = """
   local key = KEYS[1]
   local keys = redis.call('HKEYS', key)
-  if keys[1] != nil then
+  if keys[1] ~= nil then
     local val = redis.call('HGET', key, keys[1])
     redis.call('HDEL', key, keys[1])
     return val
@@ -41,13 +58,41 @@ class PopItem(Script):
   return nil
   """
 
+class HasKeys(Script):
+  """
+  Indicates which of several fields exist in the dictionary.
+  """
+  keys = ['key']
+  variable_args = True
+
+  script = """
+  local key = KEYS[1]
+  local result = {}
+  for i, field in ipairs(ARGV) do
+    result[i] = redis.call('HEXISTS', key, field)
+  end
+  return result
+  """
+
 @datatype
 class Dict(DataType, Observer):
   """
   A Redis dict data type.
   """
   type = 'dict'
-  _scripts = {'set_default': SetDefault}
+
+  # The COUNT hint passed to HSCAN when lazily iterating over the dict.
+  scan_count = 1000
+
+  # The number of fields sent per command by the bulk methods.
+  chunk_size = 1000
+
+  _scripts = {
+    'setdefault': SetDefault,
+    'pop': Pop,
+    'popitem': PopItem,
+    'has_keys': HasKeys,
+  }
 
   def notify(self, subject, key):
     """Updates a dict subject."""
@@ -55,27 +100,90 @@ class Dict(DataType, Observer):
 
   def clear(self):
     """Clears the dict."""
+    if self._writeback is not None:
+      self._writeback.clear()
     self.client.delete(self.key)
+    self.client.invalidate(self.key)
 
   def get(self, key, default=None):
     """Gets a value from the dict."""
-    item = self.client.hget(self.key, key)
-    if item is not None:
-      return self.client.decode(item)
-    return default
+    def decode(item):
+      if item is not None:
+        return self.client.decode(item)
+      return default
+    return self.client.result(self._get_raw(key), decode)
+
+  def _get_raw(self, key):
+    """Gets a raw dict value, reading through the client cache."""
+    return self.client.cached(self.key, key, lambda: self.client.hget(self.key, key))
 
   def has_key(self, key):
     """Indicates whether the given key exists."""
     return self.client.hexists(self.key, key)
 
+  def _chunks(self, keys):
+    """Splits keys into chunks of chunk_size."""
+    for i in range(0, len(keys), self.chunk_size):
+      yield keys[i:i+self.chunk_size]
+
+  def get_many(self, keys, default=None):
+    """Gets several values from the dict.
+
+    Returns a list aligned with 'keys', using HMGET in chunks sent in
+    a single pipeline. Missing keys are returned as 'default'.
+    """
+    keys = list(keys)
+    pipeline = self.client.redis.pipeline(transaction=False)
+    for chunk in self._chunks(keys):
+      pipeline.hmget(self.key, chunk)
+    items = [item for result in pipeline.execute() for item in result]
+    values = iter(self.client.decode_many([item for item in items if item is not None]))
+    return [self.observe(next(values), key) if item is not None else default for key, item in zip(keys, items)]
+
+  def has_keys(self, keys):
+    """Returns a list of booleans indicating which of 'keys' exist.
+
+    Fields are checked server-side in chunks sent in a single pipeline,
+    so values are never transferred.
+    """
+    keys = list(keys)
+    manager = ScriptManager.get(self.client.redis)
+    pipeline = self.client.redis.pipeline(transaction=False)
+    for chunk in self._chunks(keys):
+      manager.execute(HasKeys, [self.key], chunk, pipeline)
+    # The results include that of the SCRIPT LOAD queued by the manager.
+    return [bool(flag) for result in pipeline.execute() if isinstance(result, list) for flag in result]
+
+  def _get_all(self):
+    """Fetches and decodes all fields with a single HGETALL."""
+    items = self.client.redis.hgetall(self.key)
+    keys = items.keys()
+    return zip(keys, self.client.decode_many([items[key] for key in keys]))
+
+  def _iter_scan(self, count=None):
+    """Streams decoded (key, item) pairs using HSCAN cursors."""
+    count = count or self.scan_count
+    cursor = 0
+    while True:
+      cursor, items = self.client.redis.hscan(self.key, cursor, count=count)
+      keys = items.keys()
+      for key, item in zip(keys, self.client.decode_many([items[key] for key in keys])):
+        yield key, item
+      if cursor == 0:
+        break
+
   def items(self):
     """Returns all dict items."""
-    return [(key, self.observe(self.client.decode(item), key)) for key, item in self.client.hgetall(self.key).items()]
+    return [(key, self.observe(item, key)) for key, item in self._get_all()]
+
+  def iteritems(self, count=None):
+    """Returns a lazy iterator over dict items.
 
-  def iteritems(self):
-    """Returns an iterator over dict items."""
-    for key in self.client.hkeys(self.key):
-      yield key, self.observe(self.client.decode(self.client.hget(self.key, key)), key)
+    Items are fetched with HSCAN using 'count' (or the dict's scan_count)
+    as a hint, so the whole hash never needs to be held in memory.
+    """
+    for key, item in self._iter_scan(count):
+      yield key, self.observe(item, key)
 
   def keys(self):
     """Returns all dict keys."""
@@ -87,46 +195,82 @@ class Dict(DataType, Observer):
 
   def values(self):
     """Returns all dict values."""
-    return [self.observe(self.client.decode(self.client.hget(self.key, key)), key) for key in self.client.hkeys(self.key)]
+    return [self.observe(item, key) for key, item in self._get_all()]
 
-  def itervalues(self):
-    """Returns an iterator over dict values."""
-    for key in self.client.hkeys(self.key):
-      yield self.observe(self.client.decode(self.client.hget(self.key, key)), key)
+  def itervalues(self, count=None):
+    """Returns a lazy iterator over dict values."""
+    for key, item in self._iter_scan(count):
+      yield self.observe(item, key)
 
   def pop(self, key, *args):
     """Pops a value from the dictionary."""
-    item = self.client.hget(self.key, key)
-    if item is not None:
-      return self.client.decode(item)
-    else:
-      try:
-        return args[0]
-      except IndexError:
-        raise KeyError("Invalid key %s." % (key,))
+    def decode(item):
+      if item is not None:
+        return self.client.decode(item)
+      else:
+        try:
+          return args[0]
+        except IndexError:
+          raise KeyError("Invalid key %s." % (key,))
+    self.flush()
+    item = self._execute_script('pop', self.key, key)
+    self.client.invalidate(self.key, key)
+    return self.client.result(item, decode)
 
   def popitem(self):
     """Pops a random item from the dictionary."""
+    def decode(item):
+      if item is not None:
+        return self.client.decode(item)
+      else:
+        raise KeyError("Dictionary is empty.")
+    self.flush()
     item = self._execute_script('popitem', self.key)
-    if item is not None:
-      return self.client.decode(item)
-    else:
-      raise KeyError("Dictionary is empty.")
+    self.client.invalidate(self.key)
+    return self.client.result(item, decode)
 
   def setdefault(self, key, default=None):
     """Sets a dict item value or default value."""
-    return self._execute_script('setdefault', self.key, key, default)
+    item = self._execute_script('setdefault', self.key, key, self.client.encode(default))
+    self.client.invalidate(self.key, key)
+    return self.client.result(item, lambda item: self.observe(self.client.decode(item), key))
 
-  def delete(self, references=False):
+  def delete(self, references=False, progress=None):
     """Deletes the dictionary."""
-    if references is True:
-      for key, item in self.iteritems():
-        if isinstance(item, DataType):
-          item.delete()
-    self.client.delete(self.key)
+    return self._delete(references, progress)
+
+  def _scan_page(self, pipeline, cursor):
+    """Queues an HSCAN for a page of the dict."""
+    pipeline.hscan(self.key, cursor or 0, count=self.scan_count)
+    return True
+
+  def _parse_page(self, cursor, result):
+    """Returns the next HSCAN cursor and the page values."""
+    cursor, items = result
+    return cursor or None, items.values()
+
+  @classmethod
+  def _bulk_encode(cls, client, items):
+    """Encodes a chunk of (key, item) pairs for bulk loading."""
+    return [(key, client.encode(item)) for key, item in items]
+
+  def _bulk_push(self, pipeline, values):
+    """Queues an HMSET of encoded fields."""
+    pipeline.hmset(self.key, dict(values))
+
+  def _prefetch(self, pipeline):
+    """Queues an HGETALL for prefetching."""
+    pipeline.hgetall(self.key)
+    return True
+
+  def _prefetched(self, cache, result, version):
+    """Caches prefetched fields."""
+    for key, item in result.items():
+      cache.set(self.key, key, item, version)
+    return result.values()
 
   def __len__(self):
-    return self.client.hlen(self.key)
+    return self.client.redis.hlen(self.key)
 
   def __iter__(self):
     """Iterates over dict keys."""
@@ -134,23 +278,30 @@ class Dict(DataType, Observer):
 
   def __getitem__(self, key):
     """Gets a dict item."""
-    item = self.client.hget(self.key, key)
-    if item is not None:
-      return self.observe(self.client.decode(item), key)
-    else:
-      raise KeyError("Key %s not found." % (key,))
+    def decode(item):
+      if item is not None:
+        return self.observe(self.client.decode(item), key)
+      else:
+        raise KeyError("Key %s not found." % (key,))
+    return self.client.result(self._get_raw(key), decode)
 
   def __setitem__(self, key, item):
     """Sets a dict item."""
-    return self.client.hset(self.key, key, self.client.encode(item))
+    self._discard(key)
+    retval = self.client.hset(self.key, key, self.client.encode(item))
+    self.client.invalidate(self.key, key)
+    return retval
 
   def __delitem__(self, key):
     """Deletes an item from the dict."""
-    return self.client.hdel(self.key, key)
+    self._discard(key)
+    retval = self.client.hdel(self.key, key)
+    self.client.invalidate(self.key, key)
+    return retval
 
   def __contains__(self, key):
     """Supports using 'in' and 'not in' operators."""
-    return self.has_key(key)
+    return self.client.redis.hexists(self.key, key)
 
   def __repr__(self):
     return repr(dict(self.items()))
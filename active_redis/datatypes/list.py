@@ -1,7 +1,8 @@
 # Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
 # See LICENSE for details.
-from active_redis.core import DataType, Observer, Script
+from active_redis.core import DataType, Observer, Script, ScriptManager
 from active_redis.registry import datatype
+from redis import ResponseError
 
 class ListInsert(Script):
   """
@@ -36,70 +37,104 @@ class ListPop(Script):
 class ListCount(Script):
   """
   Handles counting the number of occurences of an item in a list.
+
+  The list is read in a single pass of LRANGE pages.
   """
   keys = ['key']
-  args = ['item']
+  args = ['item', 'page_size']
 
   script = """
   local key = KEYS[1]
   local item = ARGV[1]
+  local page_size = tonumber(ARGV[2])
 
-  local i = 0
   local count = 0
-  local val = redis.call('LINDEX', i)
-  while val do
-    if val == item then
-      count = count + 1
+  local start = 0
+  while true do
+    local items = redis.call('LRANGE', key, start, start + page_size - 1)
+    for i = 1, #items do
+      if items[i] == item then
+        count = count + 1
+      end
+    end
+    if #items < page_size then
+      return count
     end
-    i = i + 1
-    val = redis.call('LINDEX', i)
+    start = start + page_size
   end
-  return count
   """
 
 class ListContains(Script):
   """
   Indicates whether the list contains an object.
+
+  The list is read in a single pass of LRANGE pages, stopping at the
+  first match.
   """
   keys = ['key']
-  args = ['item']
+  args = ['item', 'page_size']
 
   script = """
   local key = KEYS[1]
   local item = ARGV[1]
-
-  local i = 0
-  local val = redis.call('LINDEX', key, i)
-  while val do
-    if val == item then
-      return true
+  local page_size = tonumber(ARGV[2])
+
+  local start = 0
+  while true do
+    local items = redis.call('LRANGE', key, start, start + page_size - 1)
+    for i = 1, #items do
+      if items[i] == item then
+        return 1
+      end
+    end
+    if #items < page_size then
+      return 0
     end
-    i = i + 1
-    val = redis.call('LINDEX', key, i)
+    start = start + page_size
   end
-  return false
   """
 
+  def process(self, value):
+    return bool(value)
+
 class ListReverse(Script):
   """
   Reverses all items in the list.
   """
-  keys = ['key']
-
-  # Copies the list to a temporary key and builds the list in reverse.
+  keys = ['key', 'tempkey']
+  args = ['page_size']
+
+  # Copies the list to a temporary key in reverse, one page at a time
+  # starting from the tail, and renames the copy over the list. Items
+  # are pushed in chunks to stay within Lua's stack limits. unpack() is
+  # a global in the Lua 5.1 embedded by Redis but lives in 'table' in
+  # later versions.
   script = """
+  local unpack = unpack or table.unpack
   local key = KEYS[1]
-  local tempkey = key..':reverse'
-  redis.call('SUNIONSTORE', tempkey, key)
-  redis.call('DEL', key)
-
-  local item = redis.call('RPOP', tempkey)
-  while item do
-    redis.call('RPUSH', key)
-    item = redis.call('RPOP', tempkey)
+  local tempkey = KEYS[2]
+  local page_size = tonumber(ARGV[1])
+
+  local stop = redis.call('LLEN', key) - 1
+  if stop < 0 then
+    return 0
   end
+
   redis.call('DEL', tempkey)
-  return true
+  while stop >= 0 do
+    local start = math.max(stop - page_size + 1, 0)
+    local items = redis.call('LRANGE', key, start, stop)
+    for i = #items, 1, -1000 do
+      local chunk = {}
+      for j = i, math.max(i - 999, 1), -1 do
+        chunk[#chunk + 1] = items[j]
+      end
+      redis.call('RPUSH', tempkey, unpack(chunk))
+    end
+    stop = start - 1
+  end
+  redis.call('RENAME', tempkey, key)
+  return 1
   """
 
 class ListDelete(Script):
@@ -118,12 +153,182 @@ class ListDelete(Script):
   redis.call('LREM', key, 1, delval)
   """
 
+# Lua functions shared by the slice scripts. slice() normalizes slice
+# bounds following the rules of Python's slice.indices(), indices()
+# expands a normalized slice, and push() RPUSHes a range of a table
+# in chunks to stay within Lua's stack limits. unpack() is a global in
+# the Lua 5.1 embedded by Redis but lives in 'table' in later versions.
+SLICE_FUNCTIONS = """
+  local unpack = unpack or table.unpack
+
+  local function slice(length, start, stop, step)
+    local lower, upper = 0, length
+    if step < 0 then
+      lower, upper = -1, length - 1
+    end
+    local function bound(index, default)
+      if index == nil then
+        return default
+      elseif index < 0 then
+        return math.max(index + length, lower)
+      else
+        return math.min(index, upper)
+      end
+    end
+    if step > 0 then
+      return bound(start, lower), bound(stop, upper)
+    else
+      return bound(start, upper), bound(stop, lower)
+    end
+  end
+
+  local function indices(start, stop, step)
+    local result = {}
+    local index = start
+    while (step > 0 and index < stop) or (step < 0 and index > stop) do
+      result[#result + 1] = index
+      index = index + step
+    end
+    return result
+  end
+
+  local function push(key, items, first, last)
+    for i = first, last, 1000 do
+      redis.call('RPUSH', key, unpack(items, i, math.min(i + 999, last)))
+    end
+  end
+"""
+
+class ListGetSlice(Script):
+  """
+  Returns the items of an extended slice of a list.
+  """
+  keys = ['key']
+  args = ['start', 'stop', 'step']
+
+  script = SLICE_FUNCTIONS + """
+  local key = KEYS[1]
+  local step = tonumber(ARGV[3])
+  local start, stop = slice(redis.call('LLEN', key), tonumber(ARGV[1]), tonumber(ARGV[2]), step)
+
+  local selected = indices(start, stop, step)
+  if #selected == 0 then
+    return {}
+  end
+  local low = math.min(selected[1], selected[#selected])
+  local high = math.max(selected[1], selected[#selected])
+  local items = redis.call('LRANGE', key, low, high)
+
+  local result = {}
+  for i, index in ipairs(selected) do
+    result[i] = items[index - low + 1]
+  end
+  return result
+  """
+
+class ListDeleteSlice(Script):
+  """
+  Deletes a slice of a list.
+
+  Contiguous slices are removed with LTRIM, moving whichever side of
+  the slice is shorter. Extended slices are marked and removed.
+  """
+  keys = ['key']
+  args = ['start', 'stop', 'step']
+
+  script = SLICE_FUNCTIONS + """
+  local key = KEYS[1]
+  local step = tonumber(ARGV[3])
+  local length = redis.call('LLEN', key)
+  local start, stop = slice(length, tonumber(ARGV[1]), tonumber(ARGV[2]), step)
+
+  if step == 1 then
+    if start >= stop then
+      return 0
+    end
+    if start == 0 then
+      redis.call('LTRIM', key, stop, -1)
+    elseif stop >= length then
+      redis.call('LTRIM', key, 0, start - 1)
+    elseif start < length - stop then
+      local head = redis.call('LRANGE', key, 0, start - 1)
+      redis.call('LTRIM', key, stop, -1)
+      for i = #head, 1, -1000 do
+        local chunk = {}
+        for j = i, math.max(i - 999, 1), -1 do
+          chunk[#chunk + 1] = head[j]
+        end
+        redis.call('LPUSH', key, unpack(chunk))
+      end
+    else
+      local tail = redis.call('LRANGE', key, stop, -1)
+      redis.call('LTRIM', key, 0, start - 1)
+      push(key, tail, 1, #tail)
+    end
+    return stop - start
+  end
+
+  local delval = '____delete____'
+  local selected = indices(start, stop, step)
+  for i, index in ipairs(selected) do
+    redis.call('LSET', key, index, delval)
+  end
+  redis.call('LREM', key, 0, delval)
+  return #selected
+  """
+
+class ListSetSlice(Script):
+  """
+  Atomically replaces a slice of a list.
+  """
+  keys = ['key']
+  args = ['start', 'stop', 'step']
+  variable_args = True
+
+  script = SLICE_FUNCTIONS + """
+  local key = KEYS[1]
+  local step = tonumber(ARGV[3])
+  local length = redis.call('LLEN', key)
+  local start, stop = slice(length, tonumber(ARGV[1]), tonumber(ARGV[2]), step)
+  local count = #ARGV - 3
+
+  if step == 1 then
+    stop = math.max(start, stop)
+    local tail = redis.call('LRANGE', key, stop, -1)
+    if start == 0 then
+      redis.call('DEL', key)
+    else
+      redis.call('LTRIM', key, 0, start - 1)
+    end
+    push(key, ARGV, 4, #ARGV)
+    push(key, tail, 1, #tail)
+    return count
+  end
+
+  local selected = indices(start, stop, step)
+  if #selected ~= count then
+    return redis.error_reply('attempt to assign sequence of size ' .. count .. ' to extended slice of size ' .. #selected)
+  end
+  for i, index in ipairs(selected) do
+    redis.call('LSET', key, index, ARGV[i + 3])
+  end
+  return count
+  """
+
 @datatype
 class List(DataType, Observer):
   """
   A Redis list data type.
   """
   type = 'list'
+
+  # The number of items fetched per LRANGE call when iterating.
+  page_size = 1000
+
+  # Whether to use the native LPOS command (Redis >= 6.0.6) for
+  # count() and 'in' checks rather than scanning the list in Lua.
+  use_lpos = False
+
   _scripts = {
     'insert': ListInsert,
     'pop': ListPop,
@@ -131,6 +336,9 @@ class List(DataType, Observer):
     'contains': ListContains,
     'reverse': ListReverse,
     'delete': ListDelete,
+    'get_slice': ListGetSlice,
+    'delete_slice': ListDeleteSlice,
+    'set_slice': ListSetSlice,
   }
 
   def notify(self, subject, index):
@@ -140,87 +348,218 @@ class List(DataType, Observer):
   def append(self, item):
     """Appends an item to the list."""
     self.client.rpush(self.key, self.client.encode(item))
+    self.client.invalidate(self.key)
 
   def extend(self, items):
     """Extends the list."""
-    self.client.rpush(*[self.client.encode(item) for item in items])
+    values = [self.client.encode(item) for item in items]
+    if values:
+      self.client.rpush(self.key, *values)
+      self.client.invalidate(self.key)
 
   def insert(self, index, item):
     """Inserts an item into the list."""
-    return self._execute_script('insert', self.key, index, self.client.encode(item))
+    self.flush()
+    retval = self._execute_script('insert', self.key, index, self.client.encode(item))
+    self.client.invalidate(self.key)
+    return retval
 
   def remove(self, item):
     """Removes an item from the list."""
+    self.flush()
     self.client.lrem(self.key, self.client.encode(item))
+    self.client.invalidate(self.key)
 
   def pop(self, index=0):
     """Pops and returns an item from the list."""
-    return self._execute_script('pop', self.key, index)
+    def decode(item):
+      if item is None:
+        raise IndexError("Index out of range.")
+      return self.client.decode(item)
+    self.flush()
+    item = self._execute_script('pop', self.key, index)
+    self.client.invalidate(self.key)
+    return self.client.result(item, decode)
 
   def index(self, index):
     """Returns a list item by index."""
-    item = self.client.lindex(self.key, index)
-    if item is not None:
-      return self.client.decode(item)
-    else:
-      raise IndexError("Index out of range.")
+    def decode(item):
+      if item is not None:
+        return self.client.decode(item)
+      else:
+        raise IndexError("Index out of range.")
+    return self.client.result(self._get_raw(index), decode)
 
   def count(self, item):
     """Counts the number of occurences of an item in the list."""
-    return self._execute_script('count', self.key, self.client.encode(item))
+    if self.use_lpos:
+      return self.client.result(self._lpos(self.client.encode(item), count=0), len)
+    return self._execute_script('count', self.key, self.client.encode(item), self.page_size)
+
+  def _lpos(self, value, rank=None, count=None, maxlen=None):
+    """Executes LPOS for an encoded value."""
+    args = []
+    if rank is not None:
+      args += ['RANK', rank]
+    if count is not None:
+      args += ['COUNT', count]
+    if maxlen is not None:
+      args += ['MAXLEN', maxlen]
+    return self.client.execute_command('LPOS', self.key, value, *args)
+
+  def positions(self, item, rank=None, count=None, maxlen=None):
+    """Returns the indexes of an item using LPOS.
+
+    'rank' selects which match to start from (negative values search
+    from the tail), 'count' limits the number of matches returned
+    (0 returns all matches) and 'maxlen' limits the number of items
+    compared. Requires Redis >= 6.0.6.
+    """
+    return self.client.result(self._lpos(self.client.encode(item), rank, count or 0, maxlen), list)
 
   def sort(self):
     """Sorts the list."""
+    self.flush()
     self.client.sort(self.key)
     return self
 
   def reverse(self):
     """Reverses the list."""
-    self._execute_script('reverse', self.key)
+    self.flush()
+    self._execute_script('reverse', self.key, '%s:reverse' % (self.key,), self.page_size)
+    self.client.invalidate(self.key)
     return self
 
-  def delete(self, references=False):
+  def delete(self, references=False, progress=None):
     """Deletes the list."""
-    if references is True:
-      for item in self:
-        if isinstance(item, DataType):
-          item.delete()
-    self.client.delete(self.key)
+    return self._delete(references, progress)
+
+  def _scan_page(self, pipeline, cursor):
+    """Queues an LRANGE for a page of the list."""
+    start = cursor or 0
+    pipeline.lrange(self.key, start, start + self.page_size - 1)
+    return True
+
+  def _parse_page(self, cursor, result):
+    """Returns the next page offset and the page items."""
+    if len(result) < self.page_size:
+      return None, result
+    return (cursor or 0) + self.page_size, result
+
+  _bulk_ordered = True
+
+  @classmethod
+  def _bulk_encode(cls, client, items):
+    """Encodes a chunk of items for bulk loading."""
+    return [client.encode(item) for item in items]
+
+  def _bulk_push(self, pipeline, values):
+    """Queues an RPUSH of encoded items."""
+    pipeline.rpush(self.key, *values)
+
+  def _prefetch(self, pipeline):
+    """Queues an LRANGE of the first page of the list for prefetching."""
+    pipeline.lrange(self.key, 0, self.page_size - 1)
+    return True
+
+  def _prefetched(self, cache, result, version):
+    """Caches prefetched items by index."""
+    for index, item in enumerate(result):
+      cache.set(self.key, index, item, version)
+    return result
+
+  def _get_raw(self, index):
+    """Gets a raw list item, reading through the client cache."""
+    return self.client.cached(self.key, index, lambda: self.client.lindex(self.key, index))
+
+  def _iter_range(self, page_size=None):
+    """Streams decoded (index, item) pairs using paged LRANGE calls."""
+    page_size = page_size or self.page_size
+    start = 0
+    while True:
+      items = self.client.redis.lrange(self.key, start, start + page_size - 1)
+      for index, item in enumerate(self.client.decode_many(items), start):
+        yield index, item
+      if len(items) < page_size:
+        break
+      start += page_size
+
+  def iterate(self, page_size=None):
+    """Returns an iterator which fetches items in pages of 'page_size'."""
+    for index, item in self._iter_range(page_size):
+      yield self.observe(item, index)
 
   def __iter__(self):
     """Returns an iterator."""
-    i = 0
-    item = self.client.lindex(self.key, i)
-    while item is not None:
-      yield self.observe(self.client.decode(item), i)
-      i += 1
-      item = self.client.lindex(self.key, i)
+    return self.iterate()
 
   def __len__(self):
     """Supports the len() global function."""
-    return self.client.llen(self.key)
+    return self.client.redis.llen(self.key)
+
+  def _slice_args(self, key):
+    """Converts a slice to script arguments."""
+    if key.step == 0:
+      raise ValueError("slice step cannot be zero")
+    return ['' if value is None else value for value in (key.start, key.stop, key.step or 1)]
+
+  def _get_slice(self, key):
+    """Gets a slice of the list in a single round trip."""
+    if key.step is None or key.step == 1:
+      if key.stop == 0:
+        return []
+      stop = -1 if key.stop is None else key.stop - 1
+      items = self.client.lrange(self.key, key.start or 0, stop)
+    else:
+      items = self._execute_script('get_slice', self.key, *self._slice_args(key))
+    return self.client.result(items, self.client.decode_many)
 
   def __getitem__(self, key):
-    """Gets a list item."""
-    item = self.client.lindex(self.key, key)
-    if item is None:
-      raise IndexError("Index out of range.")
-    return self.observe(self.client.decode(item), key)
+    """Gets a list item or slice."""
+    if isinstance(key, slice):
+      return self._get_slice(key)
+    def decode(item):
+      if item is None:
+        raise IndexError("Index out of range.")
+      return self.observe(self.client.decode(item), key)
+    return self.client.result(self._get_raw(key), decode)
 
   def __setitem__(self, key, item):
-    """Sets a list item."""
-    return self.client.lset(self.key, key, self.client.encode(item))
+    """Sets a list item or slice."""
+    if isinstance(key, slice):
+      self.flush()
+    else:
+      self._discard(key)
+    try:
+      if isinstance(key, slice):
+        items = [self.client.encode(value) for value in item]
+        return self._execute_script('set_slice', self.key, *(self._slice_args(key) + items))
+      return self.client.lset(self.key, key, self.client.encode(item))
+    except ResponseError as e:
+      if isinstance(key, slice):
+        raise ValueError(str(e))
+      raise IndexError("Index out of range.")
+    finally:
+      self.client.invalidate(self.key)
 
   def __delitem__(self, key):
-    """Deletes a list item."""
+    """Deletes a list item or slice."""
+    self.flush()
     try:
+      if isinstance(key, slice):
+        return self._execute_script('delete_slice', self.key, *self._slice_args(key))
       return self._execute_script('delete', self.key, key)
     except ResponseError:
       raise IndexError("Index out of range.")
+    finally:
+      self.client.invalidate(self.key)
 
   def __contains__(self, item):
     """Supports using 'in' and 'not in' operators."""
-    return self._execute_script('contains', self.key, self.client.encode(item))
+    value = self.client.encode(item)
+    if self.use_lpos:
+      return self.client.redis.execute_command('LPOS', self.key, value) is not None
+    return bool(ScriptManager.get(self.client.redis).execute(ListContains, [self.key], [value, self.page_size]))
 
   def __repr__(self):
-    return repr([item for item in self])
+    return repr([item for index, item in self._iter_range()])
@@ -0,0 +1,359 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from active_redis.core import DataType, Script, ScriptManager
+from active_redis.registry import datatype
+import math, time, uuid
+
+class QueuePopMany(Script):
+  """
+  Pops up to a number of messages from several lanes in order.
+  """
+  args = ['count']
+  variable_keys = True
+
+  script = """
+  local messages = {}
+  local count = tonumber(ARGV[1])
+  for i = 1, #KEYS do
+    while #messages < count do
+      local message = redis.call('RPOP', KEYS[i])
+      if not message then
+        break
+      end
+      messages[#messages + 1] = message
+    end
+  end
+  return messages
+  """
+
+# A Lua function shared by the requeue and reserve scripts. requeue()
+# returns messages whose deadline has passed from the processing list
+# to their lanes, which follow the processing, deadlines and signal
+# keys in priority order, and raises the signal if any were returned.
+# Expired messages are found by score, and are near the tail of the
+# processing list, which is where LREM starts looking for them.
+REQUEUE_FUNCTION = """
+  local function requeue(now)
+    local count = 0
+    for _, message in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)) do
+      redis.call('ZREM', KEYS[2], message)
+      if redis.call('LREM', KEYS[1], -1, message) > 0 then
+        local priority = tonumber(string.match(message, '^[^:]*:(%d+):'))
+        redis.call('RPUSH', KEYS[4 + priority] or KEYS[4], message)
+        count = count + 1
+      end
+    end
+    if count > 0 then
+      redis.call('LPUSH', KEYS[3], 1)
+      redis.call('LTRIM', KEYS[3], 0, 0)
+    end
+    return count
+  end
+"""
+
+class QueueReserve(Script):
+  """
+  Moves the next message to the processing list with a deadline.
+
+  Expired messages are requeued first. If all lanes are empty the
+  signal list is cleared, and the earliest deadline of the reserved
+  messages, if any, is returned in place of a message.
+  """
+  keys = ['processing', 'deadlines', 'signal']
+  args = ['now', 'deadline']
+  variable_keys = True
+
+  script = REQUEUE_FUNCTION + """
+  requeue(ARGV[1])
+  for i = #KEYS, 4, -1 do
+    local message = redis.call('RPOPLPUSH', KEYS[i], KEYS[1])
+    if message then
+      redis.call('ZADD', KEYS[2], ARGV[2], message)
+      return {message}
+    end
+  end
+  redis.call('DEL', KEYS[3])
+  return {false, redis.call('ZRANGE', KEYS[2], 0, 0, 'WITHSCORES')[2]}
+  """
+
+class QueueAck(Script):
+  """
+  Removes a message from the processing list.
+  """
+  keys = ['processing', 'deadlines']
+  args = ['message']
+
+  script = """
+  redis.call('ZREM', KEYS[2], ARGV[1])
+  return redis.call('LREM', KEYS[1], -1, ARGV[1])
+  """
+
+class QueueRequeue(Script):
+  """
+  Returns messages whose deadline has passed to their lanes.
+  """
+  keys = ['processing', 'deadlines', 'signal']
+  args = ['now']
+  variable_keys = True
+
+  script = REQUEUE_FUNCTION + """
+  return requeue(ARGV[1])
+  """
+
+@datatype
+class Queue(DataType):
+  """
+  A Redis FIFO queue data type.
+
+  Items are pushed onto one list per priority lane; lane 0 is stored at
+  the queue's key and higher lanes are served first. get() pops items
+  with BRPOP across all lanes. The number of lanes is stored in
+  '<key>:priorities', so all clients of the queue use the same lanes.
+
+  For reliable processing, reserve() atomically moves an item to the
+  '<key>:processing' list with a deadline of 'visibility' seconds kept
+  in '<key>:deadlines'. The item must be acknowledged with ack() before
+  the deadline, or it is returned to its lane by requeue(), which every
+  reserve() runs first. Waiting consumers block with BLMOVE (BRPOPLPUSH
+  before Redis 6.2) on '<key>:signal', which is kept non-empty while
+  items are queued, rather than polling, and wake up by the earliest
+  deadline to requeue its item. Deadlines use the clocks of the
+  clients, which should be kept in sync.
+
+  Blocking timeouts are rounded up to whole seconds.
+  """
+  type = 'queue'
+
+  # The default visibility timeout of reserved items, in seconds.
+  visibility = 30
+
+  _scripts = {
+    'pop_many': QueuePopMany,
+    'reserve': QueueReserve,
+    'ack': QueueAck,
+    'requeue': QueueRequeue,
+  }
+
+  def __init__(self, key, client):
+    super(Queue, self).__init__(key, client)
+    self._priorities = None
+
+  @property
+  def priorities(self):
+    """The number of priority lanes.
+
+    Setting it stores the number for all clients of the queue. It should
+    not be reduced while the lanes being removed hold items.
+    """
+    if self._priorities is None:
+      self._priorities = int(self.client.redis.get(self._priorities_key) or 1)
+    return self._priorities
+
+  @priorities.setter
+  def priorities(self, priorities):
+    if priorities < 1:
+      raise ValueError("Invalid number of priorities %s." % (priorities,))
+    self.client.redis.set(self._priorities_key, priorities)
+    self._priorities = priorities
+
+  def _lane(self, priority):
+    """Returns the key of a priority lane."""
+    if priority == 0:
+      return self.key
+    return '%s:%d' % (self.key, priority)
+
+  @property
+  def _lanes(self):
+    """Lane keys from the highest priority down."""
+    return [self._lane(priority) for priority in reversed(range(self.priorities))]
+
+  @property
+  def _priorities_key(self):
+    return '%s:priorities' % (self.key,)
+
+  @property
+  def _processing(self):
+    return '%s:processing' % (self.key,)
+
+  @property
+  def _deadlines(self):
+    return '%s:deadlines' % (self.key,)
+
+  @property
+  def _signal(self):
+    return '%s:signal' % (self.key,)
+
+  @staticmethod
+  def _message(value, priority=0):
+    """Wraps an encoded item in a message with a unique ID."""
+    return '%s:%d:%s' % (uuid.uuid4().hex, priority, value)
+
+  def _decode_message(self, message):
+    return self.client.decode(message.split(':', 2)[2])
+
+  @staticmethod
+  def _timeout(timeout):
+    """Converts a timeout to whole seconds, where 0 blocks for ever."""
+    return max(1, int(math.ceil(timeout))) if timeout is not None else 0
+
+  def _push(self, pipeline, lane, messages):
+    """Queues pushing messages and raising the signal."""
+    pipeline.lpush(lane, *messages)
+    pipeline.lpush(self._signal, 1)
+    pipeline.ltrim(self._signal, 0, 0)
+
+  def put(self, item, priority=0):
+    """Puts an item on the queue."""
+    self.put_many([item], priority)
+
+  def put_many(self, items, priority=0):
+    """Puts several items on the queue in a single transaction."""
+    if not 0 <= priority < self.priorities:
+      raise ValueError("Invalid priority %s." % (priority,))
+    messages = [self._message(self.client.encode(item), priority) for item in items]
+    if messages:
+      self.client.pipelined(lambda pipeline: self._push(pipeline, self._lane(priority), messages), transaction=True)
+
+  def get(self, block=True, timeout=None):
+    """Removes and returns the next item.
+
+    Returns None if no item is available without blocking or within
+    'timeout' seconds.
+    """
+    if not block:
+      items = self.get_many(1)
+      return items[0] if items else None
+    result = self.client.redis.brpop(self._lanes, timeout=self._timeout(timeout))
+    if result is None:
+      return None
+    return self._decode_message(result[1])
+
+  def get_many(self, count, block=False, timeout=None):
+    """Removes and returns up to 'count' items.
+
+    If 'block' is true and the queue is empty, waits for an item and
+    returns it together with any other items available.
+    """
+    messages = ScriptManager.get(self.client.redis).execute(QueuePopMany, self._lanes, [count])
+    if not messages and block:
+      result = self.client.redis.brpop(self._lanes, timeout=self._timeout(timeout))
+      if result is not None:
+        messages = [result[1]]
+        if count > 1:
+          messages.extend(ScriptManager.get(self.client.redis).execute(QueuePopMany, self._lanes, [count - 1]))
+    return [self._decode_message(message) for message in messages]
+
+  def reserve(self, block=True, timeout=None, visibility=None):
+    """Reserves the next item for processing.
+
+    Returns a (receipt, item) pair, where the receipt is passed to ack()
+    once the item has been processed, or None if no item is available
+    without blocking or within 'timeout' seconds.
+    """
+    visibility = self.visibility if visibility is None else visibility
+    end = time.time() + timeout if timeout is not None else None
+    manager = ScriptManager.get(self.client.redis)
+    keys = [self._processing, self._deadlines, self._signal] + self._lanes[::-1]
+    while True:
+      now = time.time()
+      result = manager.execute(QueueReserve, keys, [int(now * 1000), int((now + visibility) * 1000)])
+      if result[0] is not None:
+        return result[0], self._decode_message(result[0])
+      if not block:
+        return None
+
+      # Wait at most until the earliest deadline, so that its item is
+      # requeued, or for one visibility timeout if nothing is reserved.
+      wait = float(result[1]) / 1000 - time.time() if len(result) > 1 else self.visibility
+      if end is not None:
+        remaining = end - time.time()
+        if remaining <= 0:
+          return None
+        wait = min(wait, remaining)
+      if wait > 0:
+        self._wait(wait)
+
+  def _wait(self, timeout):
+    """Waits until the signal is raised or 'timeout' seconds expire."""
+    if self.client.supports(6, 2):
+      self.client.redis.execute_command('BLMOVE', self._signal, self._signal, 'RIGHT', 'LEFT', self._timeout(timeout))
+    else:
+      self.client.redis.brpoplpush(self._signal, self._signal, self._timeout(timeout))
+
+  def ack(self, receipt):
+    """Acknowledges a reserved item.
+
+    Returns a boolean indicating whether the item was still reserved.
+    """
+    return self.client.result(self._execute_script('ack', self._processing, self._deadlines, receipt), bool)
+
+  def touch(self, receipt, visibility=None):
+    """Extends the deadline of a reserved item."""
+    visibility = self.visibility if visibility is None else visibility
+    self.client.execute_command('ZADD', self._deadlines, 'XX', int((time.time() + visibility) * 1000), receipt)
+
+  def requeue(self):
+    """Returns reserved items whose deadline has passed to the queue.
+
+    Returns the number of items requeued.
+    """
+    keys = [self._processing, self._deadlines, self._signal] + self._lanes[::-1]
+    return ScriptManager.get(self.client.redis).execute(QueueRequeue, keys, [int(time.time() * 1000)])
+
+  def processing(self):
+    """Returns the number of reserved items."""
+    return self.client.llen(self._processing)
+
+  def clear(self):
+    """Removes all queued and reserved items."""
+    self.client.delete(*self._keys())
+
+  def _keys(self):
+    return self._lanes + [self._processing, self._deadlines, self._signal]
+
+  def delete(self, references=False, progress=None):
+    """Deletes the queue, including reserved items."""
+    count = self._delete(references, progress)
+    keys = [key for key in self._keys() if key != self.key] + [self._priorities_key]
+    self._priorities = None
+    return count + self.client.unlink(*keys)
+
+  # Reference scanning pages through the lanes and the processing list.
+  page_size = 1000
+
+  def _scan_page(self, pipeline, cursor):
+    """Queues an LRANGE for a page of a lane or the processing list."""
+    index, start = cursor or (0, 0)
+    pipeline.lrange((self._lanes + [self._processing])[index], start, start + self.page_size - 1)
+    return True
+
+  def _parse_page(self, cursor, result):
+    """Returns the next (list, offset) cursor and the page's raw items."""
+    index, start = cursor or (0, 0)
+    values = [message.split(':', 2)[2] for message in result]
+    if len(result) == self.page_size:
+      return (index, start + self.page_size), values
+    if index + 1 < self.priorities + 1:
+      return (index + 1, 0), values
+    return None, values
+
+  _bulk_ordered = True
+
+  @classmethod
+  def _bulk_encode(cls, client, items):
+    """Encodes a chunk of items into messages for bulk loading."""
+    return [cls._message(client.encode(item)) for item in items]
+
+  def _bulk_push(self, pipeline, values):
+    """Queues pushing messages onto the default lane."""
+    self._push(pipeline, self.key, values)
+
+  def __len__(self):
+    """Returns the number of queued items, excluding reserved items."""
+    pipeline = self.client.redis.pipeline(transaction=False)
+    for lane in self._lanes:
+      pipeline.llen(lane)
+    return sum(pipeline.execute())
+
+  def __repr__(self):
+    return '<Queue %s>' % (self.key,)
@@ -1,118 +1,34 @@
 # Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
 # See LICENSE for details.
-from active_redis.core import DataType, Script
+from active_redis.core import ActiveRedis, DataType, Script
 from active_redis.registry import datatype
-
-class UnionStruct(Script):
-  """
-  Performs a union on one Redis struct and one Python struct.
-  """
-  keys = ['newset', 'set1', 'set2']
-  variable_args = True
-
-  script = """
-  local newset = KEYS[1]
-  local set1 = KEYS[2]
-  local set2 = KEYS[3]
-
-  local set2args = ARGV
-
-  if #set2args > 2 then
-    redis.call('SADD', set2, unpack(set2args))
-  end
-
-  redis.call('SUNIONSTORE', newset, set1, set2)
-  redis.call('DEL', set2)
-  """
-
-class IntersectionStruct(Script):
-  """
-  Performs an intersection on one Redis struct and one Python struct.
-  """
-  keys = ['newset', 'set1', 'set2']
-  variable_args = True
-
-  script = """
-  local newset = KEYS[1]
-  local set1 = KEYS[2]
-  local set2 = KEYS[3]
-
-  local set2args = ARGV
-
-  if #set2args > 2 then
-    redis.call('SADD', set2, unpack(set2args))
-  end
-
-  redis.call('SINTERSTORE', newset, set1, set2)
-  redis.call('DEL', set2)
-  """
-
-class DifferenceStruct(Script):
-  """
-  Performs an intersection on one Redis struct and one Python struct.
-  """
-  keys = ['newset', 'set1', 'set2']
-  variable_args = True
-
-  script = """
-  local newset = KEYS[1]
-  local set1 = KEYS[2]
-  local set2 = KEYS[3]
-
-  local set2args = ARGV
-
-  if #set2args > 2 then
-    redis.call('SADD', set2, unpack(set2args))
-  end
-
-  redis.call('SDIFFSTORE', newset, set1, set2)
-  redis.call('DEL', set2)
-  """
+from redis import WatchError
+import itertools
 
 class SymmetricDifferenceRedis(Script):
   """
   Returns a set of elements in one set or the other but not both.
-  """
-  keys = ['newset', 'set1', 'set2']
 
-  script = """
-  local newset = KEYS[1]
-  local set1 = KEYS[2]
-  local set2 = KEYS[3]
-
-  local set1diff = set1 .. ":diff"
-  local set2diff = set2 .. ":diff"
-  redis.call('SDIFFSTORE', set1diff, set1, set2)
-  redis.call('SDIFFSTORE', set2diff, set2, set1)
-  redis.call('SUNIONSTORE', newset, set1diff, set2diff)
-  redis.call('DEL', set1diff, set2diff)
-  """
-
-class SymmetricDifferenceStruct(Script):
-  """
-  Returns a set of elements in one set or the other but not both.
+  Both differences are computed before the new set is written, so the
+  new set may be one of the operands, and no keys other than those
+  passed in KEYS are accessed. Members are added in chunks to stay
+  within Lua's stack limits.
   """
   keys = ['newset', 'set1', 'set2']
-  args = []
-  variable_args = True
 
   script = """
+  local unpack = unpack or table.unpack
   local newset = KEYS[1]
   local set1 = KEYS[2]
   local set2 = KEYS[3]
 
-  -- Add set 2 items.
-  local set2args = ARGV
-  if #set2args > 0 then
-    redis.call('SADD', set2, unpack(set2args))
+  local diffs = {redis.call('SDIFF', set1, set2), redis.call('SDIFF', set2, set1)}
+  redis.call('DEL', newset)
+  for _, diff in ipairs(diffs) do
+    for i = 1, #diff, 1000 do
+      redis.call('SADD', newset, unpack(diff, i, math.min(i + 999, #diff)))
+    end
   end
-
-  local set1diff = set1 .. ":diff"
-  local set2diff = set2 .. ":diff"
-  redis.call('SDIFFSTORE', set1diff, set1, set2)
-  redis.call('SDIFFSTORE', set2diff, set2, set1)
-  redis.call('SUNIONSTORE', newset, set1diff, set2diff)
-  redis.call('DEL', set1diff, set2diff, set2) -- Set 2 is automatically deleted as well.
   """
 
 class SubsetRedis(Script):
@@ -128,25 +44,6 @@ class SubsetRedis(Script):
   return #redis.call('SDIFF', set1, set2) == 0
   """
 
-class SubsetStruct(Script):
-  """
-  Returns a boolean indicating whether a set is a subset of set1.
-  """
-  keys = ['set1']
-  variable_args = True
-
-  script = """
-  local set1 = KEYS[1]
-  local args = ARGV
-
-  local tempset = set1 .. ':temp'
-  redis.call('SADD', tempset, unpack(args))
-
-  local count = #redis.call('SDIFF', set1, tempset)
-  redis.call('DEL', diffset)
-  return count == 0
-  """
-
 class SupersetRedis(Script):
   """
   Returns a boolean indicating whether a set is a superset of set1.
@@ -160,167 +57,411 @@ class SupersetRedis(Script):
   return #redis.call('SDIFF', set2, set1) == 0
   """
 
-class SupersetStruct(Script):
-  """
-  Returns a boolean indicating whether a set is a superset of set1.
-  """
-  keys = ['set1']
-  variable_args = True
-
-  script = """
-  local set1 = KEYS[1]
-  local args = ARGV
-
-  local tempset = set1 .. ':temp'
-  redis.call('SADD', tempset, unpack(args))
-
-  local count = #redis.call('SDIFF', tempset, set1)
-  redis.call('DEL', tempset)
-  return count == 0
-  """
-
 @datatype
 class Set(DataType):
   """
   A Redis set data type.
   """
   type = 'set'
+
+  # The COUNT hint passed to SSCAN when scanning the set.
+  scan_count = 1000
+
+  # The maximum number of members included in repr().
+  repr_limit = 100
+
+  # The number of members sent per command when operating on Python
+  # sets, keeping each command's arguments bounded.
+  chunk_size = 1000
+
   _scripts = {
-    'union_struct': UnionStruct,
-    'intersect_struct': IntersectionStruct,
-    'difference_struct': DifferenceStruct,
     'symmetric_difference_redis': SymmetricDifferenceRedis,
-    'symmetric_difference_struct': SymmetricDifferenceStruct,
     'subset_redis': SubsetRedis,
-    'subset_struct': SubsetStruct,
     'superset_redis': SupersetRedis,
-    'superset_struct': SupersetStruct,
   }
 
   def add(self, item):
     """Adds an item to the set."""
-    self.client.sadd(self.key, self.client.encode(item))
+    value = self.client.encode(item)
+    self.client.sadd(self.key, value)
+    self.client.invalidate(self.key, value)
 
   def remove(self, item):
     """Removes an item from the set."""
-    if item in self:
-      self.client.srem(self.key, self.client.encode(item))
-    else:
-      raise KeyError("Item not in set.")
+    def check(removed):
+      if not removed:
+        raise KeyError("Item not in set.")
+    value = self.client.encode(item)
+    removed = self.client.srem(self.key, value)
+    self.client.invalidate(self.key, value)
+    return self.client.result(removed, check)
 
   def discard(self, item):
     """Discards an item from the set."""
-    self.client.srem(self.key, self.client.encode(item))
+    value = self.client.encode(item)
+    self.client.srem(self.key, value)
+    self.client.invalidate(self.key, value)
 
   def pop(self):
     """Pops an item from the set."""
-    item = self.redis.spop(self.key)
-    if item is None:
-      raise KeyError("Set is empty.")
-    else:
-      return self.client.decode(item)
+    def decode(item):
+      if item is None:
+        raise KeyError("Set is empty.")
+      else:
+        return self.client.decode(item)
+    item = self.client.spop(self.key)
+    self.client.invalidate(self.key)
+    return self.client.result(item, decode)
 
   def clear(self):
     """Clears all items from the set."""
     self.client.delete(self.key)
+    self.client.invalidate(self.key)
+
+  def _new_set(self):
+    """Creates a new set with a unique key."""
+    return self.__class__(ActiveRedis._create_unique_key(), self.client)
+
+  def _encode_all(self, items):
+    """Encodes and deduplicates the members of a Python set."""
+    return list(set(self.client.encode(item) for item in items))
+
+  def _chunks(self, values):
+    """Splits encoded values into chunks of chunk_size."""
+    for i in range(0, len(values), self.chunk_size):
+      yield values[i:i+self.chunk_size]
+
+  def _decode_set(self, values):
+    """Decodes raw members into a Python set."""
+    return set(self.client.decode_many(values))
+
+  def _queue_membership(self, pipeline, values):
+    """Queues membership checks for encoded values.
+
+    SMISMEMBER is used on Redis >= 6.2, otherwise one SISMEMBER is
+    queued per value.
+    """
+    if self.client.supports(6, 2):
+      for chunk in self._chunks(values):
+        pipeline.execute_command('SMISMEMBER', self.key, *chunk)
+    else:
+      for value in values:
+        pipeline.sismember(self.key, value)
+
+  @staticmethod
+  def _parse_membership(results):
+    """Flattens membership check results into a list of booleans."""
+    flags = []
+    for result in results:
+      if isinstance(result, list):
+        flags.extend(bool(flag) for flag in result)
+      else:
+        flags.append(bool(result))
+    return flags
+
+  def _membership(self, values):
+    """Returns a list of booleans indicating which values are members."""
+    pipeline = self.client.redis.pipeline(transaction=False)
+    self._queue_membership(pipeline, values)
+    return self._parse_membership(pipeline.execute())
+
+  def _update_watched(self, compute):
+    """Atomically updates the set based on its membership of some values.
+
+    'compute' is called with the set watched and returns a function
+    which queues the update on a transaction. The update is retried
+    if the set is modified in the meantime.
+    """
+    with self.client.redis.pipeline() as pipeline:
+      while True:
+        try:
+          pipeline.watch(self.key)
+          build = compute()
+          pipeline.multi()
+          build(pipeline)
+          pipeline.execute()
+          break
+        except WatchError:
+          continue
+    self.client.invalidate(self.key)
+
+  def contains_many(self, items):
+    """Returns a list of booleans indicating which of 'items' are members.
+
+    Items are encoded in one batch and checked with SMISMEMBER (or
+    SISMEMBER on older servers) in chunks sent in a single pipeline.
+    """
+    values = [self.client.encode(item) for item in items]
+    unique = list(set(values))
+    members = dict(zip(unique, self._membership(unique)))
+    return [members[value] for value in values]
 
   def update(self, other):
     """Updates items in the set with items from 'other'."""
-    self.client.sadd(self.key, [self.client.encode(item) for item in other])
+    if self.client._is_redis_item(other):
+      self.client.sunionstore(self.key, self.key, other.key)
+    else:
+      values = self._encode_all(other)
+      def build(pipeline):
+        for chunk in self._chunks(values):
+          pipeline.sadd(self.key, *chunk)
+      self.client.pipelined(build, transaction=True)
+    self.client.invalidate(self.key)
+    return self
 
-  def union(self, other):
-    """Performs a union on two sets."""
-    newset = DataType.get(self.type)(self.client)
+  def union(self, other, store=True):
+    """Performs a union on two sets.
+
+    If 'store' is false, the result is returned as a Python set rather
+    than being stored in a new Redis set.
+    """
     if self.client._is_redis_item(other):
+      if not store:
+        return self._decode_set(self.client.redis.sunion(self.key, other.key))
+      newset = self._new_set()
       self.client.sunionstore(newset.key, self.key, other.key)
-    else:
-      self._execute_script('union_struct', newset.key, self.key, self._create_unique_key(), [self.client.encode(item) for item in other])
+      return newset
+
+    if not store:
+      return self._decode_set(self.client.redis.smembers(self.key)) | set(other)
+    newset = self._new_set()
+    values = self._encode_all(other)
+    def build(pipeline):
+      pipeline.sunionstore(newset.key, self.key)
+      for chunk in self._chunks(values):
+        pipeline.sadd(newset.key, *chunk)
+    self.client.pipelined(build, transaction=True)
     return newset
 
-  def intersection(self, other):
-    """Performs an intersection on two sets."""
-    newset = DataType.get(self.type)(self.client)
+  def intersection(self, other, store=True):
+    """Performs an intersection on two sets.
+
+    If 'store' is false, the result is returned as a Python set rather
+    than being stored in a new Redis set.
+    """
     if self.client._is_redis_item(other):
+      if not store:
+        return self._decode_set(self.client.redis.sinter(self.key, other.key))
+      newset = self._new_set()
       self.client.sinterstore(newset.key, self.key, other.key)
-    else:
-      self._execute_script('intersection_struct', newset.key, self.key, self._create_unique_key(), [self.client.encode(item) for item in other])
+      return newset
+
+    values = self._encode_all(other)
+    present = [value for value, member in zip(values, self._membership(values)) if member]
+    if not store:
+      return self._decode_set(present)
+    newset = self._new_set()
+    def build(pipeline):
+      for chunk in self._chunks(present):
+        pipeline.sadd(newset.key, *chunk)
+    self.client.pipelined(build, transaction=True)
     return newset
 
   def intersection_update(self, other):
     """Updates the set via intersection."""
     if self.client._is_redis_item(other):
       self.client.sinterstore(self.key, self.key, other.key)
-    else:
-      self._execute_script('intersection_struct', self.key, self.key, self._create_unique_key(), [self.client.encode(item) for item in other])
+      self.client.invalidate(self.key)
+      return self
+
+    values = self._encode_all(other)
+    def compute():
+      present = [value for value, member in zip(values, self._membership(values)) if member]
+      def build(pipeline):
+        pipeline.delete(self.key)
+        for chunk in self._chunks(present):
+          pipeline.sadd(self.key, *chunk)
+      return build
+    self._update_watched(compute)
     return self
 
-  def difference(self, other):
-    """Performs a diff on two sets."""
-    newset = DataType.get(self.type)(self.client)
+  def difference(self, other, store=True):
+    """Performs a diff on two sets.
+
+    If 'store' is false, the result is returned as a Python set rather
+    than being stored in a new Redis set.
+    """
     if self.client._is_redis_item(other):
+      if not store:
+        return self._decode_set(self.client.redis.sdiff(self.key, other.key))
+      newset = self._new_set()
       self.client.sdiffstore(newset.key, self.key, other.key)
-    else:
-      self._execute_script('difference_struct', newset.key, self.key, self._create_unique_key(), [self.client.encode(item) for item in other])
+      return newset
+
+    values = self._encode_all(other)
+    if not store:
+      return self._decode_set(self.client.redis.smembers(self.key) - set(values))
+    newset = self._new_set()
+    def build(pipeline):
+      pipeline.sunionstore(newset.key, self.key)
+      for chunk in self._chunks(values):
+        pipeline.srem(newset.key, *chunk)
+    self.client.pipelined(build, transaction=True)
     return newset
 
-  def symmetric_difference(self, other):
-    """Returns a set of elements on one set or the other."""
-    # Remember to check whether 'other' is a Redis set or normal Python set.
-    newset = DataType.get(self.type)(self.client)
+  def difference_update(self, other):
+    """Updates the set by removing items in 'other'."""
     if self.client._is_redis_item(other):
-      self._execute_script('symmetric_difference_redis', newset.key, self.key, other.key)
+      self.client.sdiffstore(self.key, self.key, other.key)
     else:
-      self._execute_script('symmetric_difference_struct', newset.key, self.key, self._create_unique_key(), [self.client.encode(item) for item in other])
+      values = self._encode_all(other)
+      def build(pipeline):
+        for chunk in self._chunks(values):
+          pipeline.srem(self.key, *chunk)
+      self.client.pipelined(build, transaction=True)
+    self.client.invalidate(self.key)
+    return self
+
+  def symmetric_difference(self, other, store=True):
+    """Returns a set of elements on one set or the other.
+
+    If 'store' is false, the result is returned as a Python set rather
+    than being stored in a new Redis set.
+    """
+    if self.client._is_redis_item(other):
+      if not store:
+        pipeline = self.client.redis.pipeline(transaction=False)
+        pipeline.smembers(self.key)
+        pipeline.smembers(other.key)
+        members, others = pipeline.execute()
+        return self._decode_set(members ^ others)
+      newset = self._new_set()
+      self._execute_script('symmetric_difference_redis', newset.key, self.key, other.key)
+      return newset
+
+    values = self._encode_all(other)
+    if not store:
+      return self._decode_set(self.client.redis.smembers(self.key) ^ set(values))
+    newset = self._new_set()
+    flags = self._membership(values)
+    def build(pipeline):
+      pipeline.sunionstore(newset.key, self.key)
+      self._queue_symmetric_difference(pipeline, newset.key, values, flags)
+    self.client.pipelined(build, transaction=True)
     return newset
 
+  def _queue_symmetric_difference(self, pipeline, key, values, flags):
+    """Queues removal of present values and addition of absent values."""
+    present = [value for value, member in zip(values, flags) if member]
+    absent = [value for value, member in zip(values, flags) if not member]
+    for chunk in self._chunks(present):
+      pipeline.srem(key, *chunk)
+    for chunk in self._chunks(absent):
+      pipeline.sadd(key, *chunk)
+
   def symmetric_difference_update(self, other):
     """Updates the set via symmetric difference."""
     if self.client._is_redis_item(other):
       self._execute_script('symmetric_difference_redis', self.key, self.key, other.key)
-    else:
-      self._execute_script('symmetric_difference_struct', self.key, self.key, self._create_unique_key(), [self.client.encode(item) for item in other])
+      self.client.invalidate(self.key)
+      return self
+
+    values = self._encode_all(other)
+    def compute():
+      flags = self._membership(values)
+      return lambda pipeline: self._queue_symmetric_difference(pipeline, self.key, values, flags)
+    self._update_watched(compute)
     return self
 
   def issubset(self, other):
     """Returns a boolean indicating whether every element in the set is in 'other'."""
     if self.client._is_redis_item(other):
-      return self._execute_script('subset_redis', self.key, other.key)
-    else:
-      return self._execute_script('subset_struct', self.key, [self.client.encode(item) for item in other])
+      if self.client.supports(7, 0):
+        pipeline = self.client.redis.pipeline(transaction=False)
+        pipeline.scard(self.key)
+        pipeline.execute_command('SINTERCARD', 2, self.key, other.key)
+        size, common = pipeline.execute()
+        return size == common
+      return bool(self._execute_script('subset_redis', self.key, other.key))
+
+    # The set is a subset if every member is among the members of 'other'.
+    values = self._encode_all(other)
+    pipeline = self.client.redis.pipeline(transaction=False)
+    pipeline.scard(self.key)
+    self._queue_membership(pipeline, values)
+    results = pipeline.execute()
+    return sum(self._parse_membership(results[1:])) == results[0]
 
   def issuperset(self, other):
     """Returns a boolean indicating whether every element in 'other' is in the set."""
     if self.client._is_redis_item(other):
-      return self._execute_script('superset_redis', self.key, other.key)
-    else:
-      return self._execute_script('superset_struct', self.key, [self.client.encode(item) for item in other])
+      if self.client.supports(7, 0):
+        pipeline = self.client.redis.pipeline(transaction=False)
+        pipeline.scard(other.key)
+        pipeline.execute_command('SINTERCARD', 2, self.key, other.key)
+        size, common = pipeline.execute()
+        return size == common
+      return bool(self._execute_script('superset_redis', self.key, other.key))
+    return all(self._membership(self._encode_all(other)))
 
   def copy(self):
     """Copies the set."""
-    newset = DataType.get(self.type)(self.client)
+    newset = self._new_set()
     self.client.sunionstore(newset.key, self.key)
     return newset
 
-  def delete(self, references=False):
+  def delete(self, references=False, progress=None):
     """Deletes the set."""
-    if references is True:
-      for item in self:
-        if isinstance(item, DataType):
-          item.delete()
-    self.client.delete(self.key)
+    return self._delete(references, progress)
+
+  def _scan_page(self, pipeline, cursor):
+    """Queues an SSCAN for a page of the set."""
+    pipeline.sscan(self.key, cursor or 0, count=self.scan_count)
+    return True
+
+  def _parse_page(self, cursor, result):
+    """Returns the next SSCAN cursor and the page members."""
+    cursor, members = result
+    return cursor or None, members
+
+  @classmethod
+  def _bulk_encode(cls, client, items):
+    """Encodes a chunk of members for bulk loading."""
+    return [client.encode(item) for item in items]
+
+  def _bulk_push(self, pipeline, values):
+    """Queues an SADD of encoded members."""
+    pipeline.sadd(self.key, *values)
 
   def __len__(self):
     """Supports use of the global len() function."""
-    return self.client.scard(self.key)
+    return self.client.redis.scard(self.key)
+
+  def scan(self, match=None, count=None, dedupe=True):
+    """Returns a lazy iterator over set members using SSCAN cursors.
+
+    'match' is a glob-style pattern applied to encoded members and
+    'count' (or the set's scan_count) is a hint for the page size.
+    SSCAN may return a member more than once if the set is rehashed
+    while it is being scanned, so the encoded members seen so far are
+    remembered to yield each member once. If 'dedupe' is false, only
+    one page is held in memory and members may be repeated.
+    """
+    count = count or self.scan_count
+    seen = set() if dedupe else None
+    cursor = 0
+    while True:
+      cursor, values = self.client.redis.sscan(self.key, cursor, match=match, count=count)
+      if seen is not None:
+        fresh = []
+        for value in values:
+          if value not in seen:
+            seen.add(value)
+            fresh.append(value)
+        values = fresh
+      for item in self.client.decode_many(values):
+        yield item
+      if cursor == 0:
+        break
 
   def __iter__(self):
     """Returns an iterator over the set."""
-    items = self.client.smembers(self.key)
-    return iter(set([self.client.decode(item) for item in items]))
+    return self.scan()
 
   def __contains__(self, item):
     """Supports the 'in' and 'not in' operators."""
-    return self.client.sismember(self.key, self.client.encode(item))
+    value = self.client.encode(item)
+    return bool(self.client.cached(self.key, value, lambda: self.client.redis.sismember(self.key, value)))
 
   def __le__(self, other):
     """Alias for determining whether the set is a subset of 'other'."""
@@ -352,7 +493,7 @@ class Set(DataType):
 
   def __sub__(self, other):
     """Alias for performing a difference."""
-    return self.difference(self.key, other.key)
+    return self.difference(other)
 
   def __isub__(self, other):
     """Alias for performing a difference update."""
@@ -363,4 +504,7 @@ class Set(DataType):
     return self.symmetric_difference_update(other)
 
   def __repr__(self):
-    return repr(set([item for item in self]))
+    items = list(itertools.islice(self, self.repr_limit + 1))
+    if len(items) > self.repr_limit:
+      return 'set([%s, ...])' % (', '.join(repr(item) for item in items[:self.repr_limit]),)
+    return repr(set(items))
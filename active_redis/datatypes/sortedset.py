@@ -0,0 +1,264 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from active_redis.core import DataType
+from active_redis.registry import datatype
+
+@datatype
+class SortedSet(DataType):
+  """
+  A Redis sorted set data type.
+
+  Members are encoded like the items of other data types and map to
+  float scores, which are accessed like dict values. Integer slices
+  select members by rank, and ranges by score or by value are read
+  on the server with LIMIT.
+  """
+  type = 'sortedset'
+
+  # The COUNT hint passed to ZSCAN when scanning the sorted set.
+  scan_count = 1000
+
+  # The number of members sent per command by the bulk methods.
+  chunk_size = 1000
+
+  # The maximum number of members included in repr().
+  repr_limit = 100
+
+  def _get_raw(self, value):
+    """Gets the raw score of an encoded member, reading through the client cache."""
+    return self.client.cached(self.key, value, lambda: self.client.zscore(self.key, value))
+
+  def _decode_range(self, values, withscores=False):
+    """Decodes the result of a range query."""
+    if withscores:
+      return zip(self.client.decode_many([value for value, score in values]), [score for value, score in values])
+    return self.client.decode_many(values)
+
+  def _bound(self, item, inclusive):
+    """Returns a ZRANGEBYLEX bound for an item."""
+    return ('[' if inclusive else '(') + self.client.encode(item)
+
+  def add(self, item, score=0):
+    """Adds an item with a score, or updates the score of an item."""
+    value = self.client.encode(item)
+    self.client.execute_command('ZADD', self.key, score, value)
+    self.client.invalidate(self.key, value)
+
+  def add_many(self, items):
+    """Adds several items with their scores.
+
+    'items' is a mapping or an iterable of (item, score) pairs. Items
+    are added with a single ZADD, or with ZADD commands of chunk_size
+    members sent in a single pipeline.
+    """
+    if hasattr(items, 'iteritems'):
+      items = items.iteritems()
+    arguments = []
+    for item, score in items:
+      arguments.extend((score, self.client.encode(item)))
+    if not arguments:
+      return
+    size = self.chunk_size * 2
+    if len(arguments) <= size:
+      self.client.execute_command('ZADD', self.key, *arguments)
+    else:
+      def build(pipeline):
+        for i in range(0, len(arguments), size):
+          pipeline.execute_command('ZADD', self.key, *arguments[i:i+size])
+      self.client.pipelined(build)
+    self.client.invalidate(self.key)
+
+  def remove(self, item):
+    """Removes an item from the sorted set."""
+    value = self.client.encode(item)
+    def check(removed):
+      if not removed:
+        raise KeyError("Item %s not found." % (item,))
+    retval = self.client.result(self.client.zrem(self.key, value), check)
+    self.client.invalidate(self.key, value)
+    return retval
+
+  def discard(self, item):
+    """Removes an item from the sorted set if present."""
+    value = self.client.encode(item)
+    self.client.zrem(self.key, value)
+    self.client.invalidate(self.key, value)
+
+  def clear(self):
+    """Clears the sorted set."""
+    self.client.delete(self.key)
+    self.client.invalidate(self.key)
+
+  def score(self, item, default=None):
+    """Returns the score of an item, or 'default' if it is not a member."""
+    def cast(score):
+      return float(score) if score is not None else default
+    return self.client.result(self._get_raw(self.client.encode(item)), cast)
+
+  def increment(self, item, amount=1):
+    """Atomically increments the score of an item, returning the new score."""
+    value = self.client.encode(item)
+    retval = self.client.result(self.client.execute_command('ZINCRBY', self.key, amount, value), float)
+    self.client.invalidate(self.key, value)
+    return retval
+
+  def rank(self, item, reverse=False):
+    """Returns the rank of an item, or None if it is not a member."""
+    value = self.client.encode(item)
+    if reverse:
+      return self.client.zrevrank(self.key, value)
+    return self.client.zrank(self.key, value)
+
+  def count(self, min='-inf', max='+inf'):
+    """Returns the number of items with a score between 'min' and 'max'."""
+    return self.client.zcount(self.key, min, max)
+
+  def range(self, start=0, end=-1, reverse=False, withscores=False):
+    """Returns the items from rank 'start' to rank 'end' inclusive.
+
+    If 'withscores' is true, (item, score) pairs are returned.
+    """
+    values = self.client.zrange(self.key, start, end, desc=reverse, withscores=withscores)
+    return self.client.result(values, lambda values: self._decode_range(values, withscores))
+
+  def range_by_score(self, min='-inf', max='+inf', offset=None, count=None, reverse=False, withscores=False):
+    """Returns the items with a score between 'min' and 'max'.
+
+    Bounds are inclusive unless prefixed with '(', as with ZRANGEBYSCORE.
+    'offset' and 'count' limit the result on the server.
+    """
+    if offset is None and count is not None:
+      offset = 0
+    if count is None and offset is not None:
+      count = -1
+    if reverse:
+      values = self.client.zrevrangebyscore(self.key, max, min, offset, count, withscores=withscores)
+    else:
+      values = self.client.zrangebyscore(self.key, min, max, offset, count, withscores=withscores)
+    return self.client.result(values, lambda values: self._decode_range(values, withscores))
+
+  def range_by_value(self, min=None, max=None, inclusive=True, offset=None, count=None, reverse=False):
+    """Returns the items between 'min' and 'max' in lexicographical order.
+
+    The order is that of the encoded members, so this is only meaningful
+    if all members have the same score and the codec preserves order.
+    A bound of None is unbounded.
+    """
+    min = self._bound(min, inclusive) if min is not None else '-'
+    max = self._bound(max, inclusive) if max is not None else '+'
+    if offset is None and count is not None:
+      offset = 0
+    if count is None and offset is not None:
+      count = -1
+    arguments = ['ZREVRANGEBYLEX', self.key, max, min] if reverse else ['ZRANGEBYLEX', self.key, min, max]
+    if offset is not None:
+      arguments.extend(('LIMIT', offset, count))
+    return self.client.result(self.client.execute_command(*arguments), self._decode_range)
+
+  def items(self, reverse=False):
+    """Returns all (item, score) pairs in score order."""
+    return self.range(reverse=reverse, withscores=True)
+
+  def scan(self, match=None, count=None, dedupe=True):
+    """Returns a lazy iterator over (item, score) pairs using ZSCAN cursors.
+
+    'match' is a glob-style pattern applied to encoded members and
+    'count' (or the sorted set's scan_count) is a hint for the page size.
+    Items are not returned in score order. ZSCAN may return an item more
+    than once if the sorted set is rehashed while it is being scanned,
+    so the encoded members seen so far are remembered to yield each item
+    once. If 'dedupe' is false, only one page is held in memory and
+    items may be repeated.
+    """
+    count = count or self.scan_count
+    seen = set() if dedupe else None
+    cursor = 0
+    while True:
+      cursor, values = self.client.redis.zscan(self.key, cursor, match=match, count=count)
+      if seen is not None:
+        fresh = []
+        for value, score in values:
+          if value not in seen:
+            seen.add(value)
+            fresh.append((value, score))
+        values = fresh
+      for pair in self._decode_range(values, True):
+        yield pair
+      if cursor == 0:
+        break
+
+  def iteritems(self):
+    """Returns a lazy iterator over (item, score) pairs."""
+    return self.scan()
+
+  def delete(self, references=False, progress=None):
+    """Deletes the sorted set."""
+    return self._delete(references, progress)
+
+  def _scan_page(self, pipeline, cursor):
+    """Queues a ZSCAN for a page of the sorted set."""
+    pipeline.zscan(self.key, cursor or 0, count=self.scan_count)
+    return True
+
+  def _parse_page(self, cursor, result):
+    """Returns the next ZSCAN cursor and the page members."""
+    cursor, values = result
+    return cursor or None, [value for value, score in values]
+
+  @classmethod
+  def _bulk_encode(cls, client, items):
+    """Encodes a chunk of (item, score) pairs for bulk loading."""
+    encoded = []
+    for item, score in items:
+      encoded.extend((score, client.encode(item)))
+    return encoded
+
+  def _bulk_push(self, pipeline, values):
+    """Queues a ZADD of encoded members."""
+    pipeline.execute_command('ZADD', self.key, *values)
+
+  def __len__(self):
+    """Supports use of the global len() function."""
+    return self.client.redis.zcard(self.key)
+
+  def __iter__(self):
+    """Iterates over items in no particular order."""
+    return (item for item, score in self.scan())
+
+  def __contains__(self, item):
+    """Supports the 'in' and 'not in' operators."""
+    value = self.client.encode(item)
+    return self.client.cached(self.key, value, lambda: self.client.redis.zscore(self.key, value)) is not None
+
+  def __getitem__(self, key):
+    """Returns the score of an item, or the items in a slice of ranks."""
+    if isinstance(key, slice):
+      if key.step not in (None, 1):
+        raise ValueError("Sorted set slices do not support steps.")
+      start = key.start or 0
+      if key.stop is None:
+        end = -1
+      elif key.stop == 0:
+        return []
+      else:
+        end = key.stop - 1
+      return self.range(start, end)
+    def cast(score):
+      if score is None:
+        raise KeyError("Item %s not found." % (key,))
+      return float(score)
+    return self.client.result(self._get_raw(self.client.encode(key)), cast)
+
+  def __setitem__(self, item, score):
+    """Sets the score of an item."""
+    self.add(item, score)
+
+  def __delitem__(self, item):
+    """Removes an item."""
+    self.remove(item)
+
+  def __repr__(self):
+    items = self.range(0, self.repr_limit, withscores=True)
+    if len(items) > self.repr_limit:
+      return '{%s, ...}' % (', '.join('%r: %r' % pair for pair in items[:self.repr_limit]),)
+    return '{%s}' % (', '.join('%r: %r' % pair for pair in items),)
@@ -0,0 +1,313 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from active_redis.core import DataType
+from active_redis.registry import datatype
+from redis import ResponseError
+
+def _next_id(id):
+  """Returns the smallest stream ID greater than 'id'."""
+  ms, seq = id.split('-')
+  return '%s-%d' % (ms, int(seq) + 1)
+
+def _milliseconds(seconds):
+  return int(seconds * 1000)
+
+@datatype
+class Stream(DataType):
+  """
+  A Redis stream data type.
+
+  Each entry holds a single item, encoded with the client codec and
+  stored in the 'item' field. Entries are returned as (id, item) pairs;
+  entries written by other clients without an 'item' field are returned
+  with their raw fields as a dict, and deleted entries with None.
+
+  If 'maxlen' is set, appends trim the stream to approximately that
+  many entries. Blocking timeouts are given in seconds, and must be
+  shorter than the socket timeout of the Redis connection.
+  """
+  type = 'stream'
+
+  # The entry field holding the encoded item.
+  field = 'item'
+
+  # The approximate maximum length of the stream, or None.
+  maxlen = None
+
+  # The default COUNT of reads and the page size of iteration.
+  count = 100
+
+  # The number of entries appended per pipeline by append_many().
+  chunk_size = 1000
+
+  def _trim_arguments(self, maxlen):
+    maxlen = self.maxlen if maxlen is None else maxlen
+    if maxlen is None:
+      return []
+    return ['MAXLEN', '~', maxlen]
+
+  def _read_arguments(self, count, block):
+    arguments = ['COUNT', count or self.count]
+    if block is not None:
+      arguments.extend(('BLOCK', _milliseconds(block)))
+    return arguments
+
+  def _parse_entries(self, entries):
+    """Decodes a list of raw stream entries into (id, item) pairs."""
+    values, parsed = [], []
+    for id, fields in entries:
+      if fields is None:
+        parsed.append((id, None))
+        continue
+      fields = dict(zip(fields[::2], fields[1::2]))
+      if self.field in fields:
+        values.append(fields[self.field])
+        parsed.append((id, len(values) - 1))
+      else:
+        parsed.append((id, fields))
+    items = self.client.decode_many(values)
+    return [(id, items[item] if isinstance(item, int) else item) for id, item in parsed]
+
+  def _parse_streams(self, response):
+    """Decodes the entries of an XREAD or XREADGROUP response."""
+    if not response:
+      return []
+    return self._parse_entries(response[0][1])
+
+  def append(self, item, id='*', maxlen=None):
+    """Appends an item to the stream, returning the ID of its entry."""
+    arguments = ['XADD', self.key] + self._trim_arguments(maxlen) + [id, self.field, self.client.encode(item)]
+    return self.client.execute_command(*arguments)
+
+  def append_many(self, items, maxlen=None):
+    """Appends several items, returning the IDs of their entries.
+
+    Items are encoded in one pass and appended with XADD commands sent
+    in pipelines of chunk_size entries. Trimming is applied once by the
+    last command of each pipeline.
+    """
+    values = [self.client.encode(item) for item in items]
+    trim = self._trim_arguments(maxlen)
+    ids = []
+    for i in range(0, len(values), self.chunk_size):
+      def build(pipeline, chunk=values[i:i+self.chunk_size]):
+        for j, value in enumerate(chunk):
+          arguments = (trim if j == len(chunk) - 1 else []) + ['*', self.field, value]
+          pipeline.execute_command('XADD', self.key, *arguments)
+      ids.extend(self.client.pipelined(build))
+    return ids
+
+  def range(self, start='-', end='+', count=None, reverse=False):
+    """Returns (id, item) pairs with IDs between 'start' and 'end'."""
+    if reverse:
+      arguments = ['XREVRANGE', self.key, end, start]
+    else:
+      arguments = ['XRANGE', self.key, start, end]
+    if count is not None:
+      arguments.extend(('COUNT', count))
+    return self.client.result(self.client.execute_command(*arguments), self._parse_entries)
+
+  def read(self, id='0', count=None, block=None):
+    """Returns up to 'count' (id, item) pairs with IDs greater than 'id'.
+
+    If 'block' is given, waits up to 'block' seconds (0 for ever) for
+    entries to arrive; use the ID '$' to wait for new entries only.
+    """
+    arguments = ['XREAD'] + self._read_arguments(count, block) + ['STREAMS', self.key, id]
+    return self.client.result(self.client.execute_command(*arguments), self._parse_streams)
+
+  def consume(self, id='$', count=None, block=0):
+    """Returns a generator of (id, item) pairs following the stream.
+
+    Entries after 'id' are read in batches of 'count', blocking up to
+    'block' seconds (0 for ever) for new entries. If 'block' is None the
+    generator stops once the end of the stream has been reached.
+    """
+    if id == '$':
+      last = self.client.redis.execute_command('XREVRANGE', self.key, '+', '-', 'COUNT', 1)
+      id = last[0][0] if last else '0-0'
+    while True:
+      arguments = ['XREAD'] + self._read_arguments(count, block) + ['STREAMS', self.key, id]
+      entries = self._parse_streams(self.client.redis.execute_command(*arguments))
+      if not entries and block is None:
+        return
+      for entry in entries:
+        yield entry
+      if entries:
+        id = entries[-1][0]
+
+  def trim(self, maxlen, approximate=True):
+    """Trims the stream to 'maxlen' entries, returning the number removed."""
+    if approximate:
+      return self.client.execute_command('XTRIM', self.key, 'MAXLEN', '~', maxlen)
+    return self.client.execute_command('XTRIM', self.key, 'MAXLEN', maxlen)
+
+  def remove(self, *ids):
+    """Removes entries by ID, returning the number removed."""
+    return self.client.execute_command('XDEL', self.key, *ids)
+
+  def group(self, name, consumer):
+    """Returns a consumer group reader for the given consumer."""
+    return ConsumerGroup(self, name, consumer)
+
+  def delete(self, references=False, progress=None):
+    """Deletes the stream."""
+    return self._delete(references, progress)
+
+  def _scan_page(self, pipeline, cursor):
+    """Queues an XRANGE for a page of the stream."""
+    pipeline.execute_command('XRANGE', self.key, cursor or '-', '+', 'COUNT', self.count)
+    return True
+
+  def _parse_page(self, cursor, result):
+    """Returns the ID following the page and the page's raw items."""
+    values = []
+    for id, fields in result:
+      fields = dict(zip(fields[::2], fields[1::2])) if fields is not None else {}
+      if self.field in fields:
+        values.append(fields[self.field])
+    if len(result) < self.count:
+      return None, values
+    return _next_id(result[-1][0]), values
+
+  _bulk_ordered = True
+
+  @classmethod
+  def _bulk_encode(cls, client, items):
+    """Encodes a chunk of items for bulk loading."""
+    return [client.encode(item) for item in items]
+
+  def _bulk_push(self, pipeline, values):
+    """Queues an XADD per encoded item."""
+    for value in values:
+      pipeline.execute_command('XADD', self.key, *(self._trim_arguments(None) + ['*', self.field, value]))
+
+  def __len__(self):
+    """Supports use of the global len() function."""
+    return self.client.redis.execute_command('XLEN', self.key)
+
+  def __iter__(self):
+    """Iterates over (id, item) pairs in pages of 'count' entries."""
+    start = '-'
+    while True:
+      entries = self._parse_entries(self.client.redis.execute_command('XRANGE', self.key, start, '+', 'COUNT', self.count))
+      for entry in entries:
+        yield entry
+      if len(entries) < self.count:
+        return
+      start = _next_id(entries[-1][0])
+
+  def __repr__(self):
+    return '<Stream %s>' % (self.key,)
+
+class ConsumerGroup(object):
+  """
+  Reads a stream as a consumer of a consumer group.
+
+  Entries read by a consumer are pending until they are acknowledged
+  with ack(). Entries left pending by failed consumers can be taken
+  over with claim() once they have been idle for a while.
+  """
+  def __init__(self, stream, name, consumer):
+    self.stream = stream
+    self.name = name
+    self.consumer = consumer
+
+  @property
+  def client(self):
+    return self.stream.client
+
+  def create(self, id='$'):
+    """Creates the group, and the stream if necessary.
+
+    Returns a boolean indicating whether the group was created.
+    """
+    try:
+      self.client.redis.execute_command('XGROUP', 'CREATE', self.stream.key, self.name, id, 'MKSTREAM')
+    except ResponseError as e:
+      if 'BUSYGROUP' not in str(e):
+        raise
+      return False
+    return True
+
+  def destroy(self):
+    """Destroys the group."""
+    return self.client.redis.execute_command('XGROUP', 'DESTROY', self.stream.key, self.name)
+
+  def _read(self, id, count, block, redis):
+    arguments = ['XREADGROUP', 'GROUP', self.name, self.consumer] + self.stream._read_arguments(count, block) + ['STREAMS', self.stream.key, id]
+    return redis.execute_command(*arguments)
+
+  def read(self, count=None, block=None, id='>'):
+    """Returns up to 'count' (id, item) pairs delivered to this consumer.
+
+    By default new entries are read, blocking up to 'block' seconds if
+    given. Read with an ID such as '0' to re-read this consumer's
+    pending entries.
+    """
+    return self.client.result(self._read(id, count, block, self.client), self.stream._parse_streams)
+
+  def ack(self, *ids):
+    """Acknowledges entries, returning the number acknowledged."""
+    ids = [id for arg in ids for id in (arg if isinstance(arg, (list, tuple)) else (arg,))]
+    if not ids:
+      return 0
+    return self.client.execute_command('XACK', self.stream.key, self.name, *ids)
+
+  def claim(self, min_idle, start='0-0', count=None):
+    """Claims entries pending for at least 'min_idle' seconds.
+
+    Returns the ID from which to continue claiming ('0-0' once all
+    pending entries have been examined) and the claimed (id, item) pairs.
+    """
+    arguments = ['XAUTOCLAIM', self.stream.key, self.name, self.consumer, _milliseconds(min_idle), start, 'COUNT', count or self.stream.count]
+    response = self.client.redis.execute_command(*arguments)
+    return response[0], self.stream._parse_entries(response[1])
+
+  def pending(self):
+    """Returns the number of entries pending in the group."""
+    return self.client.redis.execute_command('XPENDING', self.stream.key, self.name)[0]
+
+  def consume(self, count=None, block=0, min_idle=None, ack=False):
+    """Returns a generator of (id, item) pairs delivered to this consumer.
+
+    This consumer's pending entries are delivered first, followed by
+    new entries read in batches of 'count', blocking up to 'block'
+    seconds (0 for ever). If 'block' is None the generator stops once
+    no entries are available. If 'min_idle' is given, entries idle for
+    that many seconds are claimed from other consumers between reads,
+    and reads block for at most 'min_idle' seconds so that claiming
+    resumes while no new entries arrive. If 'ack' is true, each batch
+    is acknowledged once all its entries have been consumed.
+    """
+    redis = self.client.redis
+    wait = block
+    if min_idle is not None and block is not None:
+      wait = max(min(block, min_idle) if block else min_idle, 0.001)
+    id = '0'
+    start = '0-0'
+    while True:
+      entries = []
+      if min_idle is not None:
+        # The cursor is carried forward so that each XAUTOCLAIM examines
+        # the next pending entries rather than the first ones again.
+        start, entries = self.claim(min_idle, start, count)
+      claimed = bool(entries)
+      if not claimed:
+        # Pending entries are read without blocking.
+        entries = self.stream._parse_streams(self._read(id, count, wait if id == '>' else None, redis))
+        if id != '>' and not entries:
+          id = '>'
+          continue
+      if not entries and block is None:
+        return
+      for entry in entries:
+        yield entry
+      if ack:
+        self.ack([entry_id for entry_id, item in entries])
+      elif id != '>' and entries and not claimed:
+        # Without acknowledgement pending entries would be re-read.
+        id = entries[-1][0]
+
+  def __repr__(self):
+    return '<ConsumerGroup %s:%s %s>' % (self.stream.key, self.name, self.consumer)
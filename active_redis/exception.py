@@ -6,6 +6,7 @@ __all__ = [
   'EncodingError',
   'DataTypeError',
   'ScriptError',
+  'LockError',
 ]
 
 class ActiveRedisError(Exception):
@@ -32,3 +33,8 @@ class ScriptError(ActiveRedisError):
   """
   Script error.
   """
+
+class LockError(ActiveRedisError):
+  """
+  Lock error.
+  """
@@ -0,0 +1,84 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+class GraphDelete(object):
+  """
+  Deletes a data type together with all data types it references.
+
+  The graph is traversed breadth-first. Each round fetches one page of
+  values from every data type still being scanned in a single pipeline,
+  and only values which are references are decoded. Keys are deleted
+  with UNLINK in chunks, so the server frees memory in the background.
+  Each key is visited at most once, so cyclic references are safe.
+  """
+  chunk_size = 1000
+
+  def __init__(self, client, progress=None):
+    """Initializes the engine.
+
+    'progress' is an optional callable which is called with the number
+    of keys discovered and deleted so far after each round.
+    """
+    self.client = client
+    self.progress = progress
+    self.discovered = 0
+    self.deleted = 0
+
+  def _is_reference(self, value):
+    """Indicates whether a raw value is a data type reference."""
+    return value[:1] == self.client.REDIS_STRUCTURE_TAG or self.client._is_legacy_redis_value(value)
+
+  def delete(self, *datatypes):
+    """Deletes the given data types and their references.
+
+    Returns the number of keys deleted, which excludes referenced keys
+    which did not exist.
+    """
+    seen = set()
+    pending = []
+    scanning = []
+
+    def visit(datatype):
+      key = str(datatype.key)
+      if key not in seen:
+        seen.add(key)
+        pending.append(key)
+        scanning.append((datatype, None))
+        self.discovered += 1
+
+    for datatype in datatypes:
+      visit(datatype)
+
+    while scanning:
+      pipeline = self.client.redis.pipeline(transaction=False)
+      queued = [(datatype, cursor) for datatype, cursor in scanning if datatype._scan_page(pipeline, cursor)]
+      scanning = []
+      for (datatype, cursor), result in zip(queued, pipeline.execute()):
+        cursor, values = datatype._parse_page(cursor, result)
+        for value in values:
+          if self._is_reference(value):
+            visit(self.client.decode(value))
+        if cursor is not None:
+          scanning.append((datatype, cursor))
+
+      # Keys are only unlinked once they have been fully scanned.
+      active = set(str(datatype.key) for datatype, cursor in scanning)
+      pending = self._unlink_ready(pending, active)
+      self._report()
+
+    self._unlink_ready(pending, set())
+    self._report()
+    return self.deleted
+
+  def _unlink_ready(self, pending, active):
+    """Unlinks pending keys which are no longer being scanned."""
+    ready = [key for key in pending if key not in active]
+    for i in range(0, len(ready), self.chunk_size):
+      chunk = ready[i:i+self.chunk_size]
+      self.deleted += self.client.unlink(*chunk)
+      for key in chunk:
+        self.client.invalidate(key)
+    return [key for key in pending if key in active]
+
+  def _report(self):
+    if self.progress is not None:
+      self.progress(self.discovered, self.deleted)
@@ -0,0 +1,238 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+import bisect, threading, time, weakref
+
+class Histogram(object):
+  """
+  A cumulative latency histogram with fixed bucket bounds in seconds.
+  """
+  BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+  def __init__(self, buckets=BUCKETS):
+    self.buckets = buckets
+    self.counts = [0] * (len(buckets) + 1)
+    self.count = 0
+    self.sum = 0.0
+
+  def observe(self, value):
+    self.counts[bisect.bisect_left(self.buckets, value)] += 1
+    self.count += 1
+    self.sum += value
+
+  def snapshot(self):
+    """Returns the count, sum and cumulative bucket counts."""
+    cumulative, total = [], 0
+    for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+      total += count
+      cumulative.append((bound, total))
+    return {'count': self.count, 'sum': self.sum, 'buckets': cumulative}
+
+class Trace(object):
+  """
+  The sequence of commands executed by a thread within a trace() block.
+
+  Each entry is a (command, seconds, bytes sent) tuple.
+  """
+  def __init__(self):
+    self.commands = []
+
+  def count(self, command=None):
+    """Returns the number of commands, or of a single command, traced."""
+    if command is None:
+      return len(self.commands)
+    return sum(1 for name, seconds, size in self.commands if name == command.upper())
+
+  def __iter__(self):
+    return iter(self.commands)
+
+  def __len__(self):
+    return len(self.commands)
+
+  def __repr__(self):
+    return '<Trace %s>' % (' '.join(name for name, seconds, size in self.commands),)
+
+class Instrumentation(object):
+  """
+  Collects command, script and encoding metrics for an Active Redis client.
+
+  Commands are recorded by wrapping the execute_command() method of
+  the Redis client and the pipelines it creates, so commands sent
+  directly, in pipelines and by scripts are all counted, along with
+  their latency and the size of their request. The connection pool,
+  which may be shared with other clients, is left untouched. Pipelined
+  commands are each timed by the round trip of their pipeline.
+
+  Listeners registered with add_listener() are called with a metric
+  kind ('command', 'script', 'encode' or 'decode'), a name and a value
+  (seconds for commands and scripts, bytes otherwise), and may be used
+  to forward metrics to StatsD or Prometheus.
+  """
+  def __init__(self, buckets=Histogram.BUCKETS):
+    self.buckets = buckets
+    self._lock = threading.Lock()
+    self._local = threading.local()
+    self._listeners = []
+    self._installed = weakref.WeakKeyDictionary()
+    self.reset()
+
+  def reset(self):
+    """Resets all metrics."""
+    with self._lock:
+      self.commands = {}
+      self.errors = {}
+      self.latency = {}
+      self.scripts = {}
+      self.bytes_sent = 0
+      self.bytes_encoded = 0
+      self.bytes_decoded = 0
+
+  def add_listener(self, listener):
+    """Registers a callable receiving every recorded metric."""
+    self._listeners.append(listener)
+
+  def remove_listener(self, listener):
+    """Unregisters a listener."""
+    self._listeners.remove(listener)
+
+  def _emit(self, kind, name, value):
+    for listener in self._listeners:
+      listener(kind, name, value)
+
+  def install(self, redis):
+    """Records the commands sent through a Redis client."""
+    with self._lock:
+      if redis in self._installed:
+        return
+      self._installed[redis] = True
+    execute_command, pipeline = redis.execute_command, redis.pipeline
+    def instrumented_execute_command(*args, **options):
+      return self._execute_command(execute_command, args, options)
+    def instrumented_pipeline(*args, **kwargs):
+      return self._instrument_pipeline(pipeline(*args, **kwargs))
+    redis.execute_command = instrumented_execute_command
+    redis.pipeline = instrumented_pipeline
+
+  def _execute_command(self, execute_command, args, options):
+    """Executes and records a single command."""
+    start = time.time()
+    try:
+      result = execute_command(*args, **options)
+    except Exception:
+      self.record_command(_command_name(args), time.time() - start, _command_size(args), True)
+      raise
+    self.record_command(_command_name(args), time.time() - start, _command_size(args))
+    return result
+
+  def _instrument_pipeline(self, pipeline):
+    """Records the commands of a pipeline when it is executed.
+
+    Commands sent while the pipeline is watching keys are executed
+    immediately and recorded individually.
+    """
+    immediate_execute_command, execute = pipeline.immediate_execute_command, pipeline.execute
+    def instrumented_immediate_execute_command(*args, **options):
+      return self._execute_command(immediate_execute_command, args, options)
+    def instrumented_execute(raise_on_error=True):
+      commands = list(pipeline.command_stack)
+      start = time.time()
+      try:
+        results = execute(raise_on_error=False)
+      except Exception:
+        seconds = time.time() - start
+        for args, options in commands:
+          self.record_command(_command_name(args), seconds, _command_size(args), True)
+        raise
+      seconds = time.time() - start
+      for (args, options), result in zip(commands, results):
+        self.record_command(_command_name(args), seconds, _command_size(args), isinstance(result, Exception))
+      if raise_on_error:
+        pipeline.raise_first_error(commands, results)
+      return results
+    pipeline.immediate_execute_command = instrumented_immediate_execute_command
+    pipeline.execute = instrumented_execute
+    return pipeline
+
+  def record_command(self, name, seconds, size, error=False):
+    """Records an executed command."""
+    with self._lock:
+      self.commands[name] = self.commands.get(name, 0) + 1
+      if error:
+        self.errors[name] = self.errors.get(name, 0) + 1
+      try:
+        histogram = self.latency[name]
+      except KeyError:
+        histogram = self.latency[name] = Histogram(self.buckets)
+      histogram.observe(seconds)
+      self.bytes_sent += size
+    for trace in getattr(self._local, 'traces', ()):
+      trace.commands.append((name, seconds, size))
+    self._emit('command', name, seconds)
+
+  def record_script(self, name, seconds):
+    """Records the execution time of a script."""
+    with self._lock:
+      try:
+        histogram = self.scripts[name]
+      except KeyError:
+        histogram = self.scripts[name] = Histogram(self.buckets)
+      histogram.observe(seconds)
+    self._emit('script', name, seconds)
+
+  def record_encode(self, size):
+    """Records the size of an encoded value."""
+    with self._lock:
+      self.bytes_encoded += size
+    self._emit('encode', None, size)
+
+  def record_decode(self, size):
+    """Records the size of a decoded value."""
+    with self._lock:
+      self.bytes_decoded += size
+    self._emit('decode', None, size)
+
+  def trace(self):
+    """Returns a context manager recording the commands of the current thread."""
+    return _TraceContext(self)
+
+  def stats(self):
+    """Returns a snapshot of all metrics."""
+    with self._lock:
+      return {
+        'commands': dict(self.commands),
+        'errors': dict(self.errors),
+        'latency': dict((name, histogram.snapshot()) for name, histogram in self.latency.items()),
+        'scripts': dict((name, histogram.snapshot()) for name, histogram in self.scripts.items()),
+        'bytes_sent': self.bytes_sent,
+        'bytes_encoded': self.bytes_encoded,
+        'bytes_decoded': self.bytes_decoded,
+      }
+
+class _TraceContext(object):
+  def __init__(self, instrumentation):
+    self.instrumentation = instrumentation
+    self.trace = Trace()
+
+  def __enter__(self):
+    local = self.instrumentation._local
+    if not hasattr(local, 'traces'):
+      local.traces = []
+    local.traces.append(self.trace)
+    return self.trace
+
+  def __exit__(self, type, value, traceback):
+    self.instrumentation._local.traces.remove(self.trace)
+    return False
+
+def _command_name(args):
+  return str(args[0]).upper()
+
+def _command_size(args):
+  """Returns the size of a command in the Redis protocol."""
+  size = len('*%d\r\n' % (len(args),))
+  for arg in args:
+    if isinstance(arg, unicode):
+      arg = arg.encode('utf-8')
+    elif not isinstance(arg, str):
+      arg = repr(arg) if isinstance(arg, float) else str(arg)
+    size += len('$%d\r\n' % (len(arg),)) + len(arg) + 2
+  return size
@@ -0,0 +1,204 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from active_redis.core import Script, ScriptManager
+from active_redis.exception import LockError
+import threading, time, uuid
+
+class AcquireLock(Script):
+  """
+  Acquires a lock, returning a fencing token or the lock's remaining TTL.
+  """
+  keys = ['key', 'fence']
+  args = ['token', 'timeout']
+
+  script = """
+  if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return {1, redis.call('INCR', KEYS[2])}
+  end
+  return {0, redis.call('PTTL', KEYS[1])}
+  """
+
+class ReleaseLock(Script):
+  """
+  Releases a lock held with the given token and wakes one waiter.
+  """
+  keys = ['key', 'signal']
+  args = ['token', 'timeout']
+
+  script = """
+  if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    redis.call('RPUSH', KEYS[2], 1)
+    redis.call('PEXPIRE', KEYS[2], ARGV[2])
+    return 1
+  end
+  return 0
+  """
+
+class ExtendLock(Script):
+  """
+  Resets the lease of a lock held with the given token.
+  """
+  keys = ['key']
+  args = ['token', 'timeout']
+
+  script = """
+  if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+  end
+  return 0
+  """
+
+class Lock(object):
+  """
+  A distributed lock on a data type.
+
+  The lock is held in '<key>:lock' with a lease of 'timeout' seconds,
+  acquired atomically with SET NX PX and released with a script which
+  only deletes the lock if it is still held by this instance. Each
+  acquisition increments a counter in '<key>:lock:fence', and its value
+  is available as a fencing token for writes to other systems.
+
+  Waiters block on '<key>:lock:signal', to which a release pushes a
+  single wake-up, so contended locks do not poll the server. Waiters
+  also retry once the current lease expires. Blocking waiters hold a
+  pooled connection while they wait. Before Redis 6.0, waits shorter
+  than a second sleep rather than block, so they are not woken early.
+
+  If 'renew' is true the lease is extended in a background thread
+  until the lock is released. Should the lease be lost regardless,
+  the 'lost' attribute is set.
+  """
+  def __init__(self, datatype, timeout=10, blocking=True, blocking_timeout=None, renew=False):
+    self.datatype = datatype
+    self.timeout = timeout
+    self.blocking = blocking
+    self.blocking_timeout = blocking_timeout
+    self.renew = renew
+    self.token = None
+    self.fence = None
+    self.lost = False
+    self._renewer = None
+
+  @property
+  def name(self):
+    return '%s:lock' % (self.datatype.key,)
+
+  @property
+  def redis(self):
+    return self.datatype.client.redis
+
+  def _execute(self, script, keys, args):
+    # Locks are never queued in batches.
+    return ScriptManager.get(self.redis).execute(script, keys, args)
+
+  def _lease(self):
+    """Returns the lease in milliseconds."""
+    return int(self.timeout * 1000)
+
+  def acquire(self, blocking=None, blocking_timeout=None):
+    """Acquires the lock.
+
+    Returns the fencing token, or False if the lock could not be
+    acquired without blocking or within 'blocking_timeout' seconds.
+    """
+    if self.token is not None:
+      raise LockError("Lock %s is already held by this instance." % (self.name,))
+    blocking = self.blocking if blocking is None else blocking
+    blocking_timeout = self.blocking_timeout if blocking_timeout is None else blocking_timeout
+    end = time.time() + blocking_timeout if blocking_timeout is not None else None
+    token = uuid.uuid4().hex
+
+    while True:
+      acquired, value = self._execute(AcquireLock, [self.name, self.name + ':fence'], [token, self._lease()])
+      if acquired:
+        self.token, self.fence, self.lost = token, value, False
+        if self.renew:
+          self._start_renewal()
+        return self.fence
+      if not blocking:
+        return False
+
+      # Wait for a release, or for the current lease to expire.
+      wait = value / 1000.0 if value > 0 else self.timeout
+      if end is not None:
+        remaining = end - time.time()
+        if remaining <= 0:
+          return False
+        wait = min(wait, remaining)
+      self._wait(wait)
+
+  def _wait(self, wait):
+    """Waits up to 'wait' seconds for a release.
+
+    Redis 6.0 accepts fractional BLPOP timeouts. Older servers only
+    accept whole seconds, so waits are rounded down and shorter waits
+    poll by sleeping instead.
+    """
+    if self.datatype.client.supports(6, 0):
+      # A timeout which rounds to zero milliseconds would block forever.
+      self.redis.blpop(self.name + ':signal', timeout=max(wait, 0.001))
+    elif wait >= 1:
+      self.redis.blpop(self.name + ':signal', timeout=int(wait))
+    else:
+      time.sleep(wait)
+
+  def release(self):
+    """Releases the lock, returning a boolean indicating whether it was still held."""
+    if self.token is None:
+      raise LockError("Lock %s is not held by this instance." % (self.name,))
+    self._stop_renewal()
+    token, self.token = self.token, None
+    return bool(self._execute(ReleaseLock, [self.name, self.name + ':signal'], [token, self._lease()]))
+
+  def extend(self, timeout=None):
+    """Resets the lease, optionally to a new timeout in seconds.
+
+    Returns a boolean indicating whether the lock was still held.
+    """
+    if self.token is None:
+      raise LockError("Lock %s is not held by this instance." % (self.name,))
+    if timeout is not None:
+      self.timeout = timeout
+    return bool(self._execute(ExtendLock, [self.name], [self.token, self._lease()]))
+
+  def locked(self):
+    """Indicates whether the lock is held by anyone."""
+    return self.redis.exists(self.name)
+
+  def owned(self):
+    """Indicates whether the lock is held by this instance."""
+    return self.token is not None and self.redis.get(self.name) == self.token
+
+  def _start_renewal(self):
+    """Starts extending the lease in a background thread."""
+    stopped = threading.Event()
+    token = self.token
+    def renew():
+      while not stopped.wait(self.timeout / 3.0):
+        if self.token != token or not self._execute(ExtendLock, [self.name], [token, self._lease()]):
+          self.lost = self.token == token
+          return
+    self._renewer = (stopped, threading.Thread(target=renew))
+    self._renewer[1].daemon = True
+    self._renewer[1].start()
+
+  def _stop_renewal(self):
+    if self._renewer is not None:
+      stopped, thread = self._renewer
+      self._renewer = None
+      stopped.set()
+      if thread is not threading.current_thread():
+        thread.join()
+
+  def __enter__(self):
+    if self.acquire() is False:
+      raise LockError("Could not acquire lock %s." % (self.name,))
+    return self
+
+  def __exit__(self, type, value, traceback):
+    self.release()
+    return False
+
+  def __repr__(self):
+    return '<Lock %s%s>' % (self.name, ' fence=%s' % (self.fence,) if self.token is not None else '')
@@ -73,3 +73,58 @@ class Observable(Registry):
 def observable(cls):
   """Registers an observable."""
   return Observable.register(cls)
+
+class TaggedRegistry(Registry):
+  """
+  Abstract registry for handlers which may also be looked up by
+  the single byte tag which prefixes every value they produce.
+  """
+  @classmethod
+  def register(cls, handler):
+    """Registers a handler."""
+    cls._tags[handler.tag] = handler
+    return super(TaggedRegistry, cls).register(handler)
+
+  @classmethod
+  def unregister(cls, handler):
+    """Unregisters a handler."""
+    try:
+      del cls._tags[handler.tag]
+    except KeyError:
+      pass
+    super(TaggedRegistry, cls).unregister(handler)
+
+  @classmethod
+  def tag_exists(cls, tag):
+    """Returns a value indicating whether a handler tag exists."""
+    return tag in cls._tags
+
+  @classmethod
+  def get_by_tag(cls, tag):
+    """Gets a registered handler by tag."""
+    try:
+      return cls._tags[tag]
+    except KeyError:
+      raise RegistryError("Invalid handler tag %r." % (tag,))
+
+class Codec(TaggedRegistry):
+  """
+  Codec registry.
+  """
+  _handlers = {}
+  _tags = {}
+
+def codec(cls):
+  """Registers a codec."""
+  return Codec.register(cls)
+
+class Compressor(TaggedRegistry):
+  """
+  Compressor registry.
+  """
+  _handlers = {}
+  _tags = {}
+
+def compressor(cls):
+  """Registers a compressor."""
+  return Compressor.register(cls)
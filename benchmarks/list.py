@@ -0,0 +1,44 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+import sys, os, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from active_redis import ActiveRedis
+
+# Measures the server-side List operations across list sizes. Each
+# operation reads the list in a single pass, so the time per item
+# should remain roughly constant as the list grows. Pass --lpos to
+# measure the native LPOS mode (Redis >= 6.0.6).
+SIZES = [1000, 10000, 50000, 100000]
+
+def measure(function, repeat=3):
+  """Returns the best time of several runs of a function."""
+  best = None
+  for i in range(repeat):
+    start = time.time()
+    function()
+    elapsed = time.time() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+def main():
+  redis = ActiveRedis()
+  mylist = redis.list('benchmark:list')
+  mylist.use_lpos = '--lpos' in sys.argv
+  for size in SIZES:
+    mylist.delete()
+    for start in range(0, size, 1000):
+      mylist.extend(range(start, min(start + 1000, size)))
+
+    # The missing item forces a full scan of the list.
+    results = [
+      ('count', measure(lambda: mylist.count(-1))),
+      ('contains', measure(lambda: -1 in mylist)),
+      ('reverse', measure(lambda: mylist.reverse())),
+    ]
+    for name, elapsed in results:
+      print '%-10s size=%-8d total=%.6fs per_item=%.3fus' % (name, size, elapsed, elapsed / size * 1000000)
+  mylist.delete()
+
+if __name__ == '__main__':
+  main()
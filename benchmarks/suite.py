@@ -0,0 +1,198 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+import sys, os, time, random, argparse, json
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from active_redis import ActiveRedis, bulk_load
+
+# Measures the hot paths of the List, Dict and Set data types, Notifier
+# write-back and script execution across data sizes. Each benchmark
+# fills a data type with 'size' items and then times a number of
+# operations on it, reporting operations per second along with the
+# round trips and request bytes sent to Redis per operation.
+#
+# Run against a local redis-server (the default), or an in-process
+# fake server with --fake (requires the 'fakeredis' package). Pass
+# --json to print one JSON object per result for regression tracking.
+SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+
+# The number of single-item operations timed per benchmark.
+OPS = 1000
+
+class Counters(object):
+  """Round trip and byte counters shared by all connections."""
+  round_trips = 0
+  bytes_sent = 0
+
+  @classmethod
+  def snapshot(cls):
+    return cls.round_trips, cls.bytes_sent
+
+def count_connections(redis):
+  """Installs a connection class counting requests on a Redis pool.
+
+  Every packed request, i.e. a single command or an entire pipeline,
+  is counted as one round trip.
+  """
+  base = redis.connection_pool.connection_class
+  class CountingConnection(base):
+    def send_packed_command(self, command, *args, **kwargs):
+      Counters.round_trips += 1
+      if isinstance(command, (list, tuple)):
+        Counters.bytes_sent += sum(len(part) for part in command)
+      else:
+        Counters.bytes_sent += len(command)
+      return base.send_packed_command(self, command, *args, **kwargs)
+  redis.connection_pool.disconnect()
+  redis.connection_pool.connection_class = CountingConnection
+
+def create_redis(fake=False):
+  """Creates the Redis client used by the benchmarks."""
+  if fake:
+    try:
+      import fakeredis
+    except ImportError:
+      sys.exit("The fake server requires the 'fakeredis' package.")
+    redis = fakeredis.FakeRedis()
+  else:
+    from redis import Redis
+    redis = Redis()
+  count_connections(redis)
+  return redis
+
+def list_benchmarks(redis, size):
+  mylist = redis.list('benchmark:list')
+  bulk_load(mylist, xrange(size))
+  indices = [random.randrange(size) for i in range(OPS)]
+  def append():
+    for i in range(OPS):
+      mylist.append(i)
+  def getitem():
+    for index in indices:
+      mylist[index]
+  def iterate():
+    for item in mylist:
+      pass
+  yield 'list.getitem', OPS, getitem
+  yield 'list.iterate', size, iterate
+  yield 'list.contains', 1, lambda: -1 in mylist
+  yield 'list.append', OPS, append
+  mylist.delete()
+
+def dict_benchmarks(redis, size):
+  mydict = redis.dict('benchmark:dict')
+  bulk_load(mydict, ((str(i), i) for i in xrange(size)))
+  keys = [str(random.randrange(size)) for i in range(OPS)]
+  def setitem():
+    for key in keys:
+      mydict[key] = 0
+  def getitem():
+    for key in keys:
+      mydict[key]
+  def iterate():
+    for item in mydict.iteritems():
+      pass
+  yield 'dict.getitem', OPS, getitem
+  yield 'dict.get_many', OPS, lambda: mydict.get_many(keys)
+  yield 'dict.iteritems', size, iterate
+  yield 'dict.items', size, mydict.items
+  yield 'dict.setitem', OPS, setitem
+  mydict.delete()
+
+def set_benchmarks(redis, size):
+  myset = redis.set('benchmark:set')
+  bulk_load(myset, xrange(size))
+  items = [random.randrange(size * 2) for i in range(OPS)]
+  def add():
+    for item in items:
+      myset.add(item)
+  def contains():
+    for item in items:
+      item in myset
+  def iterate():
+    for item in myset:
+      pass
+  yield 'set.contains', OPS, contains
+  yield 'set.contains_many', OPS, lambda: myset.contains_many(items)
+  yield 'set.iterate', size, iterate
+  yield 'set.add', OPS, add
+  myset.delete()
+
+def notifier_benchmarks(redis, size):
+  # Each write re-serializes the whole nested list, so the number of
+  # operations is kept small.
+  ops = min(OPS, 100)
+  mydict = redis.dict('benchmark:notifier')
+  mydict['list'] = range(size)
+  nested = mydict['list']
+  def immediate():
+    for i in range(ops):
+      nested.append(i)
+  def deferred():
+    with nested:
+      for i in range(ops):
+        nested.append(i)
+  yield 'notifier.immediate', ops, immediate
+  yield 'notifier.deferred', ops, deferred
+  mydict.delete()
+
+def script_benchmarks(redis, size):
+  mydict = redis.dict('benchmark:script')
+  bulk_load(mydict, ((str(i), i) for i in xrange(size)))
+  keys = [str(random.randrange(size * 2)) for i in range(OPS)]
+  def setdefault():
+    for key in keys:
+      mydict.setdefault(key, 0)
+  yield 'script.setdefault', OPS, setdefault
+  yield 'script.has_keys', OPS, lambda: mydict.has_keys(keys)
+  mydict.delete()
+
+BENCHMARKS = [
+  list_benchmarks,
+  dict_benchmarks,
+  set_benchmarks,
+  notifier_benchmarks,
+  script_benchmarks,
+]
+
+def measure(function, ops):
+  """Runs a benchmark once, returning its timings and counters."""
+  round_trips, bytes_sent = Counters.snapshot()
+  start = time.time()
+  function()
+  elapsed = time.time() - start
+  return {
+    'seconds': elapsed,
+    'ops_per_sec': ops / elapsed if elapsed else None,
+    'round_trips_per_op': float(Counters.round_trips - round_trips) / ops,
+    'bytes_per_op': float(Counters.bytes_sent - bytes_sent) / ops,
+  }
+
+def main():
+  parser = argparse.ArgumentParser(description='Active Redis benchmarks.')
+  parser.add_argument('--fake', action='store_true', help='use an in-process fake Redis server')
+  parser.add_argument('--json', action='store_true', help='print one JSON object per result')
+  parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='data sizes to measure')
+  parser.add_argument('--only', nargs='+', help='benchmark name prefixes to run, e.g. list dict.get')
+  options = parser.parse_args()
+
+  redis = ActiveRedis(create_redis(options.fake))
+  backend = 'fake' if options.fake else 'redis'
+  for size in options.sizes:
+    for benchmarks in BENCHMARKS:
+      group = benchmarks.__name__.split('_')[0]
+      if options.only and not any(prefix.split('.')[0] == group for prefix in options.only):
+        continue
+      for name, ops, function in benchmarks(redis, size):
+        if options.only and not any(name.startswith(prefix) for prefix in options.only):
+          continue
+        result = measure(function, ops)
+        result.update(name=name, size=size, ops=ops, backend=backend)
+        if options.json:
+          print json.dumps(result, sort_keys=True)
+        else:
+          print '%-20s size=%-8d ops/sec=%-12.1f round_trips/op=%-8.3f bytes/op=%.1f' % (
+            name, size, result['ops_per_sec'] or 0, result['round_trips_per_op'], result['bytes_per_op'])
+        sys.stdout.flush()
+
+if __name__ == '__main__':
+  main()
@@ -7,11 +7,12 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from active_redis import DataType, registry
 
 @registry.datatype
-class Queue(DataType):
+class SimpleQueue(DataType):
   # The type string is used to allow the data type to be constructed
   # directly from the ActiveRedis class and helps unserialize the
-  # data type when stored in Redis.
-  type = 'queue'
+  # data type when stored in Redis. Note that Active Redis ships a
+  # full 'queue' data type, so this example uses another name.
+  type = 'simple_queue'
 
   def push(self, item):
     """Push an item onto the queue."""
@@ -28,6 +29,6 @@ class Queue(DataType):
 from active_redis import ActiveRedis
 redis = ActiveRedis()
 
-myqueue = redis.queue()
+myqueue = redis.simple_queue()
 myqueue.push('foo')
 myqueue.push('bar')
@@ -29,13 +29,13 @@ class PushMany(Script):
   redis.call('RPUSH', key, unpack(vals))
   """
 
-# Building upon the datatype example, we can extend the Queue class
-# and make use of our script.
-from datatype import Queue
+# Building upon the datatype example, we can extend the SimpleQueue
+# class and make use of our script.
+from datatype import SimpleQueue
 from active_redis import registry
 
 @registry.datatype
-class BetterQueue(Queue):
+class BetterQueue(SimpleQueue):
   """A better version of our queue."""
   type = 'better_queue'
 
@@ -5,8 +5,13 @@ import sys, os, unittest
 from tests.core import (
   ActiveRedisTestCase,
   ActiveRedisClientTestCase,
+  BatchTestCase,
+  CodecTestCase,
+  CompressionTestCase,
+  ScriptManagerTestCase,
   DataTypeTestCase,
   ObserverTestCase,
+  WriteBackTestCase,
   NotifierTestCase,
   ObservableTestCase,
   ScriptTestCase,
@@ -18,16 +23,32 @@ from tests.registry import (
   Observable as ObservableRegistryTestCase,
 )
 
+from tests.cache import CacheTestCase
+from tests.lock import LockTestCase
+from tests.instrument import InstrumentationTestCase
+from tests.asynchronous import AsyncActiveRedisTestCase
+
 from tests.datatypes.list import ListTestCase
 from tests.datatypes.dict import DictTestCase
 from tests.datatypes.set import SetTestCase
+from tests.datatypes.sortedset import SortedSetTestCase
+from tests.datatypes.stream import StreamTestCase, StreamProtocolTestCase
+from tests.datatypes.queue import QueueTestCase
+from tests.datatypes.counter import CounterTestCase
+from tests.datatypes.hyperloglog import HyperLogLogTestCase
+from tests.datatypes.bitmap import BitmapTestCase
 
 def all_tests():
   suite = unittest.TestSuite()
   suite.addTest(unittest.makeSuite(ActiveRedisTestCase))
   suite.addTest(unittest.makeSuite(ActiveRedisClientTestCase))
+  suite.addTest(unittest.makeSuite(BatchTestCase))
+  suite.addTest(unittest.makeSuite(CodecTestCase))
+  suite.addTest(unittest.makeSuite(CompressionTestCase))
+  suite.addTest(unittest.makeSuite(ScriptManagerTestCase))
   suite.addTest(unittest.makeSuite(DataTypeTestCase))
   suite.addTest(unittest.makeSuite(ObserverTestCase))
+  suite.addTest(unittest.makeSuite(WriteBackTestCase))
   suite.addTest(unittest.makeSuite(NotifierTestCase))
   suite.addTest(unittest.makeSuite(ObservableTestCase))
   suite.addTest(unittest.makeSuite(ScriptTestCase))
@@ -36,7 +57,19 @@ def all_tests():
   suite.addTest(unittest.makeSuite(DataTypeRegistryTestCase))
   suite.addTest(unittest.makeSuite(ObservableRegistryTestCase))
 
+  suite.addTest(unittest.makeSuite(CacheTestCase))
+  suite.addTest(unittest.makeSuite(LockTestCase))
+  suite.addTest(unittest.makeSuite(InstrumentationTestCase))
+  suite.addTest(unittest.makeSuite(AsyncActiveRedisTestCase))
+
   suite.addTest(unittest.makeSuite(ListTestCase))
   suite.addTest(unittest.makeSuite(DictTestCase))
   suite.addTest(unittest.makeSuite(SetTestCase))
+  suite.addTest(unittest.makeSuite(SortedSetTestCase))
+  suite.addTest(unittest.makeSuite(StreamTestCase))
+  suite.addTest(unittest.makeSuite(StreamProtocolTestCase))
+  suite.addTest(unittest.makeSuite(QueueTestCase))
+  suite.addTest(unittest.makeSuite(CounterTestCase))
+  suite.addTest(unittest.makeSuite(HyperLogLogTestCase))
+  suite.addTest(unittest.makeSuite(BitmapTestCase))
   return suite
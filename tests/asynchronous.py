@@ -0,0 +1,30 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+import unittest
+from tests.fake import FakeRedisTestCase
+from active_redis.asynchronous import AsyncActiveRedis, ThreadPoolExecutor
+
+@unittest.skipIf(ThreadPoolExecutor is None, "These tests require concurrent.futures.")
+class AsyncActiveRedisTestCase(FakeRedisTestCase):
+  def setUp(self):
+    super(AsyncActiveRedisTestCase, self).setUp()
+    self.activeredis = AsyncActiveRedis(self.redis, workers=4)
+
+  def tearDown(self):
+    self.activeredis.shutdown()
+
+  def test_overlapping_fetches(self):
+    l = self.activeredis.list('foo')
+    l.extend(range(250)).result()
+    iterator = l.iterate(size=10)
+    futures = [iterator.fetch() for i in range(30)]
+    self.assertEquals([item for future in futures for item in future.result()], range(250))
+
+  def test_write_errors(self):
+    l = self.activeredis.list('foo')
+    l.append(1).result()
+    l[5] = 2
+    self.assertRaises(IndexError, lambda: l.flush().result())
+    l[0] = 3
+    l.flush().result()
+    self.assertEquals(l.getitem(0).result(), 3)
@@ -0,0 +1,59 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+import unittest
+from active_redis.cache import Cache
+
+class CacheTestCase(unittest.TestCase):
+  def test_read_through(self):
+    cache = Cache()
+    self.assertEquals(cache.get('foo', 'bar', lambda: 'baz'), 'baz')
+    self.assertEquals(cache.get('foo', 'bar', lambda: 'qux'), 'baz')
+    self.assertEquals(cache.stats()['hits'], 1)
+    self.assertEquals(cache.stats()['misses'], 1)
+
+  def test_invalidate(self):
+    cache = Cache()
+    cache.get('foo', 'bar', lambda: 'baz')
+    cache.get('foo', 'baz', lambda: 'baz')
+    cache.invalidate('foo', 'bar')
+    self.assertEquals(cache.get('foo', 'bar', lambda: 'qux'), 'qux')
+    self.assertEquals(cache.get('foo', 'baz', lambda: 'qux'), 'baz')
+    cache.invalidate('foo')
+    self.assertEquals(cache.get('foo', 'baz', lambda: 'qux'), 'qux')
+
+  def test_eviction(self):
+    cache = Cache(maxsize=2)
+    cache.get('foo', 1, lambda: 1)
+    cache.get('foo', 2, lambda: 2)
+    cache.get('foo', 1, lambda: None)
+    cache.get('foo', 3, lambda: 3)
+    self.assertEquals(cache.get('foo', 1, lambda: None), 1)
+    self.assertEquals(cache.get('foo', 2, lambda: None), None)
+
+  def test_ttl(self):
+    cache = Cache(ttl=0)
+    cache.get('foo', 'bar', lambda: 'baz')
+    self.assertEquals(cache.get('foo', 'bar', lambda: 'qux'), 'qux')
+
+  def test_concurrent_invalidation(self):
+    cache = Cache()
+    def load():
+      cache.invalidate('foo')
+      return 'baz'
+    cache.get('foo', 'bar', load)
+    self.assertEquals(cache.get('foo', 'bar', lambda: 'qux'), 'qux')
+
+  def test_unrelated_invalidation(self):
+    cache = Cache()
+    def load():
+      cache.invalidate('bar')
+      return 'baz'
+    cache.get('foo', 'bar', load)
+    self.assertEquals(cache.get('foo', 'bar', lambda: 'qux'), 'baz')
+
+  def test_versioned_set(self):
+    cache = Cache()
+    version = cache.version('foo')
+    cache.invalidate('foo')
+    cache.set('foo', 'bar', 'baz', version)
+    self.assertEquals(cache.get('foo', 'bar', lambda: 'qux'), 'qux')
@@ -1,28 +1,286 @@
 # Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
 # See LICENSE for details.
 import unittest
+from tests.fake import FakeRedisTestCase
+from active_redis.cache import Cache
 from active_redis.core import (
   ActiveRedis,
   ActiveRedisClient,
+  Future,
   DataType,
   Observer,
   Notifier,
   Observable,
   Script,
+  WriteBack,
+  Codec,
 )
+from active_redis.exception import EncodingError, RegistryError
+from active_redis.datatypes.list import List
+from active_redis import codecs
+import cPickle, os, threading
+from redis import ResponseError
 
-class ActiveRedisTestCase(unittest.TestCase):
-  pass
+class ActiveRedisTestCase(FakeRedisTestCase):
+  def test_identity_map(self):
+    self.assertTrue(self.activeredis.list('foo') is self.activeredis.list('foo'))
+
+  def test_identity_map_lock(self):
+    client = self.activeredis._get_client({'compression': 'zlib'})
+    self.assertTrue(client.identities is self.activeredis.session.identities)
+    self.assertTrue(client.identity_lock is self.activeredis.session.identity_lock)
+
+  def test_identity_map_options(self):
+    child = self.activeredis.list('child')
+    parent = self.activeredis.dict('parent', compression='zlib')
+    parent['child'] = child
+    ref = parent['child']
+    self.assertTrue(ref.client is parent.client)
+    again = self.activeredis.list('child')
+    self.assertTrue(again is child)
+    self.assertTrue(again.client.compressor is None)
+    self.assertTrue(self.activeredis.dict('parent', compression='zlib') is parent)
+    self.assertFalse(self.activeredis.dict('parent') is parent)
+
+  def test_thread_writeback(self):
+    d = self.activeredis.dict('foo')
+    d['x'] = ['a']
+    seen = []
+    def other():
+      seen.append(d._writeback)
+      seen.append(d.get('x'))
+      d['y'] = ['c']
+      d['y'].append('d')
+    with d.deferred():
+      d['x'].append('b')
+      thread = threading.Thread(target=other)
+      thread.start()
+      thread.join()
+      self.assertEquals(seen, [None, ['a']])
+      self.assertEquals(d.get('y'), ['c', 'd'])
+    self.assertEquals(d.get('x'), ['a', 'b'])
+
+  def test_prefetch_version(self):
+    cache = Cache()
+    activeredis = ActiveRedis(self.redis, cache=cache)
+    child = activeredis.dict('child')
+    child['x'] = 1
+    client = activeredis.session
+    version = cache.version('child')
+    cache.invalidate('child')
+    child._prefetched(cache, {'x': client.encode(2)}, version)
+    self.assertEquals(child['x'], 1)
+    client.prefetch([child])
+    self.redis.hset('child', 'x', client.encode(2))
+    self.assertEquals(child['x'], 1)
 
 class ActiveRedisClientTestCase(unittest.TestCase):
   pass
 
-class DataTypeTestCase(unittest.TestCase):
-  pass
+class BatchTestCase(FakeRedisTestCase):
+  def test_futures(self):
+    d = self.activeredis.dict('foo')
+    d['a'] = 1
+    with self.activeredis.batch():
+      value = d['a']
+      self.assertTrue(isinstance(value, Future))
+      self.assertFalse(value.done())
+      d['b'] = 2
+    self.assertEquals(value.result(), 1)
+    self.assertEquals(d['b'], 2)
+
+  def test_transaction(self):
+    l = self.activeredis.list('foo')
+    with self.activeredis.batch(transaction=True):
+      l.append('a')
+      l.append('b')
+      self.assertEquals(len(l), 0)
+    self.assertEquals(list(l), ['a', 'b'])
+
+  def test_pipelined(self):
+    client = self.activeredis.session
+    def build(pipeline):
+      pipeline.incr('foo')
+      pipeline.incr('foo')
+    self.assertEquals(client.pipelined(build), [1, 2])
+    self.assertEquals(client.pipelined(lambda pipeline: None), [])
+    with self.activeredis.batch():
+      futures = client.pipelined(build, transaction=True)
+      self.assertEquals(len(futures), 2)
+      self.assertFalse(futures[0].done())
+    self.assertEquals([future.result() for future in futures], [3, 4])
+
+  def test_error(self):
+    l = self.activeredis.list('foo')
+    self.redis.set('bar', 'baz')
+    bad = self.activeredis.list('bar')
+    try:
+      with self.activeredis.batch():
+        l.append('a')
+        item = bad.index(0)
+    except Exception:
+      pass
+    else:
+      self.fail("Batch errors should be raised.")
+    self.assertRaises(Exception, item.result)
+    self.assertEquals(list(l), ['a'])
+
+class CodecTestCase(unittest.TestCase):
+  items = [1, 'foo', [1, 2, 3], {'foo': 'bar'}, None, True, 1.5]
+
+  def test_registry(self):
+    for type, tag in (('pickle', '\x01'), ('json', '\x02'), ('msgpack', '\x03')):
+      self.assertTrue(Codec.exists(type))
+      self.assertTrue(Codec.tag_exists(tag))
+      self.assertTrue(Codec.get_by_tag(tag) is Codec.get(type))
+    self.assertFalse(Codec.exists('foo'))
+    self.assertRaises(RegistryError, Codec.get_by_tag, '\x7e')
+
+  def _round_trip(self, codec):
+    client = ActiveRedisClient(None, codec=codec)
+    for item in self.items:
+      value = client.encode(item)
+      self.assertEquals(value[:1], Codec.get(codec).tag)
+      self.assertEquals(client.decode(value), item)
+
+  def test_pickle(self):
+    self._round_trip('pickle')
+    client = ActiveRedisClient(None)
+    self.assertEquals(client.decode(client.encode(set([1, 2]))), set([1, 2]))
+
+  def test_json(self):
+    self._round_trip('json')
+
+  @unittest.skipIf(codecs.msgpack is None, "The msgpack package is not installed.")
+  def test_msgpack(self):
+    self._round_trip('msgpack')
+
+  def test_mixed_codecs(self):
+    pickled = ActiveRedisClient(None, codec='pickle').encode({'foo': 1})
+    client = ActiveRedisClient(None, codec='json')
+    self.assertEquals(client.decode(pickled), {'foo': 1})
+
+  def test_references(self):
+    client = ActiveRedisClient(None)
+    value = client.encode(List('foo', client))
+    self.assertEquals(value, '\x00list:foo')
+    decoded = client.decode(value)
+    self.assertTrue(isinstance(decoded, List))
+    self.assertEquals(decoded.key, 'foo')
+
+  def test_legacy_values(self):
+    client = ActiveRedisClient(None)
+    self.assertEquals(client.decode('redis:absolute:' + cPickle.dumps({'foo': [1]})), {'foo': [1]})
+    decoded = client.decode('redis:struct:list:foo')
+    self.assertTrue(isinstance(decoded, List))
+    self.assertEquals(decoded.key, 'foo')
+
+  def test_unknown_value(self):
+    client = ActiveRedisClient(None)
+    self.assertRaises(EncodingError, client.decode, '\x7eunknown')
+
+class CompressionTestCase(FakeRedisTestCase):
+  large = {'foo': 'x' * 2000}
+
+  def test_threshold(self):
+    client = ActiveRedisClient(None, compression='zlib', compression_threshold=100)
+    self.assertEquals(client.encode('small')[:1], client.codec.tag)
+    value = client.encode(self.large)
+    self.assertEquals(value[:2], '\x7fz')
+    self.assertTrue(len(value) < 100)
+    self.assertEquals(client.decode(value), self.large)
+
+  def test_incompressible(self):
+    client = ActiveRedisClient(None, compression='zlib', compression_threshold=10)
+    value = client.encode(os.urandom(200))
+    self.assertEquals(value[:1], client.codec.tag)
+
+  @unittest.skipIf(codecs.lz4 is None, "The lz4 package is not installed.")
+  def test_lz4(self):
+    client = ActiveRedisClient(None, compression='lz4')
+    value = client.encode(self.large)
+    self.assertEquals(value[:2], '\x7fl')
+    self.assertEquals(client.decode(value), self.large)
+
+  def test_datatype_options(self):
+    compressed = self.activeredis.dict('foo', compression='zlib')
+    compressed['a'] = self.large
+    self.assertEquals(self.redis.hget('foo', 'a')[:2], '\x7fz')
+    plain = self.activeredis.dict('foo')
+    plain['b'] = self.large
+    self.assertEquals(self.redis.hget('foo', 'b')[:1], plain.client.codec.tag)
+
+  def test_mixed_reads(self):
+    self.activeredis.dict('foo', compression='zlib')['a'] = self.large
+    self.activeredis.dict('foo')['b'] = self.large
+    # Any client decodes both forms regardless of its own options.
+    for d in (self.activeredis.dict('foo'), self.activeredis.dict('foo', compression='zlib')):
+      # Observed dicts are compared through get(), which does not wrap them.
+      self.assertEquals(d.get('a'), self.large)
+      self.assertEquals(d.get('b'), self.large)
+
+class ScriptManagerTestCase(FakeRedisTestCase):
+  def _flush_scripts(self):
+    try:
+      self.redis.script_flush()
+    except ResponseError:
+      # fakeredis 1.0 does not implement SCRIPT FLUSH.
+      self.redis.connection_pool.connection_kwargs['server'].script_cache.clear()
+
+  def test_flushed_scripts(self):
+    d = self.activeredis.dict('foo')
+    d.setdefault('a', 1)
+    for transaction in (False, True, False):
+      self._flush_scripts()
+      with self.activeredis.batch(transaction):
+        d.setdefault('b', 2)
+        value = d.setdefault('a', 3)
+      self.assertEquals(value.result(), 1)
+    self.assertEquals(d.get('b'), 2)
+
+  def test_flushed_pipeline_scripts(self):
+    d = self.activeredis.dict('foo')
+    d['a'] = 1
+    self.assertEquals(d.has_keys(['a', 'b']), [True, False])
+    self._flush_scripts()
+    self.assertEquals(d.has_keys(['a', 'b']), [True, False])
+
+class DataTypeTestCase(FakeRedisTestCase):
+  def test_delete_references(self):
+    activeredis = ActiveRedis(self.redis, cache=Cache())
+    parent = activeredis.dict('parent')
+    child = activeredis.dict('child')
+    child['x'] = 1
+    parent['child'] = child
+    parent['missing'] = activeredis.list('missing')
+    self.assertEquals(child['x'], 1)
+    self.assertEquals(parent.delete(references=True), 2)
+    self.assertFalse(self.redis.exists('child'))
+    self.assertRaises(KeyError, lambda: child['x'])
 
 class ObserverTestCase(unittest.TestCase):
   pass
 
+class WriteBackTestCase(unittest.TestCase):
+  def test_failed_flush(self):
+    class FlakyObserver(Observer):
+      fail = True
+      def __init__(self):
+        self.writes = []
+      def notify(self, subject, key):
+        if self.fail and key == 'b':
+          raise IOError()
+        self.writes.append((key, subject))
+    observer = FlakyObserver()
+    writeback = WriteBack(observer)
+    writeback.add(1, ('a',), {})
+    writeback.add(2, ('b',), {})
+    self.assertRaises(IOError, writeback.flush)
+    self.assertEquals(observer.writes, [('a', 1)])
+    observer.fail = False
+    writeback.flush()
+    self.assertEquals(observer.writes, [('a', 1), ('b', 2)])
+
 class NotifierTestCase(unittest.TestCase):
   pass
 
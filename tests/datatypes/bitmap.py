@@ -0,0 +1,24 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from tests.fake import FakeRedisTestCase
+from active_redis.datatypes.bitmap import Bitmap
+
+class BitmapTestCase(FakeRedisTestCase):
+  def setUp(self):
+    super(BitmapTestCase, self).setUp()
+    self.bitmap = self.activeredis.bitmap('foo')
+
+  def test_bits(self):
+    self.assertFalse(self.bitmap[5])
+    self.bitmap[5] = True
+    self.assertTrue(self.bitmap[5])
+    self.bitmap[5] = False
+    self.assertFalse(self.bitmap[5])
+
+  def test_get_set_many(self):
+    self.bitmap.chunk_size = 3
+    self.bitmap.set_many([1, 3, 5, 7, 100])
+    self.bitmap.set_many({3: False, 4: True})
+    self.assertEquals(self.bitmap.get_many(range(8)), [False, True, False, False, True, True, False, True])
+    self.assertEquals(self.bitmap.count(), 5)
+    self.assertEquals(self.bitmap.count(0, 0), 4)
@@ -0,0 +1,37 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from tests.fake import FakeRedisTestCase
+from active_redis.datatypes.counter import Counter
+
+class CounterTestCase(FakeRedisTestCase):
+  def setUp(self):
+    super(CounterTestCase, self).setUp()
+    self.counter = self.activeredis.counter('foo')
+
+  def test_increment(self):
+    self.assertEquals(self.counter['a'], 0)
+    self.assertEquals(self.counter.increment('a'), 1)
+    self.assertEquals(self.counter.increment('a', 5), 6)
+    self.assertEquals(self.counter.decrement('a', 2), 4)
+    self.assertTrue('a' in self.counter)
+    self.assertFalse('b' in self.counter)
+
+  def test_update(self):
+    self.counter.chunk_size = 2
+    self.counter.update('abracadabra')
+    self.counter.update({'a': 1, 'z': 3})
+    self.assertEquals(self.counter['a'], 6)
+    self.assertEquals(self.counter['z'], 3)
+    self.assertEquals(len(self.counter), 6)
+    self.assertEquals(self.counter.total(), 15)
+
+  def test_subtract(self):
+    self.counter.update('aabbb')
+    self.counter.subtract('ab')
+    self.counter.subtract({'b': 5})
+    self.assertEquals(sorted(self.counter.items()), [('a', 1), ('b', -3)])
+
+  def test_most_common(self):
+    self.counter.update('abbccc')
+    self.assertEquals(self.counter.most_common(2), [('c', 3), ('b', 2)])
+    self.assertEquals(self.counter.most_common(), [('c', 3), ('b', 2), ('a', 1)])
@@ -1,7 +1,77 @@
 # Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
 # See LICENSE for details.
-import unittest
+from tests.fake import FakeRedisTestCase
 from active_redis.datatypes.dict import Dict
+from active_redis import bulk_load
 
-class DictTestCase(unittest.TestCase):
-  pass
+class DictTestCase(FakeRedisTestCase):
+  def test_batch_protocol_methods(self):
+    d = self.activeredis.dict('foo')
+    d['a'] = 1
+    with self.activeredis.batch():
+      self.assertTrue('a' in d)
+      self.assertFalse('b' in d)
+      self.assertEquals(len(d), 1)
+      d['b'] = 2
+    self.assertEquals(len(d), 2)
+
+  def test_deferred_direct_writes(self):
+    d = self.activeredis.dict('foo')
+    d['x'] = ['a']
+    d['y'] = ['b']
+    d['z'] = ['c']
+    with d.deferred():
+      d['x'].append(2)
+      d['y'].append(2)
+      d['z'].append(2)
+      d['x'] = 'new'
+      del d['y']
+      self.assertEquals(d.get('x'), 'new')
+      self.assertEquals(d['x'], 'new')
+    self.assertEquals(d.get('x'), 'new')
+    self.assertFalse('y' in d)
+    self.assertEquals(d.get('z'), ['c', 2])
+
+  def test_deferred_clear(self):
+    d = self.activeredis.dict('foo')
+    d['x'] = ['a']
+    with d.deferred():
+      d['x'].append(2)
+      d.clear()
+    self.assertEquals(len(d), 0)
+
+  def test_deferred_pop(self):
+    d = self.activeredis.dict('foo')
+    d['x'] = ['a']
+    with d.deferred():
+      d['x'].append('b')
+      self.assertEquals(d.pop('x'), ['a', 'b'])
+    self.assertFalse('x' in d)
+    self.assertEquals(d.pop('x', None), None)
+
+  def test_get_many(self):
+    d = self.activeredis.dict('foo')
+    d['a'], d['b'], d['c'] = 1, 'b', None
+    d.chunk_size = 2
+    self.assertEquals(d.get_many(['a', 'x', 'c', 'b', 'a']), [1, None, None, 'b', 1])
+    self.assertEquals(d.get_many(['x', 'a'], default=0), [0, 1])
+    self.assertEquals(d.get_many([]), [])
+
+  def test_has_keys(self):
+    d = self.activeredis.dict('foo')
+    d['a'], d['b'], d['c'] = 1, 2, None
+    d.chunk_size = 2
+    self.assertEquals(d.has_keys(['a', 'x', 'c', 'b', 'y']), [True, False, True, True, False])
+    self.assertEquals(d.has_keys([]), [])
+
+  def test_bulk_load(self):
+    items = dict(('key%d' % i, i) for i in range(1000))
+    for processes in (False, True):
+      d = self.activeredis.dict('foo')
+      d.clear()
+      self.assertEquals(bulk_load(d, items, workers=2, processes=processes, chunk_size=100), 1000)
+      self.assertEquals(len(d), 1000)
+      self.assertEquals(d.get_many(['key0', 'key999']), [0, 999])
+      d.clear()
+      self.assertEquals(bulk_load(d, sorted(items.items())[:10], processes=processes), 10)
+      self.assertEquals(len(d), 10)
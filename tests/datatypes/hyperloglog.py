@@ -0,0 +1,23 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from tests.fake import FakeRedisTestCase
+from active_redis.datatypes.hyperloglog import HyperLogLog
+
+class HyperLogLogTestCase(FakeRedisTestCase):
+  def test_count(self):
+    hll = self.activeredis.hyperloglog('foo')
+    self.assertTrue(hll.add('a', 'b'))
+    self.assertFalse(hll.add('a'))
+    hll.chunk_size = 10
+    hll.update(range(100))
+    self.assertAlmostEqual(hll.count(), 102, delta=3)
+    self.assertAlmostEqual(len(hll), 102, delta=3)
+
+  def test_merge(self):
+    first = self.activeredis.hyperloglog('foo')
+    second = self.activeredis.hyperloglog('bar')
+    first.update(range(50))
+    second.update(range(25, 75))
+    self.assertAlmostEqual(first.count(second), 75, delta=3)
+    first |= second
+    self.assertAlmostEqual(first.count(), 75, delta=3)
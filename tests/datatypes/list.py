@@ -1,7 +1,116 @@
 # Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
 # See LICENSE for details.
-import unittest
+from tests.fake import FakeRedisTestCase
 from active_redis.datatypes.list import List
+from active_redis import bulk_load
 
-class ListTestCase(unittest.TestCase):
-  pass
+class ListTestCase(FakeRedisTestCase):
+  def test_batch_protocol_methods(self):
+    l = self.activeredis.list('foo')
+    l.extend(['a', 'b'])
+    with self.activeredis.batch():
+      self.assertTrue('a' in l)
+      self.assertFalse('c' in l)
+      self.assertEquals(len(l), 2)
+      l.append('c')
+      # Queued commands are not visible until the batch is executed.
+      self.assertEquals(len(l), 2)
+    self.assertEquals(len(l), 3)
+    self.assertTrue('c' in l)
+
+  def test_reverse(self):
+    l = self.activeredis.list('foo')
+    l.page_size = 3000
+    l.extend(range(2500))
+    l.reverse()
+    self.assertEquals(list(l), range(2499, -1, -1))
+    l.page_size = 7
+    l.reverse()
+    self.assertEquals(list(l), range(2500))
+
+  # Slice bounds and steps compared against Python list semantics.
+  bounds = [None, -9, -5, -1, 0, 1, 3, 5, 9]
+  steps = [None, 1, 2, 3, -1, -2, -3]
+
+  def _slices(self):
+    for start in self.bounds:
+      for stop in self.bounds:
+        for step in self.steps:
+          yield slice(start, stop, step)
+
+  def test_get_slice(self):
+    expected = range(7)
+    l = self.activeredis.list('foo')
+    l.extend(expected)
+    for key in self._slices():
+      self.assertEquals(l[key], expected[key], key)
+
+  def test_delete_slice(self):
+    l = self.activeredis.list('foo')
+    for key in self._slices():
+      expected = range(7)
+      self.redis.delete('foo')
+      l.extend(expected)
+      del expected[key]
+      del l[key]
+      self.assertEquals(list(l), expected, key)
+
+  def test_set_slice(self):
+    l = self.activeredis.list('foo')
+    for key in self._slices():
+      expected = range(7)
+      self.redis.delete('foo')
+      l.extend(expected)
+      size = len(expected[key]) if key.step not in (None, 1) else 2
+      items = ['x%d' % (i,) for i in range(size)]
+      expected[key] = items
+      l[key] = items
+      self.assertEquals(list(l), expected, key)
+
+  def test_set_extended_slice_size(self):
+    l = self.activeredis.list('foo')
+    l.extend(range(7))
+    self.assertRaises(ValueError, l.__setitem__, slice(None, None, 2), ['x'])
+    self.assertEquals(list(l), range(7))
+
+  def test_large_slices(self):
+    expected = range(2500)
+    l = self.activeredis.list('foo')
+    l.extend(expected)
+    for key in (slice(100, 2300), slice(1200, 1300), slice(-2400, None, 2)):
+      self.assertEquals(l[key], expected[key], key)
+    items = ['x'] * 2200
+    expected[10:20] = items
+    l[10:20] = items
+    self.assertEquals(list(l), expected)
+    del expected[1500:1510]
+    del l[1500:1510]
+    del expected[3000:3010]
+    del l[3000:3010]
+    self.assertEquals(list(l), expected)
+
+  def test_deferred_structural_changes(self):
+    l = self.activeredis.list('foo')
+    l.extend([['a'], ['b']])
+    with l.deferred():
+      l[1].append('x')
+      l.pop(0)
+      l.append(['c'])
+    self.assertEquals(l[:], [['b', 'x'], ['c']])
+
+  def test_deferred_direct_writes(self):
+    l = self.activeredis.list('foo')
+    l.extend([['a'], ['b']])
+    with l.deferred():
+      l[0].append('x')
+      l[1].append('y')
+      l[0] = 'new'
+      self.assertEquals(l[0], 'new')
+    self.assertEquals(l[:], ['new', ['b', 'y']])
+
+  def test_bulk_load(self):
+    for processes in (False, True):
+      l = self.activeredis.list('foo')
+      l.delete()
+      self.assertEquals(bulk_load(l, ({'i': i} for i in range(1000)), workers=3, processes=processes, chunk_size=64), 1000)
+      self.assertEquals(l[:], [{'i': i} for i in range(1000)])
@@ -0,0 +1,84 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from tests.fake import FakeRedisTestCase
+from active_redis import ActiveRedis
+from active_redis.datatypes.queue import Queue
+import time
+
+class QueueTestCase(FakeRedisTestCase):
+  def setUp(self):
+    super(QueueTestCase, self).setUp()
+    self.queue = self.activeredis.queue('foo')
+    self.queue.priorities = 3
+
+  def test_fifo(self):
+    self.queue.put_many(['a', 'b', 'c'])
+    self.assertEquals(len(self.queue), 3)
+    self.assertEquals(self.queue.get(), 'a')
+    self.assertEquals(self.queue.get_many(5), ['b', 'c'])
+    self.assertEquals(self.queue.get(block=False), None)
+    self.assertEquals(self.queue.get(timeout=0.1), None)
+
+  def test_priorities(self):
+    self.queue.put('low')
+    self.queue.put('high', priority=2)
+    self.queue.put('medium', priority=1)
+    self.assertEquals(self.queue.get_many(3), ['high', 'medium', 'low'])
+    self.assertRaises(ValueError, self.queue.put, 'x', 3)
+
+  def test_ack(self):
+    self.queue.put_many([{'a': 1}, 'b'])
+    receipt, item = self.queue.reserve(block=False)
+    self.assertEquals(item, {'a': 1})
+    self.assertEquals(self.queue.processing(), 1)
+    self.assertEquals(len(self.queue), 1)
+    self.assertTrue(self.queue.ack(receipt))
+    self.assertFalse(self.queue.ack(receipt))
+    self.assertEquals(self.queue.processing(), 0)
+
+  def test_requeue(self):
+    self.queue.put('a', priority=1)
+    receipt, item = self.queue.reserve(block=False, visibility=0.05)
+    self.assertEquals(self.queue.reserve(block=False), None)
+    self.assertEquals(self.queue.requeue(), 0)
+    time.sleep(0.06)
+    self.assertEquals(self.queue.requeue(), 1)
+    self.assertEquals(self.queue.processing(), 0)
+    self.assertEquals(self.queue.get(block=False), 'a')
+
+  def test_delete(self):
+    self.queue.put('a')
+    self.queue.reserve(block=False)
+    for priority in range(3):
+      self.queue.put(priority, priority)
+    self.queue.delete()
+    self.assertEquals(self.redis.keys('foo*'), [])
+    self.assertEquals(self.queue.priorities, 1)
+
+  def test_stored_priorities(self):
+    other = ActiveRedis(self.redis).queue('foo')
+    self.assertEquals(other.priorities, 3)
+    other.put('low')
+    other.put('high', priority=2)
+    self.assertEquals(self.queue.get_many(2), ['high', 'low'])
+    self.assertRaises(ValueError, setattr, self.queue, 'priorities', 0)
+
+  def test_reserve_requeues_expired(self):
+    self.queue.put_many(['a', 'b'], priority=1)
+    self.queue.reserve(block=False, visibility=0.05)
+    self.queue.reserve(block=False, visibility=30)
+    time.sleep(0.06)
+    receipt, item = self.queue.reserve(block=False)
+    self.assertEquals(item, 'a')
+    self.assertEquals(self.queue.processing(), 2)
+    self.assertEquals(self.queue.requeue(), 0)
+
+  def test_wait_for_deadline(self):
+    self.queue.put('a')
+    self.queue.reserve(block=False, visibility=0.2)
+    # No item is queued, so the consumer must wake up by the deadline of
+    # the reserved item rather than wait for the full timeout.
+    start = time.time()
+    receipt, item = ActiveRedis(self.redis).queue('foo').reserve(timeout=10)
+    self.assertEquals(item, 'a')
+    self.assertTrue(time.time() - start < 5)
@@ -1,7 +1,108 @@
 # Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
 # See LICENSE for details.
-import unittest
+from tests.fake import FakeRedisTestCase
 from active_redis.datatypes.set import Set
+from active_redis import bulk_load
 
-class SetTestCase(unittest.TestCase):
-  pass
+class SetTestCase(FakeRedisTestCase):
+  def test_batch_protocol_methods(self):
+    s = self.activeredis.set('foo')
+    s.add('a')
+    with self.activeredis.batch():
+      self.assertTrue('a' in s)
+      self.assertFalse('b' in s)
+      self.assertEquals(len(s), 1)
+      s.add('b')
+    self.assertTrue('b' in s)
+    self.assertEquals(len(s), 2)
+
+  def test_scan(self):
+    s = self.activeredis.set('foo')
+    s.update(range(2500))
+    self.assertEquals(set(s.scan(count=100)), set(range(2500)))
+    self.assertEquals(len(repr(s).split(',')), 101)
+
+  def _operands(self):
+    s = self.activeredis.set('foo')
+    s.update(['a', 'b', 'c'])
+    o = self.activeredis.set('bar')
+    o.update(['b', 'c', 'd'])
+    return s, o
+
+  def test_algebra(self):
+    s, o = self._operands()
+    other = set(['b', 'c', 'd'])
+    results = {
+      'union': set(['a', 'b', 'c', 'd']),
+      'intersection': set(['b', 'c']),
+      'difference': set(['a']),
+      'symmetric_difference': set(['a', 'd']),
+    }
+    for name, expected in results.items():
+      for operand in (o, other):
+        newset = getattr(s, name)(operand)
+        self.assertTrue(isinstance(newset, Set))
+        self.assertEquals(set(newset), expected)
+        self.assertEquals(getattr(s, name)(operand, store=False), expected)
+    self.assertEquals(set(s), set(['a', 'b', 'c']))
+    self.assertEquals(set(o), set(['b', 'c', 'd']))
+
+  def test_operators(self):
+    s, o = self._operands()
+    self.assertEquals(set(s | o), set(['a', 'b', 'c', 'd']))
+    self.assertEquals(set(s & o), set(['b', 'c']))
+    self.assertEquals(set(s - o), set(['a']))
+    self.assertEquals(set(s ^ o), set(['a', 'd']))
+    self.assertTrue(s & o <= s)
+    self.assertTrue(s >= set(['a', 'b']))
+    self.assertFalse(s <= o)
+
+  def test_algebra_update(self):
+    results = {
+      'update': set(['a', 'b', 'c', 'd']),
+      'intersection_update': set(['b', 'c']),
+      'difference_update': set(['a']),
+      'symmetric_difference_update': set(['a', 'd']),
+    }
+    for name, expected in results.items():
+      for redis_operand in (True, False):
+        self.redis.flushall()
+        s, o = self._operands()
+        operand = o if redis_operand else set(['b', 'c', 'd'])
+        self.assertTrue(getattr(s, name)(operand) is s)
+        self.assertEquals(set(s), expected)
+        self.assertEquals(set(o), set(['b', 'c', 'd']))
+
+  def test_symmetric_difference_keys(self):
+    s, o = self._operands()
+    s.symmetric_difference(o)
+    s ^= o
+    self.assertEquals(set(s), set(['a', 'd']))
+    self.assertFalse(self.redis.exists('foo:diff'))
+    self.assertFalse(self.redis.exists('bar:diff'))
+    s ^= s
+    self.assertEquals(len(s), 0)
+
+  def test_contains_many(self):
+    s = self.activeredis.set('foo')
+    s.update(['a', 'b', 1])
+    s.chunk_size = 2
+    self.assertEquals(s.contains_many(['a', 'c', 1, 'a', 2, 'b']), [True, False, True, True, False, True])
+    self.assertEquals(s.contains_many([]), [])
+
+  def test_bulk_load(self):
+    for processes in (False, True):
+      s = self.activeredis.set('foo')
+      s.clear()
+      self.assertEquals(bulk_load(s, (i % 250 for i in range(1000)), workers=2, processes=processes, chunk_size=100), 1000)
+      self.assertEquals(set(s), set(range(250)))
+
+  def test_scan_dedupe(self):
+    s = self.activeredis.set('foo')
+    s.update(['a', 'b', 'c'])
+    values = [s.client.encode(item) for item in ('a', 'b', 'c')]
+    pages = {0: (1, values[:2]), 1: (2, values[1:2]), 2: (0, values[1:])}
+    s.client.redis.sscan = lambda key, cursor, match=None, count=None: pages[cursor]
+    self.assertEquals(list(s), ['a', 'b', 'c'])
+    self.assertEquals(list(s.scan()), ['a', 'b', 'c'])
+    self.assertEquals(list(s.scan(dedupe=False)), ['a', 'b', 'b', 'b', 'c'])
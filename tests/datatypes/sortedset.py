@@ -0,0 +1,61 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from tests.fake import FakeRedisTestCase
+from active_redis.datatypes.sortedset import SortedSet
+
+class SortedSetTestCase(FakeRedisTestCase):
+  def setUp(self):
+    super(SortedSetTestCase, self).setUp()
+    self.zset = self.activeredis.sortedset('foo')
+    self.zset.add_many({'a': 1, 'b': 2, 'c': 3, 'd': 4})
+
+  def test_scores(self):
+    self.assertEquals(self.zset['b'], 2.0)
+    self.assertEquals(self.zset.score('e'), None)
+    self.assertRaises(KeyError, lambda: self.zset['e'])
+    self.assertTrue('a' in self.zset)
+    self.assertFalse('e' in self.zset)
+    self.assertEquals(len(self.zset), 4)
+
+  def test_increment(self):
+    self.assertEquals(self.zset.increment('a', 5), 6.0)
+    self.assertEquals(self.zset['a'], 6.0)
+    self.assertEquals(self.zset.increment('e'), 1.0)
+    self.assertEquals(self.zset.range(), ['e', 'b', 'c', 'd', 'a'])
+
+  def test_ranges(self):
+    self.assertEquals(self.zset.range(), ['a', 'b', 'c', 'd'])
+    self.assertEquals(self.zset.range(1, 2, reverse=True), ['c', 'b'])
+    self.assertEquals(self.zset[1:3], ['b', 'c'])
+    self.assertEquals(self.zset[:-1], ['a', 'b', 'c'])
+    self.assertEquals(self.zset.range_by_score(2, 3), ['b', 'c'])
+    self.assertEquals(self.zset.range_by_score('(2', '+inf', withscores=True), [('c', 3.0), ('d', 4.0)])
+    self.assertEquals(self.zset.range_by_score(offset=1, count=2, reverse=True), ['c', 'b'])
+    self.assertEquals(self.zset.count(2, 3), 2)
+    self.assertEquals(self.zset.rank('c'), 2)
+    self.assertEquals(self.zset.rank('c', reverse=True), 1)
+
+  def test_range_by_value(self):
+    zset = self.activeredis.sortedset('bar', codec='json')
+    zset.add_many([(item, 0) for item in ['a', 'b', 'c']])
+    self.assertEquals(zset.range_by_value('a', 'b'), ['a', 'b'])
+    self.assertEquals(zset.range_by_value('a', inclusive=False), ['b', 'c'])
+
+  def test_remove(self):
+    self.zset.remove('a')
+    self.assertRaises(KeyError, self.zset.remove, 'a')
+    self.zset.discard('a')
+    del self.zset['b']
+    self.assertEquals(self.zset.items(), [('c', 3.0), ('d', 4.0)])
+
+  def test_scan(self):
+    self.zset.add_many((i, i) for i in range(2500))
+    self.assertEquals(len(set(self.zset.scan(count=100))), 2504)
+
+  def test_scan_dedupe(self):
+    values = [(self.zset.client.encode(item), score) for item, score in (('a', 1.0), ('b', 2.0), ('c', 3.0))]
+    pages = {0: (1, values[:2]), 1: (2, values[1:2]), 2: (0, values[1:])}
+    self.zset.client.redis.zscan = lambda key, cursor, match=None, count=None: pages[cursor]
+    self.assertEquals(list(self.zset), ['a', 'b', 'c'])
+    self.assertEquals(list(self.zset.iteritems()), [('a', 1.0), ('b', 2.0), ('c', 3.0)])
+    self.assertEquals(len(list(self.zset.scan(dedupe=False))), 5)
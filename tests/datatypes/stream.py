@@ -0,0 +1,111 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from tests.fake import FakeRedisTestCase
+from active_redis.datatypes.stream import Stream, _next_id
+from redis import ResponseError
+import itertools
+
+class StreamTestCase(FakeRedisTestCase):
+  def setUp(self):
+    super(StreamTestCase, self).setUp()
+    try:
+      self.redis.execute_command('XLEN', 'foo')
+    except ResponseError:
+      self.skipTest("The server does not support streams.")
+    self.stream = self.activeredis.stream('foo')
+
+  def test_append(self):
+    first = self.stream.append({'a': 1})
+    ids = self.stream.append_many(['b', 'c'])
+    self.assertEquals(len(self.stream), 3)
+    self.assertEquals(self.stream.range(), [(first, {'a': 1}), (ids[0], 'b'), (ids[1], 'c')])
+    self.assertEquals(self.stream.range(count=1, reverse=True), [(ids[1], 'c')])
+    self.assertEquals(self.stream.read(first), [(ids[0], 'b'), (ids[1], 'c')])
+
+  def test_iterate(self):
+    self.stream.count = 10
+    self.stream.append_many(range(25))
+    self.assertEquals([item for id, item in self.stream], range(25))
+
+  def test_consume(self):
+    self.stream.append_many(range(5))
+    self.assertEquals([item for id, item in self.stream.consume('0', count=2, block=None)], range(5))
+
+  def test_group(self):
+    group = self.stream.group('workers', 'a')
+    self.assertTrue(group.create('0'))
+    self.assertFalse(group.create('0'))
+    self.stream.append_many(['a', 'b'])
+    entries = group.read()
+    self.assertEquals([item for id, item in entries], ['a', 'b'])
+    self.assertEquals(group.pending(), 2)
+    self.assertEquals(group.ack(entries[0][0]), 1)
+    self.assertEquals(group.pending(), 1)
+    self.assertEquals([item for id, item in group.read(id='0')], ['b'])
+
+  def test_claim_while_idle(self):
+    group = self.stream.group('workers', 'a')
+    group.create('0')
+    self.stream.append('a')
+    group.read()
+    # Consumer 'b' must claim the entry left pending by consumer 'a'
+    # although no new entries arrive.
+    other = self.stream.group('workers', 'b')
+    entries = list(itertools.islice(other.consume(min_idle=0.05), 1))
+    self.assertEquals([item for id, item in entries], ['a'])
+
+class StreamProtocolTestCase(FakeRedisTestCase):
+  """
+  Tests stream parsing and cursors against scripted server responses,
+  so they run on servers without stream support.
+  """
+  def setUp(self):
+    super(StreamProtocolTestCase, self).setUp()
+    self.stream = self.activeredis.stream('foo')
+    self.commands = []
+    self.responses = []
+    def execute_command(*args, **options):
+      self.commands.append(args)
+      return self.responses.pop(0)
+    self.stream.client.redis.execute_command = execute_command
+
+  def entry(self, id, item):
+    return [id, ['item', self.stream.client.encode(item)]]
+
+  def test_next_id(self):
+    self.assertEquals(_next_id('1-0'), '1-1')
+    self.assertEquals(_next_id('1526919030474-55'), '1526919030474-56')
+
+  def test_parse_entries(self):
+    entries = [self.entry('1-0', {'a': 1}), ['2-0', ['other', 'x']], ['3-0', None], self.entry('4-0', [1])]
+    self.assertEquals(self.stream._parse_entries(entries), [('1-0', {'a': 1}), ('2-0', {'other': 'x'}), ('3-0', None), ('4-0', [1])])
+    self.assertEquals(self.stream._parse_streams(None), [])
+    self.assertEquals(self.stream._parse_streams([['foo', [self.entry('1-0', 'a')]]]), [('1-0', 'a')])
+
+  def test_iterate(self):
+    self.stream.count = 2
+    self.responses = [[self.entry('1-0', 'a'), self.entry('2-0', 'b')], [self.entry('3-0', 'c')]]
+    self.assertEquals(list(iter(self.stream)), [('1-0', 'a'), ('2-0', 'b'), ('3-0', 'c')])
+    self.assertEquals([args[2] for args in self.commands], ['-', '2-1'])
+
+  def test_consume(self):
+    self.responses = [[['foo', [self.entry('1-0', 'a'), self.entry('2-0', 'b')]]], [['foo', [self.entry('3-0', 'c')]]], None]
+    self.assertEquals(list(self.stream.consume('0', count=2, block=None)), [('1-0', 'a'), ('2-0', 'b'), ('3-0', 'c')])
+    self.assertEquals([args[-1] for args in self.commands], ['0', '2-0', '3-0'])
+
+  def test_group_consume_claims(self):
+    group = self.stream.group('workers', 'b')
+    self.responses = [
+      ['5-0', [self.entry('1-0', 'a'), self.entry('2-0', 'b')]],
+      ['0-0', [self.entry('6-0', 'c')]],
+      ['0-0', []],
+      None,
+      ['0-0', []],
+      None,
+    ]
+    entries = list(group.consume(count=2, block=None, min_idle=1))
+    self.assertEquals(entries, [('1-0', 'a'), ('2-0', 'b'), ('6-0', 'c')])
+    claims = [args for args in self.commands if args[0] == 'XAUTOCLAIM']
+    self.assertEquals([args[5] for args in claims], ['0-0', '5-0', '0-0', '0-0'])
+    reads = [args for args in self.commands if args[0] == 'XREADGROUP']
+    self.assertEquals([args[-1] for args in reads], ['0', '>'])
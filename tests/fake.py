@@ -0,0 +1,19 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+import unittest
+from active_redis import ActiveRedis
+
+try:
+  import fakeredis
+except ImportError:
+  fakeredis = None
+
+@unittest.skipIf(fakeredis is None, "These tests require the 'fakeredis' package.")
+class FakeRedisTestCase(unittest.TestCase):
+  """
+  Base class for tests run against an in-process fake Redis server.
+  """
+  def setUp(self):
+    self.redis = fakeredis.FakeRedis()
+    self.redis.flushall()
+    self.activeredis = ActiveRedis(self.redis)
@@ -0,0 +1,78 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from tests.fake import FakeRedisTestCase
+from active_redis import ActiveRedis, Instrumentation
+from redis import ResponseError
+
+class InstrumentationTestCase(FakeRedisTestCase):
+  def setUp(self):
+    super(InstrumentationTestCase, self).setUp()
+    self.instrumentation = Instrumentation()
+    self.activeredis = ActiveRedis(self.redis, instrumentation=self.instrumentation)
+
+  def test_commands(self):
+    d = self.activeredis.dict('foo')
+    d['a'] = 1
+    d.get('a')
+    stats = self.instrumentation.stats()
+    self.assertEquals(stats['commands']['HSET'], 1)
+    self.assertEquals(stats['commands']['HGET'], 1)
+    self.assertEquals(stats['latency']['HSET']['count'], 1)
+    self.assertTrue(stats['bytes_sent'] > 0)
+    self.assertTrue(stats['bytes_encoded'] > 0)
+    self.assertTrue(stats['bytes_decoded'] > 0)
+
+  def test_existing_connections(self):
+    # Connections pooled before the instrumentation was installed are recorded.
+    self.redis.ping()
+    self.instrumentation.reset()
+    self.redis.ping()
+    self.assertEquals(self.instrumentation.stats()['commands'], {'PING': 1})
+
+  def test_pipelines(self):
+    s = self.activeredis.set('foo')
+    s.chunk_size = 10
+    s.update(range(25))
+    s.contains_many(range(5))
+    pipeline = self.redis.pipeline(transaction=False)
+    pipeline.set('bar', 1)
+    pipeline.lpush('bar', 1)
+    self.assertRaises(ResponseError, pipeline.execute)
+    stats = self.instrumentation.stats()
+    self.assertEquals(stats['commands']['SADD'], 3)
+    self.assertEquals(stats['commands']['SISMEMBER'], 5)
+    self.assertEquals(stats['errors']['LPUSH'], 1)
+    self.assertFalse('SET' in stats['errors'])
+
+  def test_errors(self):
+    self.redis.set('foo', 1)
+    self.assertRaises(ResponseError, self.redis.lpush, 'foo', 1)
+    self.assertEquals(self.instrumentation.stats()['errors'], {'LPUSH': 1})
+
+  def test_install_once(self):
+    ActiveRedis(self.redis, instrumentation=self.instrumentation)
+    self.redis.ping()
+    self.assertEquals(self.instrumentation.stats()['commands']['PING'], 1)
+
+  def test_trace(self):
+    l = self.activeredis.list('foo')
+    l.append(1)
+    with self.activeredis.trace() as trace:
+      l.append(2)
+      l.extend([3, 4])
+      with self.instrumentation.trace() as inner:
+        len(l)
+    len(l)
+    self.assertEquals(trace.count(), 3)
+    self.assertEquals(trace.count('rpush'), 2)
+    self.assertEquals([name for name, seconds, size in inner], ['LLEN'])
+    self.assertEquals(repr(inner), '<Trace LLEN>')
+
+  def test_listeners(self):
+    metrics = []
+    listener = lambda kind, name, value: metrics.append((kind, name))
+    self.instrumentation.add_listener(listener)
+    self.activeredis.set('foo').add(1)
+    self.instrumentation.remove_listener(listener)
+    self.activeredis.set('foo').add(2)
+    self.assertEquals(metrics, [('encode', None), ('command', 'SADD')])
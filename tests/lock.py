@@ -0,0 +1,81 @@
+# Copyright (c) 2013 Jordan Halterman <jordan.halterman@gmail.com>
+# See LICENSE for details.
+from tests.fake import FakeRedisTestCase
+from active_redis.exception import LockError
+import threading, time
+
+class LockTestCase(FakeRedisTestCase):
+  def setUp(self):
+    super(LockTestCase, self).setUp()
+    self.list = self.activeredis.list('foo')
+
+  def test_acquire_release(self):
+    lock = self.list.lock()
+    self.assertFalse(lock.locked())
+    self.assertEquals(lock.acquire(), 1)
+    self.assertTrue(lock.locked())
+    self.assertTrue(lock.owned())
+    self.assertRaises(LockError, lock.acquire)
+    other = self.list.lock()
+    self.assertFalse(other.acquire(blocking=False))
+    self.assertTrue(lock.release())
+    self.assertFalse(lock.locked())
+    self.assertRaises(LockError, lock.release)
+
+  def test_release_expired(self):
+    lock = self.list.lock(timeout=10)
+    lock.acquire()
+    self.redis.delete(lock.name)
+    other = self.list.lock()
+    other.acquire(blocking=False)
+    self.assertFalse(lock.release())
+    self.assertTrue(other.owned())
+
+  def test_fencing_tokens(self):
+    tokens = []
+    for i in range(5):
+      with self.list.lock() as lock:
+        tokens.append(lock.fence)
+    self.assertEquals(tokens, sorted(set(tokens)))
+    self.assertEquals(self.activeredis.list('foo').lock().acquire(), tokens[-1] + 1)
+
+  def test_extend(self):
+    lock = self.list.lock(timeout=1)
+    lock.acquire()
+    self.assertTrue(lock.extend(30))
+    self.assertTrue(self.redis.pttl(lock.name) > 10000)
+    self.redis.delete(lock.name)
+    self.assertFalse(lock.extend())
+    self.assertRaises(LockError, self.list.lock().extend)
+
+  def test_renewal(self):
+    lock = self.list.lock(timeout=0.3, renew=True)
+    lock.acquire()
+    time.sleep(0.6)
+    self.assertTrue(lock.owned())
+    self.assertFalse(lock.lost)
+    self.redis.delete(lock.name)
+    time.sleep(0.3)
+    self.assertTrue(lock.lost)
+    self.assertFalse(lock.release())
+
+  def test_blocking_timeout(self):
+    self.list.lock().acquire()
+    start = time.time()
+    self.assertFalse(self.list.lock(blocking_timeout=0.2).acquire())
+    self.assertTrue(time.time() - start < 0.8)
+
+  def test_wakeup(self):
+    lock = self.list.lock()
+    lock.acquire()
+    results = []
+    def wait():
+      results.append(self.list.lock(blocking_timeout=5).acquire())
+    thread = threading.Thread(target=wait)
+    start = time.time()
+    thread.start()
+    time.sleep(0.2)
+    lock.release()
+    thread.join()
+    self.assertEquals(results, [2])
+    self.assertTrue(time.time() - start < 3)